@@ -0,0 +1,328 @@
+"""
+This module provides a persistent approximate nearest-neighbour (ANN) index for
+lookalike search over the prospect description vectors written by
+similarity_scoring.py (the sparse matrix in data/vectors/prospects/).
+It is an IVF (inverted file) index: a spherical k-means splits the vectors into
+clusters, the vectors are stored grouped by cluster, and a query only scores the
+vectors of the `nprobe` clusters whose centroids are closest to it. Clustering and list
+selection use dense projections of the sparse TF-IDF vectors (sparse_vectors.project);
+the candidates of the probed lists are scored exactly on their sparse vectors.
+New prospects (e.g. a new Apollo export) are vectorized with the stored IDF
+(similarity_scoring.vectorize_with_idf) and added incrementally without retraining:
+every add writes one new segment holding the new vectors grouped by list, and the
+existing segments are left untouched.
+
+Usage:
+    python scripts/ann_index.py build
+    python scripts/ann_index.py add --prospects data/processed/new_export.csv
+    python scripts/ann_index.py query --id 123 --k 50
+    python scripts/ann_index.py benchmark --queries 200 --k 50
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from sparse_vectors import SparseVectors, is_saved, project
+from similarity_scoring import IDF_FILE, PROSPECT_TEXT_COLUMN, vectorize_with_idf
+
+PROJECTION_DIM = 256
+N_ITERATIONS = 10
+NPROBE = 8
+TOP_K = 50
+BLOCK_SIZE = 20000 # Vectors assigned to centroids per matrix multiply
+META_FILE = "meta.json"
+SEGMENTS_DIR = "segments"
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block_size: int = BLOCK_SIZE) -> np.ndarray:
+    """Returns the index of the most similar centroid for every vector."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, n_iterations: int = N_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """
+    Runs spherical k-means (cosine similarity) over the non-zero vectors.
+    Empty clusters are re-seeded with random vectors. Returns an (n_lists, dim) float32 array.
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(vectors, dtype=np.float32)
+    data = data[np.any(data != 0, axis=1)]
+    if len(data) < n_lists:
+        raise ValueError(f"Need at least {n_lists} non-zero vectors to train {n_lists} lists, got {len(data)}.")
+    centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+    for _ in range(n_iterations):
+        assignments = _assign(data, centroids)
+        order = np.argsort(assignments, kind='stable')
+        sizes = np.bincount(assignments, minlength=n_lists)
+        empty = sizes == 0
+        sums = np.zeros_like(centroids)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        sums[~empty] = np.add.reduceat(data[order], starts[~empty], axis=0)
+        sums[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class IVFSegment:
+    """
+    Vectors added to the index in one go, sorted by list: list l occupies rows
+    offsets[l]:offsets[l + 1]. `ids` maps every row back to the caller's identifier
+    (e.g. the prospect row number).
+    """
+
+    def __init__(self, vectors: SparseVectors, ids: np.ndarray, offsets: np.ndarray):
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+
+    def save(self, path) -> None:
+        self.vectors.save(os.path.join(path, 'vectors'))
+        np.save(os.path.join(path, 'ids.npy'), np.asarray(self.ids))
+        np.save(os.path.join(path, 'offsets.npy'), np.asarray(self.offsets))
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "IVFSegment":
+        return cls(SparseVectors.load(os.path.join(path, 'vectors'), mmap),
+                   np.load(os.path.join(path, 'ids.npy')), np.load(os.path.join(path, 'offsets.npy')))
+
+
+class IVFIndex:
+    """
+    Inverted-file index over L2-normalized sparse vectors (inner product = cosine similarity).
+    The centroids live in the PROJECTION_DIM-dimensional projected space; the stored vectors
+    are kept in segments (IVFSegment), one per add() call.
+    """
+
+    def __init__(self, centroids: np.ndarray, n_features: int, segments=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.n_features = n_features
+        self.segments = segments if segments is not None else []
+        self._saved_segments = len(self.segments) # Segments already on disk
+
+    @classmethod
+    def build(cls, vectors: SparseVectors, n_lists: int | None = None, ids=None, seed: int = 0) -> "IVFIndex":
+        """Trains the centroids on `vectors` and adds them. n_lists defaults to about sqrt(n)."""
+        n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+        index = cls(train_centroids(project(vectors, PROJECTION_DIM), n_lists, seed=seed), vectors.n_features)
+        index.add(vectors, ids)
+        return index
+
+    def __len__(self) -> int:
+        return sum(len(segment.ids) for segment in self.segments)
+
+    def list_sizes(self) -> np.ndarray:
+        return sum((np.diff(segment.offsets) for segment in self.segments), np.zeros(len(self.centroids), dtype=np.int64))
+
+    def max_id(self) -> int:
+        return max((int(segment.ids.max()) for segment in self.segments if len(segment.ids)), default=-1)
+
+    def add(self, vectors: SparseVectors, ids=None) -> None:
+        """
+        Adds vectors to their nearest lists as a new segment. ids default to consecutive numbers
+        after the largest stored id. The existing lists and segments are kept; no retraining happens.
+        """
+        if vectors.n_features != self.n_features:
+            raise ValueError(f"Vectors have {vectors.n_features} features, the index expects {self.n_features}.")
+        if ids is None:
+            first_id = self.max_id() + 1
+            ids = np.arange(first_id, first_id + len(vectors), dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(vectors)} vectors but {len(ids)} ids.")
+
+        assignments = _assign(project(vectors, PROJECTION_DIM), self.centroids)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(self.centroids)))]).astype(np.int64)
+        self.segments.append(IVFSegment(vectors.take(order), ids[order], offsets))
+
+    def get_vector(self, vector_id: int) -> SparseVectors | None:
+        """The stored vector with id `vector_id` (as a one-row matrix), or None if there is none."""
+        for segment in self.segments:
+            rows = np.flatnonzero(segment.ids == vector_id)
+            if len(rows):
+                return segment.vectors.rows(int(rows[0]), int(rows[0]) + 1)
+        return None
+
+    def search(self, query: SparseVectors, k: int = TOP_K, nprobe: int = NPROBE) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (ids, scores) of the k stored vectors most similar to the one-row matrix `query`
+        among the `nprobe` closest lists, sorted by descending score (fewer than k if the lists are small).
+        """
+        nprobe = min(nprobe, len(self.centroids))
+        probed = np.argpartition(-(self.centroids @ project(query, PROJECTION_DIM)[0]), nprobe - 1)[:nprobe]
+        dense_query = query.dense_row(0)
+        found_ids, found_scores = [], []
+        for segment in self.segments:
+            for l in probed:
+                candidates = segment.vectors.rows(int(segment.offsets[l]), int(segment.offsets[l + 1]))
+                if len(candidates):
+                    found_ids.append(segment.ids[segment.offsets[l]:segment.offsets[l + 1]])
+                    found_scores.append(candidates.dot(dense_query))
+        if not found_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids, scores = np.concatenate(found_ids), np.concatenate(found_scores)
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return ids[top], scores[top]
+
+    def save(self, index_dir) -> None:
+        """
+        Writes the centroids (on the first save), the segments added since the last save and a
+        small JSON metadata file into `index_dir`. Segments already on disk are not rewritten.
+        """
+        os.makedirs(os.path.join(index_dir, SEGMENTS_DIR), exist_ok=True)
+        if not os.path.exists(os.path.join(index_dir, 'centroids.npy')):
+            np.save(os.path.join(index_dir, 'centroids.npy'), self.centroids)
+        for number in range(self._saved_segments, len(self.segments)):
+            self.segments[number].save(os.path.join(index_dir, SEGMENTS_DIR, f"{number:05d}"))
+        self._saved_segments = len(self.segments)
+        meta = {"n_lists": len(self.centroids), "dim": self.centroids.shape[1], "n_features": self.n_features,
+                "count": len(self), "segments": len(self.segments)}
+        with open(os.path.join(index_dir, META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, index_dir, mmap: bool = True) -> "IVFIndex":
+        """Loads an index written by save(). With mmap, the stored vectors are memory-mapped read-only."""
+        with open(os.path.join(index_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        segments = [IVFSegment.load(os.path.join(index_dir, SEGMENTS_DIR, f"{number:05d}"), mmap)
+                    for number in range(meta["segments"])]
+        return cls(np.load(os.path.join(index_dir, 'centroids.npy')), meta["n_features"], segments)
+
+
+def brute_force_search(vectors: SparseVectors, query: SparseVectors, k: int = TOP_K) -> tuple[np.ndarray, np.ndarray]:
+    """Exact top-k by scoring every vector; used as the benchmark baseline."""
+    scores = vectors.dot(query.dense_row(0))
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+def run_benchmark(index: IVFIndex, vectors: SparseVectors, n_queries: int, k: int, nprobe_values, seed: int = 0) -> None:
+    """
+    Prints query latency (p50/p95) and recall@k against brute force over `vectors` for each
+    nprobe value. The index is expected to hold `vectors` with their row numbers as ids.
+    """
+    rng = np.random.default_rng(seed)
+    non_zero = np.flatnonzero(np.diff(vectors.indptr) > 0)
+    query_rows = rng.choice(non_zero, min(n_queries, len(non_zero)), replace=False)
+    queries = [vectors.rows(int(row), int(row) + 1) for row in query_rows]
+
+    latencies, exact = [], []
+    for query in queries:
+        started = time.perf_counter()
+        top, _ = brute_force_search(vectors, query, k)
+        latencies.append(time.perf_counter() - started)
+        exact.append(set(top.tolist()))
+    print(f"Brute force: p50 {np.percentile(latencies, 50) * 1000:.2f} ms, p95 {np.percentile(latencies, 95) * 1000:.2f} ms")
+
+    for nprobe in nprobe_values:
+        latencies, recalls = [], []
+        for query, expected in zip(queries, exact):
+            started = time.perf_counter()
+            found, _ = index.search(query, k, nprobe)
+            latencies.append(time.perf_counter() - started)
+            recalls.append(len(expected.intersection(found.tolist())) / len(expected))
+        print(f"IVF nprobe={nprobe}: p50 {np.percentile(latencies, 50) * 1000:.2f} ms, "
+              f"p95 {np.percentile(latencies, 95) * 1000:.2f} ms, recall@{k} {np.mean(recalls):.3f}")
+
+
+def main():
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    vectors_dir = os.path.join(project_root, 'data', 'vectors')
+    default_vectors = os.path.join(vectors_dir, 'prospects')
+    default_index_dir = os.path.join(project_root, 'data', 'ann_index')
+
+    parser = argparse.ArgumentParser(description="Build, extend, query and benchmark the prospect lookalike index.")
+    parser.add_argument('--index-dir', default=default_index_dir)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Train a new index over a vector directory.")
+    build_parser.add_argument('--vectors', default=default_vectors)
+    build_parser.add_argument('--n-lists', type=int, help="Number of IVF lists (default: sqrt of the vector count).")
+
+    add_parser = subparsers.add_parser('add', help="Add the prospects of a new export to an existing index.")
+    add_source = add_parser.add_mutually_exclusive_group(required=True)
+    add_source.add_argument('--prospects', help=f"Cleaned prospect CSV with a '{PROSPECT_TEXT_COLUMN}' column; "
+                                                "vectorized with the stored IDF.")
+    add_source.add_argument('--vectors', help="Vector directory already vectorized with the stored IDF.")
+    add_parser.add_argument('--idf', default=os.path.join(vectors_dir, IDF_FILE))
+    add_parser.add_argument('--first-id', type=int, help="Id of the first new vector (default: after the largest stored id).")
+
+    query_parser = subparsers.add_parser('query', help="Find the prospects most similar to one prospect.")
+    query_parser.add_argument('--id', type=int, required=True,
+                              help="Id of the prospect in the index (its row in the vector directory it was built from).")
+    query_parser.add_argument('--k', type=int, default=TOP_K)
+    query_parser.add_argument('--nprobe', type=int, default=NPROBE)
+
+    benchmark_parser = subparsers.add_parser('benchmark', help="Compare query latency and recall with brute force.")
+    benchmark_parser.add_argument('--vectors', default=default_vectors)
+    benchmark_parser.add_argument('--queries', type=int, default=200)
+    benchmark_parser.add_argument('--k', type=int, default=TOP_K)
+    benchmark_parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, NPROBE, 16])
+    args = parser.parse_args()
+
+    vectors = None
+    if getattr(args, 'vectors', None):
+        if not is_saved(args.vectors):
+            print(f"Error: Vector directory not found: {args.vectors}. Run similarity_scoring.py first.")
+            return
+        vectors = SparseVectors.load(args.vectors)
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        index = IVFIndex.build(vectors, args.n_lists)
+        index.save(args.index_dir)
+        print(f"Built index with {len(index)} vectors in {len(index.centroids)} lists in "
+              f"{time.perf_counter() - started:.1f}s; saved to {args.index_dir}")
+        return
+
+    if not os.path.exists(os.path.join(args.index_dir, META_FILE)):
+        print(f"Error: No index found in {args.index_dir}. Run the 'build' command first.")
+        return
+    index = IVFIndex.load(args.index_dir)
+
+    if args.command == 'add':
+        if args.prospects:
+            if not os.path.exists(args.idf):
+                print(f"Error: IDF file not found: {args.idf}. Run similarity_scoring.py first.")
+                return
+            prospects_df = pd.read_csv(args.prospects)
+            if PROSPECT_TEXT_COLUMN not in prospects_df.columns:
+                print(f"Error: Column '{PROSPECT_TEXT_COLUMN}' not found in {args.prospects}")
+                return
+            vectors = vectorize_with_idf(prospects_df[PROSPECT_TEXT_COLUMN].tolist(), np.load(args.idf))
+        ids = None
+        if args.first_id is not None:
+            ids = np.arange(args.first_id, args.first_id + len(vectors))
+        index.add(vectors, ids)
+        index.save(args.index_dir)
+        print(f"Added {len(vectors)} vectors; the index now holds {len(index)} in {len(index.segments)} segment(s).")
+    elif args.command == 'query':
+        query = index.get_vector(args.id)
+        if query is None:
+            print(f"Error: No prospect with id {args.id} in the index.")
+            return
+        found, scores = index.search(query, args.k + 1, args.nprobe)
+        keep = found != args.id
+        for rank, (found_id, score) in enumerate(zip(found[keep][:args.k], scores[keep][:args.k]), start=1):
+            print(f"{rank:3d}. id {found_id} (similarity {score:.3f})")
+    elif args.command == 'benchmark':
+        run_benchmark(index, vectors, args.queries, args.k, args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+This module deduplicates an Apollo company export in a single pass.
+It replaces the staged Website / Company Phone / Company name deduplication of
+notebooks/80k_cleaning.ipynb. Each row gets hashed keys for its normalized website
+domain, its company name (lowercased, legal forms such as GmbH or AG stripped) and
+its phone number. Rows sharing a domain or a name key (optionally also a phone key)
+are grouped into clusters with a vectorized union-find. One vectorized sweep then
+applies the notebook's keep rules per cluster:
+- rows with a website win over rows without one;
+- per website, the first row of each distinct phone number is kept, or only the first
+  row if no row of that website has a phone;
+- clusters without any website keep their first row.
+A compact report lists every dropped row with its cluster, the kept row it was merged
+into and the reason.
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from apollo_loader import CHUNK_SIZE, DEFAULT_INPUT_PATH, load_apollo
+import run_metrics
+
+WEBSITE_COLUMN = 'Website'
+COMPANY_COLUMN = 'Company'
+PHONE_COLUMN = 'Company Phone'
+DEFAULT_UNION_KEYS = ('domain', 'name')
+MIN_PHONE_DIGITS = 6 # Shorter digit strings are treated as missing phone numbers
+NO_KEY = np.uint64(0) # Hash value reserved for "no key"
+
+LEGAL_FORM_PATTERN = (
+    r"\b(?:gmbh\s*&\s*co\.?\s*kgaa|gmbh\s*&\s*co\.?\s*kg|ug\s*\(haftungsbeschränkt\)|"
+    r"gmbh|mbh|ag|kgaa|kg|ohg|gbr|ug|se|e\.\s?k\.?|e\.\s?v\.?|ltd|limited|inc|llc|s\.?a\.?r\.?l|sàrl|bv|plc)(?=\W|$)"
+)
+
+
+def _as_text(series: pd.Series) -> pd.Series:
+    """Returns the column as Python strings ('' for NaN), using object dtype for Python regex semantics."""
+    return series.astype(object).where(series.notna(), '').map(str).astype(object)
+
+
+def normalize_domains(websites: pd.Series) -> pd.Series:
+    """Reduces website URLs to their lowercased host without scheme, 'www.', port or path."""
+    domains = _as_text(websites).str.strip().str.lower()
+    domains = domains.str.replace(r"^[a-z][a-z0-9+.-]*://", '', regex=True)
+    domains = domains.str.replace(r"^www\d*\.", '', regex=True)
+    return domains.str.replace(r"[/:?#].*$", '', regex=True).str.rstrip('.')
+
+
+def normalize_company_names(names: pd.Series) -> pd.Series:
+    """Lowercases names, strips legal forms and punctuation and collapses whitespace."""
+    base = _as_text(names).str.lower().str.replace(r"\s+", ' ', regex=True).str.strip()
+    stripped = base.str.replace(LEGAL_FORM_PATTERN, ' ', regex=True)
+    stripped = stripped.str.replace(r"[^\w]+", ' ', regex=True).str.strip()
+    # Names that consist of a legal form only (e.g. "AG") keep their full normalized text
+    return stripped.where(stripped != '', base)
+
+
+def normalize_phones(phones: pd.Series) -> pd.Series:
+    """Keeps the digits of each phone number; numbers with too few digits become ''."""
+    digits = _as_text(phones).str.replace(r"\D", '', regex=True)
+    return digits.where(digits.str.len() >= MIN_PHONE_DIGITS, '')
+
+
+def hash_keys(values: pd.Series) -> np.ndarray:
+    """Hashes normalized key strings to uint64; empty strings map to NO_KEY."""
+    hashes = pd.util.hash_array(values.to_numpy(dtype=object), categorize=True)
+    hashes[hashes == NO_KEY] = 1
+    hashes[(values == '').to_numpy()] = NO_KEY
+    return hashes
+
+
+def find_clusters(key_arrays) -> np.ndarray:
+    """
+    Vectorized union-find: rows sharing any non-empty key end up with the same cluster label
+    (the smallest row position in the cluster). Labels are propagated through the key groups
+    with pointer jumping until they no longer change.
+    """
+    n_rows = len(key_arrays[0]) if key_arrays else 0
+    labels = np.arange(n_rows)
+    groups = []
+    for keys in key_arrays:
+        rows = np.flatnonzero(keys != NO_KEY)
+        _, inverse = np.unique(keys[rows], return_inverse=True)
+        groups.append((rows, inverse.ravel(), int(inverse.max()) + 1 if len(rows) else 0))
+
+    while True:
+        previous = labels.copy()
+        for rows, inverse, n_groups in groups:
+            if not n_groups:
+                continue
+            group_min = np.full(n_groups, n_rows)
+            np.minimum.at(group_min, inverse, labels[rows])
+            labels[rows] = group_min[inverse]
+            labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def deduplicate(df: pd.DataFrame, union_keys=DEFAULT_UNION_KEYS) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Deduplicates `df` (keeping its original order and index).
+    `union_keys` selects which of 'domain', 'name' and 'phone' link rows into clusters.
+    Returns (deduplicated_df, report_df) where the report has one row per dropped row.
+    """
+    empty = pd.Series('', index=df.index, dtype=object)
+    normalized = {
+        'domain': normalize_domains(df[WEBSITE_COLUMN]) if WEBSITE_COLUMN in df.columns else empty,
+        'name': normalize_company_names(df[COMPANY_COLUMN]) if COMPANY_COLUMN in df.columns else empty,
+        'phone': normalize_phones(df[PHONE_COLUMN]) if PHONE_COLUMN in df.columns else empty,
+    }
+    keys = {name: hash_keys(values) for name, values in normalized.items()}
+    clusters = find_clusters([keys[name] for name in union_keys])
+
+    domain, phone = keys['domain'], keys['phone']
+    has_domain = domain != NO_KEY
+    has_phone = phone != NO_KEY
+    cluster_has_domain = np.zeros(len(df), dtype=bool)
+    cluster_has_domain[clusters[has_domain]] = True
+    domain_has_phone = pd.Series(has_phone).groupby(domain).transform('any').to_numpy()
+
+    keys_frame = pd.DataFrame({'cluster': clusters, 'domain': domain, 'phone': phone})
+    first_per_domain_phone = ~keys_frame.duplicated(['domain', 'phone']).to_numpy()
+    first_per_domain = ~keys_frame.duplicated(['domain']).to_numpy()
+    first_per_cluster = ~keys_frame.duplicated(['cluster']).to_numpy()
+
+    keep_with_domain = has_domain & np.where(domain_has_phone, has_phone & first_per_domain_phone, first_per_domain)
+    keep_without_domain = ~has_domain & ~cluster_has_domain[clusters] & first_per_cluster
+    keep = keep_with_domain | keep_without_domain
+
+    reason = np.select(
+        [~has_domain & cluster_has_domain[clusters], ~has_domain, has_phone, domain_has_phone],
+        ['no_website', 'duplicate_company', 'duplicate_phone', 'no_phone'],
+        default='duplicate_website'
+    )
+    kept_row = pd.Series(np.where(keep, np.arange(len(df)), len(df))).groupby(clusters).transform('min').to_numpy()
+    dropped = np.flatnonzero(~keep)
+    report = pd.DataFrame({
+        'row': df.index[dropped],
+        'cluster': df.index[clusters[dropped]],
+        'kept_row': df.index[kept_row[dropped]],
+        'reason': reason[dropped],
+        COMPANY_COLUMN: df[COMPANY_COLUMN].to_numpy()[dropped] if COMPANY_COLUMN in df.columns else '',
+        WEBSITE_COLUMN: df[WEBSITE_COLUMN].to_numpy()[dropped] if WEBSITE_COLUMN in df.columns else '',
+    })
+    return df[keep], report
+
+
+def main():
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="Deduplicate an Apollo export by website, company name and phone.")
+    parser.add_argument('--input', default=os.path.join(project_root, DEFAULT_INPUT_PATH))
+    parser.add_argument('--output', default=os.path.join(project_root, 'data', 'processed', 'apollo_deduplicated.csv'))
+    parser.add_argument('--report', default=os.path.join(project_root, 'script_output', 'dedup_report.csv'))
+    parser.add_argument('--union-keys', nargs='+', choices=['domain', 'name', 'phone'], default=list(DEFAULT_UNION_KEYS),
+                        help="Keys that link rows into the same company cluster.")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file not found: {args.input}")
+        return
+    with run_metrics.stage("load"):
+        df = load_apollo(args.input, args.chunk_size)
+
+    with run_metrics.stage("deduplicate") as timing:
+        deduplicated, report = deduplicate(df, args.union_keys)
+    print(f"Deduplicated {len(df)} rows to {len(deduplicated)} in {timing['seconds']:.2f}s")
+    print(report['reason'].value_counts().to_string())
+
+    for path in (args.output, args.report):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with run_metrics.stage("write"):
+        deduplicated.to_csv(args.output, index=False, encoding='utf-8')
+        report.to_csv(args.report, index=False, encoding='utf-8')
+    print(f"Saved deduplicated data to {args.output} and the merge report to {args.report}")
+    run_metrics.incr("rows_in", len(df))
+    run_metrics.incr("rows_out", len(deduplicated))
+    print(f"Wrote the run report to {run_metrics.write_report()}")
+
+
+if __name__ == "__main__":
+    main()
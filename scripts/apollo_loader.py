@@ -0,0 +1,98 @@
+"""
+This module loads Apollo company exports (e.g. "Company DACH 15-100 MA Apollo 80k.csv")
+in chunks instead of a single whole-file read_csv.
+Only the needed columns are read (the ones notebooks/80k_cleaning.ipynb drops are
+skipped at parse time, except Account Stage, which is kept), with explicit compact dtypes:
+categoricals for low-cardinality columns such as Company Country, Industry and Account
+Stage, and downcast numbers for the employee count and founding year. Each chunk is converted and yielded on its own, so peak memory
+depends on the chunk size rather than on the size of the export.
+"""
+import argparse
+import os
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+CHUNK_SIZE = 20000
+DEFAULT_INPUT_PATH = os.path.join("data", "raw", "Company DACH 15-100 MA Apollo 80k.csv")
+
+# Columns the cleaning notebook drops right after loading (it also drops Account Stage,
+# which is kept here as a categorical)
+COLUMNS_TO_DROP = [
+    'Logo Url', 'Company Name for Emails', 'Number of Retail Locations', 'Apollo Account Id',
+    'Primary Intent Topic', 'Primary Intent Score', 'Secondary Intent Topic', 'Secondary Intent Score'
+]
+CATEGORICAL_COLUMNS = ['Company Country', 'Company State', 'Industry', 'Account Stage']
+NUMERIC_COLUMNS = {'# Employees': 'float', 'Founded Year': 'float'}
+
+
+def _read_dtypes() -> dict:
+    """dtypes passed to read_csv: categoricals as 'category', everything else as string (parsed later)."""
+    dtypes = {column: 'category' for column in CATEGORICAL_COLUMNS}
+    dtypes.update({column: 'str' for column in NUMERIC_COLUMNS})
+    return dtypes
+
+
+def clean_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Converts the numeric columns to compact dtypes; unparseable values become NaN."""
+    for column, downcast in NUMERIC_COLUMNS.items():
+        if column in chunk.columns:
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce', downcast=downcast)
+    return chunk
+
+
+def iter_apollo_chunks(path=DEFAULT_INPUT_PATH, chunk_size: int = CHUNK_SIZE, columns_to_drop=None, **read_csv_kwargs):
+    """
+    Yields DataFrame chunks of an Apollo export, reading only the columns not in
+    `columns_to_drop` (defaults to COLUMNS_TO_DROP). Extra keyword arguments go to read_csv.
+    The row index continues across chunks, matching a whole-file read.
+    """
+    skipped = set(COLUMNS_TO_DROP if columns_to_drop is None else columns_to_drop)
+    with pd.read_csv(path, usecols=lambda column: column not in skipped, dtype=_read_dtypes(),
+                     chunksize=chunk_size, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            yield clean_chunk(chunk)
+
+
+def concat_chunks(chunks) -> pd.DataFrame:
+    """
+    Concatenates chunks while keeping categorical columns categorical
+    (each chunk has its own categories, which plain pd.concat would turn into object columns).
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    categorical = [c for c in chunks[0].columns if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)]
+    unions = {c: union_categoricals([chunk[c] for chunk in chunks]) for c in categorical}
+    for column, union in unions.items():
+        for chunk in chunks:
+            chunk[column] = pd.Categorical(chunk[column], categories=union.categories)
+    return pd.concat(chunks)
+
+
+def load_apollo(path=DEFAULT_INPUT_PATH, chunk_size: int = CHUNK_SIZE, columns_to_drop=None, **read_csv_kwargs) -> pd.DataFrame:
+    """Loads a whole Apollo export through the chunked reader into one compact DataFrame."""
+    return concat_chunks(iter_apollo_chunks(path, chunk_size, columns_to_drop, **read_csv_kwargs))
+
+
+def main():
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="Stream an Apollo export in chunks and report its size.")
+    parser.add_argument('--input', default=os.path.join(project_root, DEFAULT_INPUT_PATH))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file not found: {args.input}")
+        return
+
+    total_rows = 0
+    largest_chunk_bytes = 0
+    for chunk in iter_apollo_chunks(args.input, args.chunk_size):
+        total_rows += len(chunk)
+        largest_chunk_bytes = max(largest_chunk_bytes, int(chunk.memory_usage(deep=True).sum()))
+    print(f"Read {total_rows} rows from {args.input}")
+    print(f"Largest chunk in memory: {largest_chunk_bytes / 1024 ** 2:.1f} MiB ({args.chunk_size} rows per chunk)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+This script benchmarks the vectorized format_phone_numbers() against the row-wise
+format_phone_number() (as used by process_excel before) on the Company Phone column
+of the Apollo export, and checks that both return exactly the same values.
+Without the export (or with --synthetic N) it benchmarks N generated numbers instead.
+"""
+import argparse
+import os
+import random
+import time
+import pandas as pd
+from apollo_loader import DEFAULT_INPUT_PATH
+from phone_formatter import format_phone_number, format_phone_numbers
+
+PHONE_COLUMN = 'Company Phone'
+REPEATS = 5
+
+
+def synthetic_phones(n: int, seed: int = 0) -> pd.Series:
+    """Generates phone strings covering the 00, +, 49/43, leading-0, fallback and missing cases."""
+    rng = random.Random(seed)
+    templates = ['0049 {a} {b}', '+49 {a} {b}', '+49 ({a}) {b}-0', '49{a}{b}', '43 {a} {b}', '0{a}/{b}',
+                 '0043 1 {b}', '41 {a} {b}', "'+41 {a} {b}'", ' {a}-{b} ', 'n/a', '']
+    phones = []
+    for _ in range(n):
+        if rng.random() < 0.1:
+            phones.append(None)
+            continue
+        template = rng.choice(templates)
+        phones.append(template.format(a=rng.randint(10, 9999), b=rng.randint(1000, 9999999)))
+    return pd.Series(phones, name=PHONE_COLUMN, dtype=object)
+
+
+def same_values(expected: pd.Series, actual: pd.Series) -> bool:
+    """Element-wise equality where missing values (None/NaN) count as equal."""
+    both_missing = expected.isna() & actual.isna()
+    return bool(((expected.astype(object) == actual.astype(object)) | both_missing).all())
+
+
+def best_time(func, repeats: int = REPEATS) -> tuple[float, object]:
+    """Returns the fastest of `repeats` runs (seconds) and the result of the last run."""
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="Benchmark row-wise vs. vectorized phone formatting.")
+    parser.add_argument('--input', default=os.path.join(project_root, DEFAULT_INPUT_PATH))
+    parser.add_argument('--synthetic', type=int, help="Benchmark N generated numbers instead of the Apollo export.")
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    if args.synthetic is None and os.path.exists(args.input):
+        phones = pd.read_csv(args.input, usecols=[PHONE_COLUMN], dtype=object)[PHONE_COLUMN]
+        source = args.input
+    else:
+        if args.synthetic is None:
+            print(f"Input file not found: {args.input}. Using 80000 synthetic numbers.")
+        phones = synthetic_phones(args.synthetic or 80000)
+        source = "synthetic numbers"
+
+    row_wise_seconds, expected = best_time(lambda: phones.astype(str).apply(format_phone_number), args.repeats)
+    vectorized_seconds, actual = best_time(lambda: format_phone_numbers(phones.astype(str)), args.repeats)
+    _, actual_raw = best_time(lambda: format_phone_numbers(phones), 1)
+    expected_raw = phones.map(format_phone_number)
+
+    print(f"Formatted {len(phones)} phone numbers from {source} (best of {args.repeats} runs):")
+    print(f"  row-wise   (astype(str).apply): {row_wise_seconds * 1000:8.1f} ms")
+    print(f"  vectorized (format_phone_numbers): {vectorized_seconds * 1000:8.1f} ms")
+    print(f"  speedup: {row_wise_seconds / vectorized_seconds:.1f}x")
+    identical = same_values(expected, actual) and same_values(expected_raw, actual_raw)
+    print(f"  identical results: {identical}")
+
+
+if __name__ == "__main__":
+    main()
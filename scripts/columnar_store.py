@@ -0,0 +1,200 @@
+"""
+This module is the storage layer for the project's intermediate datasets: partner profiles
+(the kgs*.xlsx data), generated company descriptions, the partner summaries parsed from the
+Kundenzusammenfassung, the per-Kunde extracted JSON attributes and the cleaned Apollo
+prospects. Each dataset is stored as typed Parquet under data/store/<name>/, optionally
+partitioned by a column (the prospects by 'Company Country'; the partition column is read
+back as a string column after the others). Readers load only the columns
+(and partitions) they ask for, through memory-mapped Arrow reads; Excel and CSV are export
+formats only.
+
+Usage:
+    python columnar_store.py import prospects data/processed/final_80k.csv
+    python columnar_store.py import-kunde-json data/Kunde_Structured_Output
+    python columnar_store.py export partners kgs_export.xlsx
+    python columnar_store.py info
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+DEFAULT_STORE_DIR = os.path.join("data", "store")
+# Datasets partitioned by default when they are written without an explicit partition column
+DEFAULT_PARTITIONS = {"prospects": "Company Country"}
+SINGLE_FILE_NAME = "part-0.parquet"
+
+
+def dataset_path(name: str, store_dir=DEFAULT_STORE_DIR) -> str:
+    """
+    Returns the directory of dataset `name`. Raises ValueError for names that are not a plain
+    directory name inside the store (path separators, '.', '..'), since write_dataset deletes
+    that directory before writing.
+    """
+    separators = [sep for sep in (os.sep, os.altsep, '/') if sep]
+    if not name or name in ('.', '..') or any(sep in name for sep in separators):
+        raise ValueError(f"Invalid dataset name: {name!r}")
+    store_root = os.path.realpath(store_dir)
+    path = os.path.realpath(os.path.join(store_dir, name))
+    if os.path.dirname(path) != store_root:
+        raise ValueError(f"Dataset '{name}' resolves to {path}, outside the store {store_root}")
+    return os.path.join(store_dir, name)
+
+
+def has_dataset(name: str, store_dir=DEFAULT_STORE_DIR) -> bool:
+    return os.path.isdir(dataset_path(name, store_dir))
+
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Makes object columns Arrow-friendly: columns holding only strings stay as they are, columns
+    mixing strings with other values (e.g. flags read from JSON as True and "Yes") become strings.
+    """
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        values = df[column]
+        present = values.notna()
+        if not values[present].map(lambda value: isinstance(value, str)).all():
+            df[column] = values.astype(object).where(~present, values[present].map(str))
+    return df
+
+
+def write_dataset(df: pd.DataFrame, name: str, store_dir=DEFAULT_STORE_DIR, partition_by: str | None = None) -> str:
+    """
+    Replaces dataset `name` with `df`. Partitioned datasets get one directory per value of
+    `partition_by` (defaults to DEFAULT_PARTITIONS); others are a single Parquet file.
+    Returns the dataset directory.
+    """
+    partition_by = partition_by or DEFAULT_PARTITIONS.get(name)
+    if partition_by and partition_by not in df.columns:
+        partition_by = None
+    path = dataset_path(name, store_dir)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    table = pa.Table.from_pandas(_typed(df), preserve_index=False)
+    if partition_by:
+        pq.write_to_dataset(table, path, partition_cols=[partition_by])
+    else:
+        pq.write_table(table, os.path.join(path, SINGLE_FILE_NAME))
+    return path
+
+
+def read_dataset(name: str, columns=None, filters=None, store_dir=DEFAULT_STORE_DIR) -> pd.DataFrame:
+    """
+    Loads dataset `name`, memory-mapping its Parquet files. `columns` restricts the columns
+    read; `filters` (pyarrow filter expressions, e.g. [('Company Country', '=', 'Germany')])
+    skips non-matching partitions and row groups.
+    """
+    path = dataset_path(name, store_dir)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Dataset '{name}' not found in {store_dir}")
+    # Partition values are read as plain strings: Arrow cannot merge per-partition dictionaries
+    # when one of the partitions holds the missing values
+    table = pq.read_table(path, columns=list(columns) if columns is not None else None, filters=filters,
+                          memory_map=True, partitioning=ds.HivePartitioning.discover(infer_dictionary=False))
+    return table.to_pandas()
+
+
+def dataset_columns(name: str, store_dir=DEFAULT_STORE_DIR) -> list[str]:
+    """Returns the column names of a dataset from its schema, without reading any data."""
+    return pq.ParquetDataset(dataset_path(name, store_dir)).schema.names
+
+
+def load_source_file(path: str) -> pd.DataFrame:
+    """Reads an .xlsx, .csv or .parquet file into a DataFrame."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xls'):
+        return pd.read_excel(path)
+    if extension == '.parquet':
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def load_kunde_attributes(base_dir: str) -> pd.DataFrame:
+    """Collects the extracted_data_Kunde N.json files below `base_dir` into one row per Kunde (latest file wins)."""
+    rows = {}
+    paths = sorted(glob.glob(os.path.join(base_dir, '**', 'extracted_data_Kunde*.json'), recursive=True),
+                   key=os.path.getmtime)
+    for path in paths:
+        match = re.search(r'Kunde\s*(\d+)', os.path.basename(path), re.IGNORECASE)
+        if not match:
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                attributes = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Skipping {path}: {e}")
+            continue
+        if isinstance(attributes, dict):
+            rows[int(match.group(1))] = {'Kunde': int(match.group(1)), **attributes}
+    return pd.DataFrame([rows[number] for number in sorted(rows)])
+
+
+def main():
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="Manage the Parquet datasets of the columnar store.")
+    parser.add_argument('--store-dir', default=os.path.join(project_root, DEFAULT_STORE_DIR))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help="Store an .xlsx/.csv/.parquet file as a dataset.")
+    import_parser.add_argument('name')
+    import_parser.add_argument('source')
+    import_parser.add_argument('--partition-by', help="Column to partition by (defaults per dataset).")
+
+    kunde_parser = subparsers.add_parser('import-kunde-json', help="Store the per-Kunde extracted JSON files.")
+    kunde_parser.add_argument('base_dir', nargs='?', default=os.path.join(project_root, 'data', 'Kunde_Structured_Output'))
+    kunde_parser.add_argument('--name', default='kunde_attributes')
+
+    export_parser = subparsers.add_parser('export', help="Export a dataset to .xlsx or .csv.")
+    export_parser.add_argument('name')
+    export_parser.add_argument('output')
+    export_parser.add_argument('--columns', nargs='+')
+
+    subparsers.add_parser('info', help="List the stored datasets.")
+    args = parser.parse_args()
+
+    if args.command != 'info':
+        try:
+            dataset_path(args.name, args.store_dir)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+
+    if args.command == 'import':
+        df = load_source_file(args.source)
+        path = write_dataset(df, args.name, args.store_dir, args.partition_by)
+        print(f"Stored {len(df)} rows from {args.source} as {path}")
+    elif args.command == 'import-kunde-json':
+        df = load_kunde_attributes(args.base_dir)
+        if df.empty:
+            print(f"No extracted_data_Kunde*.json files found below {args.base_dir}")
+            return
+        path = write_dataset(df, args.name, args.store_dir)
+        print(f"Stored {len(df)} Kunden as {path}")
+    elif args.command == 'export':
+        df = read_dataset(args.name, args.columns, store_dir=args.store_dir)
+        if args.output.lower().endswith('.xlsx'):
+            from excel_export import write_table_workbook
+            write_table_workbook(df, args.output, sheet_name=args.name[:31], table_name=re.sub(r'\W', '_', args.name))
+        else:
+            df.to_csv(args.output, index=False, encoding='utf-8')
+        print(f"Exported {len(df)} rows of '{args.name}' to {args.output}")
+    else:
+        names = sorted(entry for entry in os.listdir(args.store_dir)
+                       if os.path.isdir(os.path.join(args.store_dir, entry))) if os.path.isdir(args.store_dir) else []
+        for name in names:
+            metadata = pq.ParquetDataset(dataset_path(name, args.store_dir))
+            rows = sum(fragment.count_rows() for fragment in metadata.fragments)
+            print(f"{name}: {rows} rows, {len(metadata.files)} file(s), columns: {', '.join(metadata.schema.names)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,113 @@ This script extracts data from structured markdown files (Kunde X.md) located in
 within a base directory, and compiles this information into an Excel file.
 It parses specific fields from each markdown file, including contact information,
 and formats the output into a structured table.
+The folders are parsed in a process pool (KUNDEN_WORKERS processes, default one per CPU)
+with the field patterns compiled once per profile; rows keep the sorted folder order.
+With KUNDEN_INCREMENTAL=1, a manifest (KUNDEN_MANIFEST, default kgs_manifest.json in the
+input directory) stores the file mtimes, sizes and hashes and the parsed row of every
+Kunde, so only folders whose files changed are parsed again.
+Besides the kgs<timestamp>.xlsx export, the rows are stored as the "partners" dataset of the
+columnar store (KUNDEN_STORE_DIR, default data/store), which downstream steps read.
+Stage timings and the number of fallback patterns used are written to a JSON run report
+in data/run_reports/.
 """
+import collections
+import functools
+import hashlib
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 # from phone_formatter import format_phone_number  # Import the formatter
 import json
 from datetime import datetime
 from dotenv import load_dotenv  # Import dotenv
+from columnar_store import DEFAULT_STORE_DIR, write_dataset
+from excel_export import write_table_workbook
+import run_metrics
+
+# Fields read from the numbered "N.  **`Field Name:`** Value" lines of a Kunde X.md file
+MARKDOWN_FIELDS = [
+    "Company Name",
+    "Industry",
+    "Products/Services Offered",
+    "USP (Unique Selling Proposition) / Key Selling Points",
+    "Customer Target Segments",
+    "Business Model",
+    "Company Size Indicators",
+    "Innovation Level Indicators",
+    "Geographic Reach"
+]
+FOLDERS_PER_TASK = 16 # Kunde folders handed to a worker process at a time
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+PARTNERS_DATASET = "partners" # Columnar store dataset holding the rows of the workbook
+MANIFEST_FILE_NAME = "kgs_manifest.json" # Default manifest location (inside the input directory) for incremental runs
+
+# Contact information patterns
+WEBSITE_PATTERN = re.compile(r"Website:\s*([^;\n(]+)", re.IGNORECASE)
+EMAIL_PATTERN = re.compile(r"Email:\s*([^;\n(]+)", re.IGNORECASE)
+# Captures more of the phone number, stopping at a clear delimiter or end of common patterns
+PHONE_PATTERN = re.compile(
+    r"Phone:\s*(.*?)(?=\s*;\s*Email:|\s*;\s*Website:|\s*\n\s*\*|\s*\(Email:|\s*\(Website:|\s*\Z)",
+    re.IGNORECASE | re.DOTALL
+)
+BULLET_WEBSITE_PATTERN = re.compile(r"^\s*\*\s*Website:\s*(.*)", re.IGNORECASE | re.MULTILINE)
+BULLET_EMAIL_PATTERN = re.compile(r"^\s*\*\s*Email:\s*(.*)", re.IGNORECASE | re.MULTILINE)
+BULLET_PHONE_PATTERN = re.compile(r"^\s*\*\s*Phone:\s*(.*)", re.IGNORECASE | re.MULTILINE)
+
+# Regex to find the entire "10.  **`Contact Information:`**..." block
+CONTACT_BLOCK_PATTERN = re.compile(
+    r"^\s*10\.\s*\*\*`Contact Information:`\*\*\s*(.*?)"+
+    r"(?=\n\s*(?:\d+\.\s*)?\*\*`[\w\s()/:.'-]+:`\*\*|\n\s*Okay, I have processed|\Z)",  # Lookahead for next field or end
+    re.DOTALL | re.IGNORECASE | re.MULTILINE
+)
+# Fallback if the "10." numbered pattern for contact info isn't found
+GENERIC_CONTACT_BLOCK_PATTERN = re.compile(
+    r"\*\*`Contact Information:`\*\*\s*(.*?)"+
+    r"(?=\n\s*(?:\d+\.\s*)?\*\*`[\w\s()/:.'-]+:`\*\*|\n\s*Okay, I have processed|\Z)",
+    re.DOTALL | re.IGNORECASE
+)
+
+
+# Define profiles
+PROFILES = {
+    "v1": {
+        "fields_to_extract": [
+            "Company Name", "Industry", "Products/Services Offered",
+            "USP (Unique Selling Proposition) / Key Selling Points", "Customer Target Segments",
+            "Business Model", "Company Size Indicators", "Innovation Level Indicators",
+            "Geographic Reach", "Website", "Email", "Phone"
+        ],
+        "column_order": [
+            "Company Name", "Industry", "Products/Services Offered",
+            "USP (Unique Selling Proposition) / Key Selling Points", "Customer Target Segments",
+            "Business Model", "Company Size Indicators", "Innovation Level Indicators",
+            "Geographic Reach", "Website", "Email", "Phone",
+            "Source Document Section/Notes", "Is_Successful_Partner"
+        ]
+    },
+    "v2": {
+        "fields_to_extract": [
+            "Company Name", "Industry", "Products/Services Offered",
+            "USP (Unique Selling Proposition) / Key Selling Points", "Customer Target Segments",
+            "Business Model", "Company Size Indicators", "Innovation Level Indicators",
+            "Geographic Reach", "Website", "Email", "Phone",
+            "Targets_Specific_Industry_Type", "Is_Startup", "Is_AI_Software",
+            "Is_Innovative_Product", "Is_Disruptive_Product", "Is_VC_Funded",
+            "Is_SaaS_Software", "Is_Complex_Solution", "Is_Investment_Product"
+        ],
+        "column_order": [
+            "Company Name", "Industry", "Products/Services Offered",
+            "USP (Unique Selling Proposition) / Key Selling Points", "Customer Target Segments",
+            "Business Model", "Company Size Indicators", "Innovation Level Indicators",
+            "Geographic Reach", "Website", "Email", "Phone",
+            "Targets_Specific_Industry_Type", "Is_Startup", "Is_AI_Software",
+            "Is_Innovative_Product", "Is_Disruptive_Product", "Is_VC_Funded",
+            "Is_SaaS_Software", "Is_Complex_Solution", "Is_Investment_Product",
+            "Source Document Section/Notes", "Is_Successful_Partner"
+        ]
+    }
+}
 
 
 def parse_contact_info(contact_section_text):
@@ -23,17 +122,15 @@ def parse_contact_info(contact_section_text):
     # Try to find on the same line as a potential "Contact Information:" header text (if any was passed)
     # or just generally within the block.
     # Pattern: Key: Value (potentially followed by ; or (Not found) or end of line)
-    website_match = re.search(r"Website:\s*([^;\n(]+)", contact_section_text, re.IGNORECASE)
+    website_match = WEBSITE_PATTERN.search(contact_section_text)
     if website_match and "not found" not in website_match.group(1).lower():
         website = website_match.group(1).strip()
 
-    email_match = re.search(r"Email:\s*([^;\n(]+)", contact_section_text, re.IGNORECASE)
+    email_match = EMAIL_PATTERN.search(contact_section_text)
     if email_match and "not found" not in email_match.group(1).lower():
         email = email_match.group(1).strip()
 
-    # Regex to capture more of the phone number, stopping at a clear delimiter or end of common patterns
-    phone_pattern = r"Phone:\s*(.*?)(?=\s*;\s*Email:|\s*;\s*Website:|\s*\n\s*\*|\s*\(Email:|\s*\(Website:|\s*\Z)"
-    phone_match = re.search(phone_pattern, contact_section_text, re.IGNORECASE | re.DOTALL)
+    phone_match = PHONE_PATTERN.search(contact_section_text)
     if phone_match:
         raw_phone = phone_match.group(1).strip()
         if "not found" not in raw_phone.lower():
@@ -42,17 +139,17 @@ def parse_contact_info(contact_section_text):
     # If not all found, or to catch bulleted items specifically
     # Look for bulleted items (multi-line format)
     if not website:
-        bullet_website_match = re.search(r"^\s*\*\s*Website:\s*(.*)", contact_section_text, re.IGNORECASE | re.MULTILINE)
+        bullet_website_match = BULLET_WEBSITE_PATTERN.search(contact_section_text)
         if bullet_website_match and "not found" not in bullet_website_match.group(1).lower():
             website = bullet_website_match.group(1).strip()
 
     if not email:
-        bullet_email_match = re.search(r"^\s*\*\s*Email:\s*(.*)", contact_section_text, re.IGNORECASE | re.MULTILINE)
+        bullet_email_match = BULLET_EMAIL_PATTERN.search(contact_section_text)
         if bullet_email_match and "not found" not in bullet_email_match.group(1).lower():
             email = bullet_email_match.group(1).strip()
 
     if not phone:  # If not found in single-line style or needs specific bullet parsing
-        bullet_phone_match = re.search(r"^\s*\*\s*Phone:\s*(.*)", contact_section_text, re.IGNORECASE | re.MULTILINE)
+        bullet_phone_match = BULLET_PHONE_PATTERN.search(contact_section_text)
         if bullet_phone_match:
             raw_phone_bullet = bullet_phone_match.group(1).strip()
             if "not found" not in raw_phone_bullet.lower():
@@ -61,9 +158,38 @@ def parse_contact_info(contact_section_text):
     return website, email, phone
 
 
-def parse_kunde_md(file_path, kunde_identifier):
+@functools.lru_cache(maxsize=None)
+def compile_field_patterns(fields):
+    """
+    Compiles the numbered and the fallback pattern of each field. `fields` is a tuple, so the
+    patterns are compiled once per profile (and process) and reused for every file.
+    Returns a list of (field, pattern, fallback_pattern).
+    """
+    compiled = []
+    for field in fields:
+        # Regex to find "N.  **`Field Name:`** Value"
+        # Anchored to line start, handles multi-line values, stops before next numbered field.
+        # The lookahead also considers a potential "Okay, I have processed..." line sometimes found at the end.
+        pattern = re.compile(
+            r"^\s*(?:\d+\.\s*)?\*\*`" + re.escape(field) +
+            r":\`\*\*\s*(.*?)(?=\n\s*\d+\.\s*\*\*`[\w\s()/:.'-]+:`\*\*|\n\s*Okay, I have processed|\Z)",
+            re.DOTALL | re.IGNORECASE | re.MULTILINE
+        )
+        # Fallback for fields that might not be numbered or have slight variations
+        # This is a more general pattern, less strict about numbering.
+        fallback_pattern = re.compile(
+            r"\*\*`" + re.escape(field) +
+            r":\`\*\*\s*(.*?)(?=\n\s*\*\*`[\w\s()/:.'-]+:`\*\*|\n\s*Okay, I have processed|\Z)",
+            re.DOTALL | re.IGNORECASE
+        )
+        compiled.append((field, pattern, fallback_pattern))
+    return compiled
+
+
+def parse_kunde_md(file_path, kunde_identifier, fields_to_extract=tuple(MARKDOWN_FIELDS), fallbacks=None):
     """
     Parses a single Kunde X.md file and extracts the required information.
+    If a Counter is passed as `fallbacks`, the fallback patterns that matched are counted in it.
     """
     data = {
         "Company Name": None,
@@ -114,27 +240,7 @@ def parse_kunde_md(file_path, kunde_identifier):
                 return None
 
         # General field extraction
-        fields_to_extract = [
-            "Company Name",
-            "Industry",
-            "Products/Services Offered",
-            "USP (Unique Selling Proposition) / Key Selling Points",
-            "Customer Target Segments",
-            "Business Model",
-            "Company Size Indicators",
-            "Innovation Level Indicators",
-            "Geographic Reach"
-        ]
-
-        for field in fields_to_extract:
-            # Regex to find "N.  **`Field Name:`** Value"
-            # Anchored to line start, handles multi-line values, stops before next numbered field.
-            # The lookahead also considers a potential "Okay, I have processed..." line sometimes found at the end.
-            pattern = re.compile(
-                r"^\s*(?:\d+\.\s*)?\*\*`" + re.escape(field) +
-                r":\`\*\*\s*(.*?)(?=\n\s*\d+\.\s*\*\*`[\w\s()/:.'-]+:`\*\*|\n\s*Okay, I have processed|\Z)",
-                re.DOTALL | re.IGNORECASE | re.MULTILINE
-            )
+        for field, pattern, fallback_pattern in compile_field_patterns(fields_to_extract):
             match = pattern.search(content)
             if match:
                 value = match.group(1).strip()
@@ -143,15 +249,10 @@ def parse_kunde_md(file_path, kunde_identifier):
                 else:
                     data[field] = value
             else:
-                # Fallback for fields that might not be numbered or have slight variations
-                # This is a more general pattern, less strict about numbering.
-                fallback_pattern = re.compile(
-                    r"\*\*`" + re.escape(field) +
-                    r":\`\*\*\s*(.*?)(?=\n\s*\*\*`[\w\s()/:.'-]+:`\*\*|\n\s*Okay, I have processed|\Z)",
-                    re.DOTALL | re.IGNORECASE
-                )
                 fallback_match = fallback_pattern.search(content)
                 if fallback_match:
+                    if fallbacks is not None:
+                        fallbacks["parse_kunde_md.field_fallbacks"] += 1
                     value = fallback_match.group(1).strip()
                     if value.lower() == "not found":
                         data[field] = ""
@@ -159,13 +260,7 @@ def parse_kunde_md(file_path, kunde_identifier):
                         data[field] = value
 
         # Contact Information extraction
-        # Regex to find the entire "10.  **`Contact Information:`**..." block
-        contact_block_pattern = re.compile(
-            r"^\s*10\.\s*\*\*`Contact Information:`\*\*\s*(.*?)"+
-            r"(?=\n\s*(?:\d+\.\s*)?\*\*`[\w\s()/:.'-]+:`\*\*|\n\s*Okay, I have processed|\Z)",  # Lookahead for next field or end
-            re.DOTALL | re.IGNORECASE | re.MULTILINE
-        )
-        contact_block_match = contact_block_pattern.search(content)
+        contact_block_match = CONTACT_BLOCK_PATTERN.search(content)
 
         if contact_block_match:
             contact_block_text = contact_block_match.group(1).strip()
@@ -174,13 +269,10 @@ def parse_kunde_md(file_path, kunde_identifier):
             data["Email"] = email if email else ""
             data["Phone"] = phone if phone else ""
         else:  # Fallback if the "10." numbered pattern for contact info isn't found
-            generic_contact_block_pattern = re.compile(
-                r"\*\*`Contact Information:`\*\*\s*(.*?)"+
-                r"(?=\n\s*(?:\d+\.\s*)?\*\*`[\w\s()/:.'-]+:`\*\*|\n\s*Okay, I have processed|\Z)",
-                re.DOTALL | re.IGNORECASE
-            )
-            generic_contact_block_match = generic_contact_block_pattern.search(content)
+            generic_contact_block_match = GENERIC_CONTACT_BLOCK_PATTERN.search(content)
             if generic_contact_block_match:
+                if fallbacks is not None:
+                    fallbacks["parse_kunde_md.contact_fallbacks"] += 1
                 contact_block_text = generic_contact_block_match.group(1).strip()
                 website, email, phone = parse_contact_info(contact_block_text)
                 data["Website"] = website if website else ""
@@ -197,6 +289,105 @@ def parse_kunde_md(file_path, kunde_identifier):
     return data
 
 
+def parse_kunde_folder(task):
+    """
+    Parses one "Kunde X" folder: its Kunde X.md file and, for the v2 profile, the extracted
+    JSON attributes. Runs in a worker process, so warnings are returned instead of printed
+    to keep the output in folder order, and the fallback counts are returned for the run report.
+    Returns (extracted_data or None, warnings, fallback counts).
+    """
+    base_dir, kunde_folder_name, profile_name, markdown_fields = task
+    warnings = []
+    fallbacks = collections.Counter()
+    kunde_folder_path = os.path.join(base_dir, kunde_folder_name)
+    # Expecting folder names like "Kunde 1", "Kunde 2", etc.
+    # And files like "Kunde 1.md"
+    md_file_name = f"{kunde_folder_name}.md"
+    md_file_path = os.path.join(kunde_folder_path, md_file_name)
+    extracted_data = parse_kunde_md(md_file_path, kunde_folder_name, markdown_fields, fallbacks)
+
+    if extracted_data:
+        if profile_name == "v2":
+            # Load additional data from JSON file
+            json_file_path = os.path.join(kunde_folder_path, "extracted_data_" + kunde_folder_name + ".json")
+            try:
+                with open(json_file_path, 'r', encoding='utf-8') as j_file:
+                    additional_data = json.load(j_file)
+                    extracted_data.update(additional_data)  # Merge dictionaries
+            except FileNotFoundError:
+                warnings.append(f"Warning: JSON file not found: {json_file_path}")
+            except json.JSONDecodeError:
+                warnings.append(f"Warning: Invalid JSON format in: {json_file_path}")
+    else:
+        warnings.append(f"Warning: Markdown file {md_file_name} not found in {kunde_folder_path}")
+    return extracted_data, warnings, fallbacks
+
+
+def folder_files(base_dir, kunde_folder_name):
+    """Returns the paths of the files a Kunde row is built from: the .md file and the extracted JSON."""
+    kunde_folder_path = os.path.join(base_dir, kunde_folder_name)
+    return [os.path.join(kunde_folder_path, f"{kunde_folder_name}.md"),
+            os.path.join(kunde_folder_path, "extracted_data_" + kunde_folder_name + ".json")]
+
+
+def folder_signature(base_dir, kunde_folder_name):
+    """Returns [mtime_ns, size] for each file of the folder ([] for missing files)."""
+    signature = []
+    for path in folder_files(base_dir, kunde_folder_name):
+        try:
+            stat = os.stat(path)
+            signature.append([stat.st_mtime_ns, stat.st_size])
+        except FileNotFoundError:
+            signature.append([])
+    return signature
+
+
+def folder_hash(base_dir, kunde_folder_name):
+    """SHA-256 over the contents of the folder's files (a missing file counts as empty)."""
+    digest = hashlib.sha256()
+    for path in folder_files(base_dir, kunde_folder_name):
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            content = b""
+        digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+
+def is_unchanged(entry, signature, base_dir, kunde_folder_name):
+    """
+    True if the manifest entry still describes the folder. Matching mtimes and sizes are
+    trusted; otherwise the contents are hashed, so touched but unchanged files are not re-parsed.
+    """
+    if entry.get("signature") == signature:
+        return True
+    return entry.get("hash") == folder_hash(base_dir, kunde_folder_name)
+
+
+def load_manifest(manifest_path, profile_name):
+    """Returns the manifest entries keyed by folder name; {} if there is none or it was built for another profile."""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError:
+        print(f"Warning: Ignoring invalid manifest: {manifest_path}")
+        return {}
+    if manifest.get("profile") != profile_name:
+        return {}
+    return manifest.get("kunden", {})
+
+
+def save_manifest(manifest_path, profile_name, entries):
+    # Write to a temporary file first so an interrupted run never leaves a truncated manifest
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"profile": profile_name, "kunden": entries}, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+
 import logging
 
 # Configure logging
@@ -217,6 +408,13 @@ def main():
         profile_env_var = "KUNDEN_PROFILE"
         profile_name = os.getenv(profile_env_var, "v1")  # Default to "v1" if not set
 
+        workers_env_var = "KUNDEN_WORKERS"
+        workers = int(os.getenv(workers_env_var, "0")) or os.cpu_count()  # Default to one process per CPU
+
+        incremental_env_var = "KUNDEN_INCREMENTAL"
+        incremental = os.getenv(incremental_env_var, "").lower() in ("1", "true", "yes")
+        manifest_path = os.getenv("KUNDEN_MANIFEST") or os.path.join(base_dir, MANIFEST_FILE_NAME)
+
         now = datetime.now()
         timestamp = now.strftime("%Y%m%d_%H%M%S")
         output_file = f"kgs{timestamp}.xlsx"
@@ -228,144 +426,105 @@ def main():
             return
 
         # Get folder names and sort them numerically
-        folder_names = os.listdir(base_dir)
-
-        def get_kunde_number(name):
-            # Extracts the number from "Kunde X" or "KundeX"
-            match = re.search(r'Kunde\s*(\d+)', name, re.IGNORECASE)
-            return int(match.group(1)) if match else float('inf')
-
-        sorted_folder_names = sorted(folder_names, key=get_kunde_number)
-
-        # Define profiles
-        profiles = {
-            "v1": {
-                "fields_to_extract": [
-                    "Company Name", "Industry", "Products/Services Offered",
-                    "USP (Unique Selling Proposition) / Key Selling Points", "Customer Target Segments",
-                    "Business Model", "Company Size Indicators", "Innovation Level Indicators",
-                    "Geographic Reach", "Website", "Email", "Phone"
-                ],
-                "column_order": [
-                    "Company Name", "Industry", "Products/Services Offered",
-                    "USP (Unique Selling Proposition) / Key Selling Points", "Customer Target Segments",
-                    "Business Model", "Company Size Indicators", "Innovation Level Indicators",
-                    "Geographic Reach", "Website", "Email", "Phone",
-                    "Source Document Section/Notes", "Is_Successful_Partner"
-                ]
-            },
-            "v2": {
-                "fields_to_extract": [
-                    "Company Name", "Industry", "Products/Services Offered",
-                    "USP (Unique Selling Proposition) / Key Selling Points", "Customer Target Segments",
-                    "Business Model", "Company Size Indicators", "Innovation Level Indicators",
-                    "Geographic Reach", "Website", "Email", "Phone",
-                    "Targets_Specific_Industry_Type", "Is_Startup", "Is_AI_Software",
-                    "Is_Innovative_Product", "Is_Disruptive_Product", "Is_VC_Funded",
-                    "Is_SaaS_Software", "Is_Complex_Solution", "Is_Investment_Product"
-                ],
-                "column_order": [
-                    "Company Name", "Industry", "Products/Services Offered",
-                    "USP (Unique Selling Proposition) / Key Selling Points", "Customer Target Segments",
-                    "Business Model", "Company Size Indicators", "Innovation Level Indicators",
-                    "Geographic Reach", "Website", "Email", "Phone",
-                    "Targets_Specific_Industry_Type", "Is_Startup", "Is_AI_Software",
-                    "Is_Innovative_Product", "Is_Disruptive_Product", "Is_VC_Funded",
-                    "Is_SaaS_Software", "Is_Complex_Solution", "Is_Investment_Product",
-                    "Source Document Section/Notes", "Is_Successful_Partner"
-                ]
-            }
-        }
-
-        if profile_name not in profiles:
-            print(f"Error: Invalid profile name: {profile_name}")
-            return
-
-        profile = profiles[profile_name]
-        fields_to_extract = profile["fields_to_extract"]
-        column_order = profile["column_order"]
-
-        all_kunden_data = []
-        for kunde_folder_name in sorted_folder_names:
-            kunde_folder_path = os.path.join(base_dir, kunde_folder_name)
-            if os.path.isdir(kunde_folder_path):
-                # Expecting folder names like "Kunde 1", "Kunde 2", etc.
-                # And files like "Kunde 1.md"
-                md_file_name = f"{kunde_folder_name}.md"
-                md_file_path = os.path.join(kunde_folder_path, md_file_name)
-                extracted_data = parse_kunde_md(md_file_path, kunde_folder_name)
-
+        with run_metrics.stage("list_folders") as timing:
+            folder_names = os.listdir(base_dir)
+
+            def get_kunde_number(name):
+                # Extracts the number from "Kunde X" or "KundeX"
+                match = re.search(r'Kunde\s*(\d+)', name, re.IGNORECASE)
+                return int(match.group(1)) if match else float('inf')
+
+            sorted_folder_names = sorted(folder_names, key=get_kunde_number)
+
+            if profile_name not in PROFILES:
+                print(f"Error: Invalid profile name: {profile_name}")
+                return
+
+            profile = PROFILES[profile_name]
+            fields_to_extract = profile["fields_to_extract"]
+            column_order = profile["column_order"]
+
+            markdown_fields = tuple(field for field in fields_to_extract if field in MARKDOWN_FIELDS)
+            tasks = [(base_dir, name, profile_name, markdown_fields) for name in sorted_folder_names
+                     if os.path.isdir(os.path.join(base_dir, name))]
+        print(f"Timing: listed {len(tasks)} Kunde folders in {timing['seconds']:.2f}s")
+
+        with run_metrics.stage("check_manifest") as timing:
+            manifest = load_manifest(manifest_path, profile_name) if incremental else {}
+            signatures = {task[1]: folder_signature(base_dir, task[1]) for task in tasks} if incremental else {}
+            reused = {}
+            for name, signature in signatures.items():
+                entry = manifest.get(name)
+                if entry and is_unchanged(entry, signature, base_dir, name):
+                    reused[name] = entry
+            pending = [task for task in tasks if task[1] not in reused]
+        if incremental:
+            print(f"Timing: checked the manifest in {timing['seconds']:.2f}s "
+                  f"({len(reused)} unchanged, {len(pending)} new or changed Kunde folders)")
+        run_metrics.incr("kunde_folders.reused", len(reused))
+        run_metrics.incr("kunde_folders.parsed", len(pending))
+
+        with run_metrics.stage("parse_folders") as timing:
+            use_pool = workers > 1 and len(pending) > FOLDERS_PER_TASK
+            if use_pool:
+                # map() returns the results in folder order, whatever order the workers finish in
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(parse_kunde_folder, pending, chunksize=FOLDERS_PER_TASK))
+            else:
+                results = [parse_kunde_folder(task) for task in pending]
+            parsed = {task[1]: result for task, result in zip(pending, results)}
+
+            all_kunden_data = []
+            new_manifest = {}
+            for _, name, _, _ in tasks:
+                if name in reused:
+                    entry = reused[name]
+                    extracted_data, warnings = entry["row"], entry["warnings"]
+                else:
+                    extracted_data, warnings, fallbacks = parsed[name]
+                    run_metrics.count_all(fallbacks)
+                    if incremental:
+                        entry = {"hash": folder_hash(base_dir, name), "row": extracted_data, "warnings": warnings}
+                if incremental:
+                    new_manifest[name] = dict(entry, signature=signatures[name])
+                for warning in warnings:
+                    print(warning)
                 if extracted_data:
-                    if profile_name == "v2":
-                        # Load additional data from JSON file
-                        json_file_path = os.path.join(kunde_folder_path, "extracted_data_" + kunde_folder_name + ".json")
-                        try:
-                            with open(json_file_path, 'r', encoding='utf-8') as j_file:
-                                additional_data = json.load(j_file)
-                                extracted_data.update(additional_data)  # Merge dictionaries
-                            
-                        except FileNotFoundError:
-                            print(f"Warning: JSON file not found: {json_file_path}")
-                            additional_data = {} # Set to empty dict so it doesn't break
-                        except json.JSONDecodeError:
-                            print(f"Warning: Invalid JSON format in: {json_file_path}")
-                            additional_data = {} # Set to empty dict so it doesn't break
-
                     all_kunden_data.append(extracted_data)
-                else:
-                    print(f"Warning: Markdown file {md_file_name} not found in {kunde_folder_path}")
+        print(f"Timing: parsed {len(pending)} Kunde folders in {timing['seconds']:.2f}s "
+              f"({workers if use_pool else 1} process(es))")
+        if incremental:
+            save_manifest(manifest_path, profile_name, new_manifest)
 
         if all_kunden_data:
             print(f"all_kunden_data contains {len(all_kunden_data)} entries")
-            df = pd.DataFrame(all_kunden_data)
+            with run_metrics.stage("build_dataframe") as timing:
+                df = pd.DataFrame(all_kunden_data)
 
-            # Ensure correct column order
-            df = df[column_order]
+                # Ensure correct column order
+                df = df[column_order]
+            print(f"Timing: built the DataFrame in {timing['seconds']:.2f}s")
 
+            # The Parquet dataset is what downstream steps read; the workbook is an export
+            store_dir = os.getenv("KUNDEN_STORE_DIR") or os.path.join(PROJECT_ROOT, DEFAULT_STORE_DIR)
             try:
-                print(f"Writing data to Excel file: {output_file}")
-                # Use ExcelWriter to gain access to the workbook and worksheet objects for formatting
-                with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='KundenData')
-
-                    # Auto-adjust columns' width
-                    worksheet = writer.sheets['KundenData']
-                    for column_cells in worksheet.columns:
-                        max_length = 0
-                        column_letter = column_cells[0].column_letter
-                        for cell in column_cells:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except Exception as e:
-                                print(f"Error adjusting column width: {e}")
-                            adjusted_width = (max_length + 2)
-                            worksheet.column_dimensions[column_letter].width = adjusted_width
-
-                    # Define the table range
-                    # The table range will be from A1 to the last column and last row
-                    # df.shape[0] is number of rows, df.shape[1] is number of columns
-                    # Add 1 to rows for the header
-                    # Convert column number to letter for the last column
-                    from openpyxl.utils import get_column_letter
-                    last_column_letter = get_column_letter(df.shape[1])
-                    table_range = f"A1:{last_column_letter}{df.shape[0] + 1}"
-
-                    # Create a table
-                    from openpyxl.worksheet.table import Table, TableStyleInfo
-                    tab = Table(displayName="KundenTable", ref=table_range)
-
-                    # Add a default style to the table
-                    style = TableStyleInfo(name="TableStyleMedium9", showFirstColumn=False,
-                                           showLastColumn=False, showRowStripes=True, showColumnStripes=False)
-                    tab.tableStyleInfo = style
-                    worksheet.add_table(tab)
+                with run_metrics.stage("write_store") as timing:
+                    store_path = write_dataset(df, PARTNERS_DATASET, store_dir)
+                print(f"Timing: stored the partner profiles in {store_path} in {timing['seconds']:.2f}s")
+            except Exception as e:
+                print(f"Error writing the partner profiles to the columnar store {store_dir}: {e}")
 
+            try:
+                print(f"Writing data to Excel file: {output_file}")
+                with run_metrics.stage("write_excel") as timing:
+                    write_table_workbook(df, output_file, sheet_name='KundenData', table_name="KundenTable")
+                print(f"Timing: wrote the Excel file in {timing['seconds']:.2f}s")
                 print(f"Successfully created Excel file: {output_file}")
             except Exception as e:
                 print(f"Error writing to Excel file {output_file}: {e}")
         else:
             print("No data extracted. Exiting.")
+        print(f"Wrote the run report to {run_metrics.write_report({'profile': profile_name})}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
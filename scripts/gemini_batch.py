@@ -0,0 +1,179 @@
+"""
+This module submits many prompts to the Gemini API as a single Batch-mode job.
+It writes the prompts to a JSONL batch file, uploads it through the Files API,
+creates a batch job, polls until the job reaches a terminal state and downloads
+the responses, returning the response text for every request key.
+Token usage reported for the batch responses is added to the run metrics.
+An optional REST generationConfig (e.g. JSON response mode with a response schema) is sent
+with every request of the batch.
+The API base URL can be overridden with GEMINI_API_BASE_URL (e.g. to point at a
+local stand-in server).
+"""
+import json
+import os
+import time
+import urllib.request
+from gemini_client import retry_call
+import run_metrics
+
+DEFAULT_API_BASE_URL = "https://generativelanguage.googleapis.com"
+API_BASE_URL_ENV_VAR = "GEMINI_API_BASE_URL"
+POLL_INTERVAL_SECONDS = 30
+TERMINAL_STATE_SUFFIXES = ("_SUCCEEDED", "_FAILED", "_CANCELLED", "_EXPIRED")
+
+
+def get_api_base_url() -> str:
+    """Returns the Gemini API base URL, honoring the GEMINI_API_BASE_URL override."""
+    return os.getenv(API_BASE_URL_ENV_VAR, DEFAULT_API_BASE_URL).rstrip('/')
+
+
+def _send_request(request):
+    with urllib.request.urlopen(request) as response:
+        return response.headers, response.read()
+
+
+def _request(method, url, api_key, body=None, headers=None):
+    """
+    Sends an HTTP request to the Gemini API, retrying 429/5xx responses with backoff.
+    Returns (response_headers, response_body_bytes).
+    """
+    request_headers = {"x-goog-api-key": api_key}
+    if headers:
+        request_headers.update(headers)
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body).encode('utf-8')
+        request_headers.setdefault("Content-Type", "application/json")
+    request = urllib.request.Request(url, data=body, headers=request_headers, method=method)
+    return retry_call(_send_request, request)
+
+
+def write_batch_file(prompts: dict[str, str], batch_file_path, generation_config: dict | None = None) -> None:
+    """
+    Writes one GenerateContent request per line, keyed by the dict keys (e.g. "Kunde_1").
+    `generation_config` is added to every request as its REST generationConfig.
+    """
+    with open(batch_file_path, 'w', encoding='utf-8') as f:
+        for key, prompt in prompts.items():
+            line = {"key": key, "request": {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}}
+            if generation_config:
+                line["request"]["generationConfig"] = generation_config
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def upload_batch_file(batch_file_path, api_key, base_url=None) -> str:
+    """Uploads the batch file with the resumable upload protocol. Returns the file resource name."""
+    base_url = base_url or get_api_base_url()
+    with open(batch_file_path, 'rb') as f:
+        data = f.read()
+    start_headers, _ = _request(
+        "POST", f"{base_url}/upload/v1beta/files", api_key,
+        body={"file": {"display_name": os.path.basename(str(batch_file_path))}},
+        headers={
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(len(data)),
+            "X-Goog-Upload-Header-Content-Type": "application/jsonl",
+        }
+    )
+    upload_url = start_headers.get("X-Goog-Upload-URL")
+    if not upload_url:
+        raise RuntimeError("Gemini Files API did not return an upload URL.")
+    _, body = _request(
+        "POST", upload_url, api_key, body=data,
+        headers={
+            "Content-Length": str(len(data)),
+            "X-Goog-Upload-Offset": "0",
+            "X-Goog-Upload-Command": "upload, finalize",
+        }
+    )
+    return json.loads(body)["file"]["name"]
+
+
+def create_batch_job(file_name, model_name, api_key, display_name, base_url=None) -> str:
+    """Creates a batch job over an uploaded batch file. Returns the batch resource name."""
+    base_url = base_url or get_api_base_url()
+    _, body = _request(
+        "POST", f"{base_url}/v1beta/models/{model_name}:batchGenerateContent", api_key,
+        body={"batch": {"display_name": display_name, "input_config": {"file_name": file_name}}}
+    )
+    return json.loads(body)["name"]
+
+
+def wait_for_batch(batch_name, api_key, base_url=None, poll_interval=POLL_INTERVAL_SECONDS, timeout=None) -> dict:
+    """Polls the batch job until it reaches a terminal state. Returns the final batch resource."""
+    base_url = base_url or get_api_base_url()
+    started = time.monotonic()
+    while True:
+        _, body = _request("GET", f"{base_url}/v1beta/{batch_name}", api_key)
+        batch = json.loads(body)
+        state = batch.get("metadata", {}).get("state", "")
+        if batch.get("done") or state.endswith(TERMINAL_STATE_SUFFIXES):
+            return batch
+        if timeout is not None and time.monotonic() - started > timeout:
+            raise TimeoutError(f"Batch {batch_name} did not finish within {timeout} seconds (state: {state}).")
+        print(f"Batch {batch_name} is {state or 'pending'}; checking again in {poll_interval}s.")
+        time.sleep(poll_interval)
+
+
+def _response_text(response: dict) -> str | None:
+    """Joins the text parts of the first candidate of a GenerateContentResponse."""
+    candidates = response.get("candidates") or []
+    if not candidates:
+        return None
+    parts = candidates[0].get("content", {}).get("parts", [])
+    texts = [part["text"] for part in parts if "text" in part]
+    return "".join(texts) if texts else None
+
+
+def download_results(responses_file, api_key, base_url=None, usage=None) -> dict[str, str | None]:
+    """
+    Downloads the batch output file. Returns the response text (or None on error) per request key.
+    If a dict is passed as `usage`, the usageMetadata of every successful response is stored in it by key.
+    """
+    base_url = base_url or get_api_base_url()
+    _, body = _request("GET", f"{base_url}/download/v1beta/{responses_file}:download?alt=media", api_key)
+    results = {}
+    for line in body.decode('utf-8').splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        key = item.get("key")
+        if "error" in item:
+            print(f"Batch request {key} failed: {item['error']}")
+            results[key] = None
+        else:
+            results[key] = _response_text(item.get("response", {}))
+            usage_metadata = item.get("response", {}).get("usageMetadata", {})
+            run_metrics.incr("gemini.prompt_tokens", usage_metadata.get("promptTokenCount", 0))
+            run_metrics.incr("gemini.response_tokens", usage_metadata.get("candidatesTokenCount", 0))
+            run_metrics.incr("gemini.total_tokens", usage_metadata.get("totalTokenCount", 0))
+            if usage is not None:
+                usage[key] = usage_metadata
+    return results
+
+
+def run_batch(prompts: dict[str, str], model_name, api_key, batch_file_path,
+              display_name="company-descriptions", poll_interval=POLL_INTERVAL_SECONDS, timeout=None,
+              usage=None, generation_config=None) -> dict[str, str | None]:
+    """
+    Runs the full batch round trip for the given prompts (keyed by request key).
+    Returns the response text per key; keys missing from the output map to None.
+    `usage` (a dict) receives the usageMetadata per key, as in download_results;
+    `generation_config` is passed on to write_batch_file.
+    """
+    base_url = get_api_base_url()
+    write_batch_file(prompts, batch_file_path, generation_config)
+    file_name = upload_batch_file(batch_file_path, api_key, base_url)
+    print(f"Uploaded batch file {batch_file_path} with {len(prompts)} requests as {file_name}")
+    batch_name = create_batch_job(file_name, model_name, api_key, display_name, base_url)
+    print(f"Created batch job {batch_name}")
+    with run_metrics.timer("gemini.batch_wait_seconds"):
+        batch = wait_for_batch(batch_name, api_key, base_url, poll_interval, timeout)
+    run_metrics.incr("gemini.batch_requests", len(prompts))
+
+    state = batch.get("metadata", {}).get("state", "")
+    responses_file = batch.get("response", {}).get("responsesFile")
+    if not responses_file:
+        raise RuntimeError(f"Batch {batch_name} finished in state {state} without a responses file: {batch.get('error')}")
+    results = download_results(responses_file, api_key, base_url, usage)
+    return {key: results.get(key) for key in prompts}
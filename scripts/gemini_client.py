@@ -0,0 +1,279 @@
+"""
+Shared helpers for talking to the Gemini API.
+Configures the client once per process, hands out cached GenerativeModel instances,
+provides a token-bucket rate limiter for callers issuing requests concurrently, and a
+retry layer with jittered exponential backoff that honors retry-after hints, lowers
+concurrency when rate-limit errors cluster and counts errors per class.
+Request latency and token usage are recorded in the run metrics (run_metrics).
+"""
+import asyncio
+import collections
+import logging
+import random
+import re
+import time
+import urllib.error
+import google.generativeai as genai
+import run_metrics
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 120.0
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RATE_LIMIT_STATUS_CODES = {429}
+
+# Number of errors seen per exception class (e.g. "ResourceExhausted") across all calls in this process
+error_counts = collections.Counter()
+
+_configured_api_key = None
+_models = {}
+
+
+def configure_client(api_key: str) -> None:
+    """Configures the Gemini client. Repeated calls with the same key are no-ops."""
+    global _configured_api_key
+    if api_key == _configured_api_key:
+        return
+    genai.configure(api_key=api_key)  # type: ignore
+    _configured_api_key = api_key
+    _models.clear()
+
+
+def get_model(model_name: str):
+    """Returns a shared GenerativeModel for the given model name, creating it on first use."""
+    model = _models.get(model_name)
+    if model is None:
+        model = genai.GenerativeModel(model_name)  # type: ignore
+        _models[model_name] = model
+    return model
+
+
+def extract_response_text(response) -> str | None:
+    """
+    Joins the text parts of a Gemini response.
+    Returns None (and logs the block reason, if any) when the response has no text.
+    """
+    raw_text = None
+    if response.parts:
+        raw_text = "".join(part.text for part in response.parts if hasattr(part, 'text'))
+    elif hasattr(response, 'text') and response.text:
+        raw_text = response.text
+
+    if raw_text is None:
+        logger.warning(f"Gemini API response did not contain expected text parts. Response: {response}")
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            logger.error(f"Prompt blocked. Reason: {response.prompt_feedback.block_reason_message or response.prompt_feedback.block_reason}")
+    return raw_text
+
+
+def record_usage(response) -> None:
+    """Adds the token counts reported in a response's usage_metadata to the run metrics."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    run_metrics.incr("gemini.prompt_tokens", getattr(usage, 'prompt_token_count', 0) or 0)
+    run_metrics.incr("gemini.response_tokens", getattr(usage, 'candidates_token_count', 0) or 0)
+    run_metrics.incr("gemini.total_tokens", getattr(usage, 'total_token_count', 0) or 0)
+
+
+def timed_request(func):
+    """
+    Wraps a synchronous Gemini request function so every call (each retry attempt included)
+    is counted as an API call, timed in the gemini.latency_seconds histogram and has its
+    token usage recorded.
+    """
+    def wrapper(*args, **kwargs):
+        run_metrics.incr("gemini.api_calls")
+        with run_metrics.timer("gemini.latency_seconds"):
+            response = func(*args, **kwargs)
+        record_usage(response)
+        return response
+    return wrapper
+
+
+def timed_request_async(coro_factory):
+    """Like timed_request, for a factory returning the request coroutine (as retry_call_async takes)."""
+    async def wrapper():
+        run_metrics.incr("gemini.api_calls")
+        with run_metrics.timer("gemini.latency_seconds"):
+            response = await coro_factory()
+        record_usage(response)
+        return response
+    return wrapper
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket allowing `requests_per_minute` acquisitions per minute.
+    `burst` is the number of requests that may be issued back to back after an idle period.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive.")
+        self.rate_per_second = requests_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Waits until a request may be issued and consumes one token."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+
+
+def _status_code(error: Exception) -> int | None:
+    """Returns the HTTP status code carried by an API or urllib error, if any."""
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for transient errors: rate limits, server errors, timeouts and connection failures."""
+    code = _status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (ConnectionError, TimeoutError, urllib.error.URLError, asyncio.TimeoutError))
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True if the error signals that a quota or rate limit was hit (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    return _status_code(error) in RATE_LIMIT_STATUS_CODES
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """
+    Extracts the server's retry-after hint from an error: a Retry-After header (urllib),
+    a RetryInfo detail (google.api_core) or a "retry in 12.5s" style message.
+    """
+    headers = getattr(error, 'headers', None)
+    if headers is not None and headers.get('Retry-After'):
+        try:
+            return float(headers.get('Retry-After'))
+        except ValueError:
+            pass
+    for detail in getattr(error, 'details', None) or []:
+        retry_delay = getattr(detail, 'retry_delay', None)
+        if retry_delay is not None:
+            return retry_delay.seconds + retry_delay.nanos / 1e9
+    match = re.search(r"retry in ([\d.]+)\s*s", str(error), re.IGNORECASE) or \
+        re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", str(error))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, error: Exception | None = None) -> float:
+    """
+    Returns the wait before retry number `attempt` (0-based): full-jitter exponential backoff,
+    but never shorter than the server's retry-after hint.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    hint = retry_after_seconds(error) if error is not None else None
+    if hint is not None:
+        delay = max(delay, hint + random.uniform(0, 1))
+    return delay
+
+
+def retry_call(func, *args, max_attempts: int = MAX_ATTEMPTS, **kwargs):
+    """Calls func(*args, **kwargs), retrying transient errors with backoff. Re-raises the last error."""
+    for attempt in range(max_attempts):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            error_counts[type(e).__name__] += 1
+            if not is_retryable_error(e) or attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            logger.warning(f"{type(e).__name__} on attempt {attempt + 1}/{max_attempts}: {e}. Retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
+
+class AdaptiveConcurrency:
+    """
+    Async concurrency limit that adapts to rate limiting (additive increase, multiplicative decrease).
+    When `cluster_size` rate-limit errors occur within `window_seconds`, the limit is halved;
+    after `limit` consecutive successes it grows by one again, up to `max_limit`.
+    Use as `async with limiter:` around each request.
+    """
+
+    def __init__(self, max_limit: int, cluster_size: int = 3, window_seconds: float = 30.0):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.cluster_size = cluster_size
+        self.window_seconds = window_seconds
+        self._in_flight = 0
+        self._successes = 0
+        self._rate_limit_times = collections.deque()
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+        return False
+
+    def record_success(self) -> None:
+        self._successes += 1
+        if self.limit < self.max_limit and self._successes >= self.limit:
+            self.limit += 1
+            self._successes = 0
+            logger.info(f"Raised Gemini concurrency to {self.limit}.")
+
+    def record_rate_limit(self) -> None:
+        now = time.monotonic()
+        self._successes = 0
+        self._rate_limit_times.append(now)
+        while self._rate_limit_times and now - self._rate_limit_times[0] > self.window_seconds:
+            self._rate_limit_times.popleft()
+        if len(self._rate_limit_times) >= self.cluster_size and self.limit > 1:
+            self.limit = max(1, self.limit // 2)
+            self._rate_limit_times.clear()
+            logger.warning(f"Rate-limit errors are clustering; lowered Gemini concurrency to {self.limit}.")
+
+
+async def retry_call_async(coro_factory, concurrency: AdaptiveConcurrency | None = None,
+                           rate_limiter: TokenBucket | None = None, max_attempts: int = MAX_ATTEMPTS):
+    """
+    Awaits coro_factory() with the same retry policy as retry_call.
+    Each attempt holds a concurrency slot and a rate-limiter token; backoff waits happen outside the slot
+    so other requests can proceed. Re-raises the last error.
+    """
+    for attempt in range(max_attempts):
+        try:
+            if concurrency is not None:
+                async with concurrency:
+                    if rate_limiter is not None:
+                        await rate_limiter.acquire()
+                    result = await coro_factory()
+                concurrency.record_success()
+            else:
+                if rate_limiter is not None:
+                    await rate_limiter.acquire()
+                result = await coro_factory()
+            return result
+        except Exception as e:
+            error_counts[type(e).__name__] += 1
+            if concurrency is not None and is_rate_limit_error(e):
+                concurrency.record_rate_limit()
+            if not is_retryable_error(e) or attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, e)
+            logger.warning(f"{type(e).__name__} on attempt {attempt + 1}/{max_attempts}: {e}. Retrying in {delay:.1f}s.")
+            await asyncio.sleep(delay)
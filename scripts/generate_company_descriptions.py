@@ -1,25 +1,70 @@
 """
 This script generates company descriptions using the Gemini API.
 It reads company data from an Excel file, extracts German text from prompt files,
-and uses a prompt template to generate descriptions. The generated descriptions
-are then saved to a CSV file.
+and uses a prompt template to generate descriptions. Each finished description is
+appended to a checkpoint journal, and the CSV file is rebuilt from that journal, so an
+interrupted run can be continued with --resume. With --batch, all prompts are
+submitted as one Gemini Batch-mode job instead of one request at a time.
+Each run writes a JSON metrics report (stage timings, API calls, tokens, cache hits and
+Gemini latency) to data/run_reports/, with a per-request token and cost ledger next to it.
+German texts whose prompt would exceed PROMPT_TOKEN_BUDGET tokens are trimmed before sending.
+Requests use Gemini's JSON response mode with the {"summary": ...} schema of the prompt
+(response_schemas.DESCRIPTION_SCHEMA), and responses are validated against it.
 """
 import os
+import argparse
 import pandas as pd
 from dotenv import load_dotenv
 import re
 import json
 from google.generativeai.client import configure
 from google.generativeai.generative_models import GenerativeModel
+from google.generativeai.types import GenerationConfig
+from llm_cache import ResponseCache, make_cache_key
+from gemini_batch import run_batch
+from gemini_client import retry_call, timed_request, error_counts
+import run_metrics
+from token_budget import PromptBudget, TokenLedger, configured_budget, usage_counts
+from kunde_sections import iter_kunde_sections, section_text
+from columnar_store import DEFAULT_STORE_DIR, write_dataset
+from response_schemas import SchemaError, JSON_MIME_TYPE, DESCRIPTION_SCHEMA, to_rest_schema
+from response_schemas import parse_description as parse_description_response
 
-def get_gemini_response(prompt):
+GEMINI_MODEL_NAME = 'gemini-2.5-pro-preview-06-05'
+PROMPT_TOKEN_BUDGET = 8000 # Longer prompts get their German text trimmed (GEMINI_PROMPT_TOKEN_BUDGET overrides)
+GENERATION_CONFIG = GenerationConfig(response_mime_type=JSON_MIME_TYPE, response_schema=DESCRIPTION_SCHEMA)
+# The same settings in the REST form used by Batch mode
+BATCH_GENERATION_CONFIG = {"responseMimeType": JSON_MIME_TYPE, "responseSchema": to_rest_schema(DESCRIPTION_SCHEMA)}
+
+def get_gemini_response(prompt, cache=None, ledger=None, ledger_key="", estimated_prompt_tokens=None):
     """
     Sends a prompt to the Gemini API and returns the response.
+    If a ResponseCache is given, a cached response for the same prompt, model and config is returned instead.
+    Only responses that match DESCRIPTION_SCHEMA are cached (or taken from the cache).
+    The token usage of API responses is recorded in `ledger` (a TokenLedger) under `ledger_key`.
     """
-    model = GenerativeModel('gemini-2.5-pro-preview-06-05')
-    response = model.generate_content(prompt)
+    cache_key = make_cache_key(prompt, GEMINI_MODEL_NAME, GENERATION_CONFIG)
+    if cache is not None:
+        cached_response = cache.get(cache_key)
+        if cached_response is not None and is_valid_description(cached_response):
+            return cached_response
+
+    model = GenerativeModel(GEMINI_MODEL_NAME)
+    response = retry_call(timed_request(model.generate_content), prompt, generation_config=GENERATION_CONFIG)
+    if ledger is not None:
+        ledger.record(ledger_key, GEMINI_MODEL_NAME, *usage_counts(response), estimated_prompt_tokens)
+    if cache is not None and is_valid_description(response.text):
+        cache.put(cache_key, GEMINI_MODEL_NAME, response.text)
     return response.text
 
+def is_valid_description(raw_response):
+    """Returns True if the response matches DESCRIPTION_SCHEMA."""
+    try:
+        parse_description_response(raw_response)
+        return True
+    except SchemaError:
+        return False
+
 def extract_german_text(file_path):
     """
     Extracts the German text from the prompt file.
@@ -32,6 +77,80 @@ def extract_german_text(file_path):
         return match.group(1).strip()
     return None
 
+def load_source_texts(source_path, kunde_numbers):
+    """
+    Reads the texts of the given Kunden straight from the source document, in one pass.
+    Used for Kunden whose prompt file from process_kunden_data.py does not exist.
+    """
+    if not os.path.exists(source_path):
+        return {}
+    with open(source_path, 'r', encoding='utf-8') as f:
+        return {section.kunde_num: section_text(section) for section in iter_kunde_sections(f)
+                if section.kunde_num in kunde_numbers}
+
+def parse_description(raw_response, company_name):
+    """
+    Extracts the summary from the model's JSON response (validated against DESCRIPTION_SCHEMA).
+    Returns None if the response does not match the schema.
+    """
+    try:
+        return parse_description_response(raw_response).summary
+    except SchemaError as e:
+        run_metrics.incr("responses.schema_errors")
+        print(f"Response for {company_name} does not match the description schema ({e}).")
+        return None
+
+def load_checkpoint(journal_path):
+    """
+    Reads the checkpoint journal and returns the completed rows keyed by Kunde number.
+    A truncated last line (e.g. from a crash mid-write) is ignored.
+    """
+    completed = {}
+    if not os.path.exists(journal_path):
+        return completed
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Ignoring unreadable checkpoint line in {journal_path}: {line[:80]}")
+                continue
+            completed[record['kunde_number']] = record
+    return completed
+
+def open_checkpoint(journal_path, resume):
+    """
+    Opens the checkpoint journal for appending (resume) or truncates it (fresh run).
+    When resuming after a crash mid-write, the truncated last line is terminated first.
+    """
+    if not resume:
+        return open(journal_path, 'w', encoding='utf-8')
+    needs_newline = False
+    if os.path.exists(journal_path) and os.path.getsize(journal_path) > 0:
+        with open(journal_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    journal_file = open(journal_path, 'a', encoding='utf-8')
+    if needs_newline:
+        journal_file.write("\n")
+    return journal_file
+
+def append_checkpoint(journal_file, record):
+    """Appends one completed row to the open checkpoint journal and flushes it to disk."""
+    journal_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    journal_file.flush()
+    os.fsync(journal_file.fileno())
+
+def write_results_csv(completed, output_csv_path):
+    """Writes the completed rows, ordered by Kunde number, to the output CSV file and returns them."""
+    rows = [{'name': completed[k]['name'], 'description': completed[k]['description']} for k in sorted(completed)]
+    output_df = pd.DataFrame(rows, columns=['name', 'description'])
+    output_df.to_csv(output_csv_path, index=False)
+    return output_df
+
 def parse_kunde_range(range_str):
     """Parses the KUNDE_RANGE string (e.g., '1-5') into a start and end integer."""
     try:
@@ -44,6 +163,13 @@ def main():
     """
     Main function to generate company descriptions.
     """
+    parser = argparse.ArgumentParser(description="Generate company descriptions with the Gemini API.")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip Kunden already recorded in the checkpoint journal instead of starting over.")
+    parser.add_argument('--batch', action='store_true',
+                        help="Submit all uncached prompts as one Gemini Batch-mode job and poll for the results.")
+    args = parser.parse_args()
+
     # Construct paths relative to the project root
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
     load_dotenv(dotenv_path=os.path.join(project_root, '.env'))
@@ -62,69 +188,150 @@ def main():
     excel_path = os.path.join(project_root, 'kunden_golden_standard.xlsx')
     df = pd.read_excel(excel_path)
 
+    with open(os.path.join(project_root, 'prompts', 'company_description_prompt.txt'), 'r', encoding='utf-8') as f:
+        prompt_template = f.read()
+
     # Parse Kunde range
     range_str = os.getenv("KUNDE_RANGE", f"1-{len(df)}")
     start_kunde, end_kunde = parse_kunde_range(range_str)
 
-    results = []
-
-    # Loop through the specified range of Kunden
-    for kunde_number in range(start_kunde, end_kunde + 1):
-        # Adjust for 0-based index of the dataframe
-        df_index = kunde_number - 1
-        if df_index < 0 or df_index >= len(df):
-            print(f"Kunde number {kunde_number} is out of the dataframe's range. Skipping.")
-            continue
-        
-        row_data = df.loc[df_index]
-        company_name = row_data['Company Name']
-        excel_data_str = row_data.to_string() # Convert the row to a string format
-
-        prompt_file_path = os.path.join(project_root, 'data', 'Kunde_Structured_Output', f'Kunde {kunde_number}', f'prompt_Kunde_{kunde_number}.txt')
-
-        if os.path.exists(prompt_file_path):
-            german_text = extract_german_text(prompt_file_path)
-            if german_text:
-                with open(os.path.join(project_root, 'prompts', 'company_description_prompt.txt'), 'r', encoding='utf-8') as f:
-                    prompt_template = f.read()
-                prompt = prompt_template.format(excel_data=excel_data_str, german_text=german_text)
-                
-                # Save the request
-                with open(os.path.join(output_dir, f'Kunde_{kunde_number}_request.txt'), 'w', encoding='utf-8') as f:
-                    f.write(prompt)
-
-                raw_response = get_gemini_response(prompt)
-
-                # Save the raw response
-                with open(os.path.join(output_dir, f'Kunde_{kunde_number}_response.txt'), 'w', encoding='utf-8') as f:
-                    f.write(raw_response)
-
-                # Clean and parse the JSON
-                cleaned_response = raw_response.strip()
-                if cleaned_response.startswith("```json"):
-                    cleaned_response = cleaned_response[7:].strip()
-                if cleaned_response.endswith("```"):
-                    cleaned_response = cleaned_response[:-3].strip()
-                
-                try:
-                    description_data = json.loads(cleaned_response)
-                    description = description_data.get("summary", "")
-                except json.JSONDecodeError:
-                    print(f"Could not decode JSON for {company_name}. Saving raw response.")
-                    description = raw_response # Fallback to raw response
-
-                results.append({'name': company_name, 'description': description})
-                print(f"Generated description for {company_name} (Kunde {kunde_number})")
+    # The journal records every finished row; without --resume a fresh run starts a new journal
+    journal_path = os.path.join(output_dir, 'checkpoint.jsonl')
+    completed = load_checkpoint(journal_path) if args.resume else {}
+    if args.resume:
+        print(f"Resuming: {len(completed)} Kunden already completed according to {journal_path}")
+    journal_file = open_checkpoint(journal_path, args.resume)
+
+    response_cache = ResponseCache(os.path.join(project_root, 'data', 'llm_cache.sqlite'))
+    budget = PromptBudget(configured_budget(PROMPT_TOKEN_BUDGET), GenerativeModel(GEMINI_MODEL_NAME))
+    ledger = TokenLedger()
+
+    # Build the prompts for the specified range of Kunden
+    jobs = []
+    source_doc_path = os.path.join(project_root, 'docs', 'Manuav Kundenzusammenfassung für Klaus.md')
+    source_texts = None # Loaded on first use, only if a prompt file is missing
+    with run_metrics.stage("build_prompts"):
+        for kunde_number in range(start_kunde, end_kunde + 1):
+            # Adjust for 0-based index of the dataframe
+            df_index = kunde_number - 1
+            if df_index < 0 or df_index >= len(df):
+                print(f"Kunde number {kunde_number} is out of the dataframe's range. Skipping.")
+                continue
+            if kunde_number in completed:
+                print(f"Kunde {kunde_number} already completed. Skipping.")
+                continue
+
+            row_data = df.loc[df_index]
+            company_name = row_data['Company Name']
+            excel_data_str = row_data.to_string() # Convert the row to a string format
+
+            prompt_file_path = os.path.join(project_root, 'data', 'Kunde_Structured_Output', f'Kunde {kunde_number}', f'prompt_Kunde_{kunde_number}.txt')
+
+            if os.path.exists(prompt_file_path):
+                german_text = extract_german_text(prompt_file_path)
+                if not german_text:
+                    print(f"Could not extract German text from {prompt_file_path}")
+                    continue
             else:
-                print(f"Could not extract German text from {prompt_file_path}")
+                if source_texts is None:
+                    source_texts = load_source_texts(source_doc_path, range(start_kunde, end_kunde + 1))
+                german_text = source_texts.get(kunde_number)
+                if not german_text:
+                    print(f"Prompt file not found for {company_name} at {prompt_file_path} "
+                          f"and no KUNDE {kunde_number} section in {source_doc_path}")
+                    continue
+
+            fitted_text, prompt, prompt_tokens = budget.fit(
+                german_text, lambda text: prompt_template.format(excel_data=excel_data_str, german_text=text))
+            if fitted_text != german_text:
+                print(f"Trimmed the German text of Kunde {kunde_number} from {len(german_text)} to {len(fitted_text)} "
+                      f"chars to fit the prompt budget of {budget.max_prompt_tokens} tokens.")
+
+            # Save the request
+            with open(os.path.join(output_dir, f'Kunde_{kunde_number}_request.txt'), 'w', encoding='utf-8') as f:
+                f.write(prompt)
+            jobs.append({'kunde_number': kunde_number, 'company_name': company_name, 'prompt': prompt,
+                         'prompt_tokens': prompt_tokens})
+
+    def handle_response(job, raw_response):
+        """
+        Saves the raw response, parses the description and records the finished row.
+        A response that does not match the schema goes into this run's CSV file as raw text,
+        but not into the checkpoint journal, so --resume requests it again.
+        Returns True if the response was valid.
+        """
+        kunde_number = job['kunde_number']
+        with open(os.path.join(output_dir, f'Kunde_{kunde_number}_response.txt'), 'w', encoding='utf-8') as f:
+            f.write(raw_response)
+        description = parse_description(raw_response, job['company_name'])
+        if description is None:
+            completed[kunde_number] = {'kunde_number': kunde_number, 'name': job['company_name'],
+                                       'description': raw_response} # Fallback to raw response
+            print(f"Saved the raw response for {job['company_name']} (Kunde {kunde_number}); it is not checkpointed.")
+            return False
+        record = {'kunde_number': kunde_number, 'name': job['company_name'], 'description': description}
+        append_checkpoint(journal_file, record)
+        completed[kunde_number] = record
+        print(f"Generated description for {job['company_name']} (Kunde {kunde_number})")
+        return True
+
+    with run_metrics.stage("generate"):
+        if args.batch:
+            # Answer what we can from the cache and send everything else as one batch job
+            pending = {}
+            for job in jobs:
+                cached_response = response_cache.get(make_cache_key(job['prompt'], GEMINI_MODEL_NAME, GENERATION_CONFIG))
+                if cached_response is not None and is_valid_description(cached_response):
+                    handle_response(job, cached_response)
+                else:
+                    pending[f"Kunde_{job['kunde_number']}"] = job
+
+            if pending:
+                batch_usage = {}
+                batch_results = run_batch(
+                    {key: job['prompt'] for key, job in pending.items()}, GEMINI_MODEL_NAME, api_key,
+                    os.path.join(output_dir, 'batch_requests.jsonl'), usage=batch_usage,
+                    generation_config=BATCH_GENERATION_CONFIG
+                )
+                for key, job in pending.items():
+                    raw_response = batch_results.get(key)
+                    if raw_response is None:
+                        print(f"No batch response for {job['company_name']} (Kunde {job['kunde_number']})")
+                        continue
+                    usage = batch_usage.get(key, {})
+                    ledger.record(key, GEMINI_MODEL_NAME, usage.get("promptTokenCount", 0),
+                                  usage.get("candidatesTokenCount", 0), job['prompt_tokens'])
+                    if handle_response(job, raw_response):
+                        response_cache.put(make_cache_key(job['prompt'], GEMINI_MODEL_NAME, GENERATION_CONFIG),
+                                           GEMINI_MODEL_NAME, raw_response)
         else:
-            print(f"Prompt file not found for {company_name} at {prompt_file_path}")
+            for job in jobs:
+                raw_response = get_gemini_response(job['prompt'], cache=response_cache, ledger=ledger,
+                                                   ledger_key=f"Kunde_{job['kunde_number']}",
+                                                   estimated_prompt_tokens=job['prompt_tokens'])
+                handle_response(job, raw_response)
 
-    # Save the results to a CSV file
-    output_df = pd.DataFrame(results)
+    journal_file.close()
+    cache_stats = response_cache.stats()
+    response_cache.close()
+    print(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    if error_counts:
+        print(f"Gemini API errors by class: {dict(error_counts)}")
+
+    # Rebuild the CSV file from the journal so rows from earlier (interrupted) runs are included
     output_csv_path = os.path.join(project_root, 'company_descriptions.csv')
-    output_df.to_csv(output_csv_path, index=False)
-    print(f"Successfully generated company descriptions and saved to {output_csv_path}")
+    with run_metrics.stage("write_results"):
+        output_df = write_results_csv(completed, output_csv_path)
+        print(f"Successfully generated company descriptions and saved to {output_csv_path}")
+        store_path = write_dataset(output_df, 'company_descriptions', os.path.join(project_root, DEFAULT_STORE_DIR))
+    print(f"Stored the descriptions in the columnar store: {store_path}")
+    token_totals = ledger.totals()
+    print(f"Gemini usage: {token_totals['requests']} requests, {token_totals['prompt_tokens']} prompt tokens, "
+          f"{token_totals['response_tokens']} response tokens, ${token_totals['cost_usd']:.4f}")
+    ledger_path = run_metrics.run_file_path("token_ledger.csv")
+    ledger.write_csv(ledger_path)
+    report_path = run_metrics.write_report({'gemini_errors': dict(error_counts), 'token_usage': token_totals})
+    print(f"Wrote the run report to {report_path} and the token ledger to {ledger_path}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
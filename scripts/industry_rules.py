@@ -0,0 +1,91 @@
+"""
+This module resolves the industry and customer niche of a partner company from the rule
+table in industry_rules.json instead of a hand-written if/elif chain.
+Company rules match when one of their "name_contains" patterns (usually the company's
+domain) is a substring of the lowercased company name. They are tried in table order, so
+the first matching rule wins. Each pattern is indexed under one of its character trigrams,
+which makes a lookup cost proportional to the length of the name rather than to the number
+of rules: only the rules filed under the name's own trigrams are verified.
+If no company rule matches, the fallback rules classify the company by keywords in its
+services text, in table order.
+
+Conditions (on fallback rules and on "niche_rules", which refine the niche) may use:
+- "services_contain_any" / "name_contains_any": any keyword of either list is present;
+- "services_contain_all": every keyword is present.
+"""
+import json
+import os
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'industry_rules.json')
+NGRAM_SIZE = 3
+UNKNOWN = "Unknown"
+
+
+def _ngrams(text: str) -> set[str]:
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def condition_matches(condition: dict, name_lower: str, services_lower: str) -> bool:
+    """Checks the keyword condition of a fallback or niche rule (see module docstring)."""
+    any_keywords = [(keyword, services_lower) for keyword in condition.get('services_contain_any', ())]
+    any_keywords += [(keyword, name_lower) for keyword in condition.get('name_contains_any', ())]
+    if any_keywords and not any(keyword in text for keyword, text in any_keywords):
+        return False
+    return all(keyword in services_lower for keyword in condition.get('services_contain_all', ()))
+
+
+def _resolve_niche(rule: dict, name_lower: str, services_lower: str) -> str:
+    for niche_rule in rule.get('niche_rules', ()):
+        if condition_matches(niche_rule, name_lower, services_lower):
+            return niche_rule['niche']
+    return rule['niche']
+
+
+class IndustryRules:
+    """Company and fallback rules with an inverted trigram index over the company name patterns."""
+
+    def __init__(self, company_rules: list[dict], fallback_rules: list[dict]):
+        self.company_rules = company_rules
+        self.fallback_rules = fallback_rules
+        # Rare trigrams make better keys: each pattern is filed under its least shared trigram
+        trigram_counts = {}
+        for rule in company_rules:
+            for pattern in rule['name_contains']:
+                for gram in _ngrams(pattern):
+                    trigram_counts[gram] = trigram_counts.get(gram, 0) + 1
+        self.index = {} # trigram -> [(rule position, pattern)]
+        self.short_patterns = [] # Patterns without a trigram are checked for every name
+        for position, rule in enumerate(company_rules):
+            for pattern in rule['name_contains']:
+                grams = _ngrams(pattern)
+                if not grams:
+                    self.short_patterns.append((position, pattern))
+                    continue
+                key = min(grams, key=lambda gram: (trigram_counts[gram], gram))
+                self.index.setdefault(key, []).append((position, pattern))
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_RULES_PATH) -> "IndustryRules":
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+        return cls(table['company_rules'], table.get('fallback_rules', []))
+
+    def match_company_rule(self, name_lower: str) -> dict | None:
+        """Returns the first company rule (in table order) with a pattern contained in the name."""
+        best = None
+        candidates = [entry for gram in _ngrams(name_lower) for entry in self.index.get(gram, ())]
+        for position, pattern in candidates + self.short_patterns:
+            if (best is None or position < best) and pattern in name_lower:
+                best = position
+        return None if best is None else self.company_rules[best]
+
+    def resolve(self, company_name: str, services_text: str) -> tuple[str, str]:
+        """Returns (industry, niche); ("Unknown", "Unknown") if no rule applies."""
+        name_lower = company_name.lower()
+        services_lower = services_text.lower()
+        rule = self.match_company_rule(name_lower)
+        if rule is None:
+            rule = next((r for r in self.fallback_rules if condition_matches(r, name_lower, services_lower)), None)
+        if rule is None:
+            return UNKNOWN, UNKNOWN
+        return rule['industry'], _resolve_niche(rule, name_lower, services_lower)
@@ -0,0 +1,55 @@
+"""
+This module splits the Kundenzusammenfassung document into its "KUNDE X: ..." sections.
+It reads the document line by line and yields one section at a time, so callers scan the
+document once and only hold the section they are working on in memory.
+Table-of-contents entries ("KUNDE X: name<TAB>page") are skipped; text before the first
+section header is ignored.
+"""
+import io
+import re
+from typing import Iterable, Iterator, NamedTuple
+
+HEADER_PATTERN = re.compile(r"^KUNDE\s*(\d+):", re.IGNORECASE)
+TOC_ENTRY_PATTERN = re.compile(r"^KUNDE\s+\d+:\s*.*[\s\t]+\d+$", re.IGNORECASE)
+
+
+class KundeSection(NamedTuple):
+    kunde_num: int
+    header: str # The header line without its line break, e.g. "KUNDE 1: DenkmalZukunft.com"
+    text: str # The lines between this header and the next one, unstripped
+
+
+def _lines(source) -> Iterable[str]:
+    # StringIO splits on '\n' only, like reading the file does (str.splitlines() also splits on \f, \x1c, ...)
+    return io.StringIO(source) if isinstance(source, str) else source
+
+
+def iter_kunde_sections(source, skip_toc: bool = True) -> Iterator[KundeSection]:
+    """
+    Yields the sections of `source`, which is the document text, an open text file or any
+    iterable of lines, in document order.
+    """
+    kunde_num, header, body = None, None, []
+    for line in _lines(source):
+        match = HEADER_PATTERN.match(line)
+        if not match:
+            if kunde_num is not None:
+                body.append(line)
+            continue
+        if kunde_num is not None:
+            yield KundeSection(kunde_num, header, ''.join(body))
+        kunde_num, header, body = int(match.group(1)), line.rstrip('\r\n'), []
+        if skip_toc and TOC_ENTRY_PATTERN.match(header.strip()):
+            kunde_num = None
+    if kunde_num is not None:
+        yield KundeSection(kunde_num, header, ''.join(body))
+
+
+def header_remainder(section: KundeSection) -> str:
+    """Returns what follows "KUNDE X:" on the header line (usually the company name or domain)."""
+    return section.header[HEADER_PATTERN.match(section.header).end():]
+
+
+def section_text(section: KundeSection) -> str:
+    """Returns the stripped text of a section, starting right after "KUNDE X:"."""
+    return (header_remainder(section) + '\n' + section.text).strip()
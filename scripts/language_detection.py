@@ -0,0 +1,163 @@
+"""
+This module detects the language of the Combined_Description texts (step 8c of
+notebooks/80k_cleaning.ipynb) for a whole dataset instead of a row-by-row sample.
+Texts are normalized (whitespace collapsed) and deduplicated first, results are
+looked up in a persistent SQLite cache keyed by the SHA-256 of the normalized text,
+and only the remaining texts are detected, spread over a process pool. Re-runs and
+incremental exports therefore only detect descriptions that were not seen before.
+Labels match the notebook's detect_language_robust().
+"""
+import argparse
+import hashlib
+import os
+import pathlib
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from langdetect import DetectorFactory, LangDetectException, detect
+import run_metrics
+
+DEFAULT_CACHE_PATH = pathlib.Path("data/language_cache.sqlite")
+LANGUAGE_COLUMN = "description_language"
+MIN_TEXT_LENGTH = 15 # langdetect is unreliable on very short texts
+MAP_CHUNK_SIZE = 64 # Texts sent to a worker process per task
+SQLITE_BATCH_SIZE = 500 # Keys per SELECT ... IN (...) lookup
+
+LABEL_EMPTY = 'unknown_empty_or_nan'
+LABEL_TOO_SHORT = 'unknown_too_short'
+LABEL_ERROR = 'unknown_error_detecting'
+
+
+def normalize_text(text) -> str:
+    """Collapses whitespace runs and strips the text; NaN becomes ''."""
+    if pd.isna(text):
+        return ''
+    return ' '.join(str(text).split())
+
+
+def text_key(normalized_text: str) -> str:
+    return hashlib.sha256(normalized_text.encode('utf-8')).hexdigest()
+
+
+def _init_worker() -> None:
+    """Makes langdetect deterministic in every worker process."""
+    DetectorFactory.seed = 0
+
+
+def _detect(text: str) -> str:
+    try:
+        return detect(text)
+    except LangDetectException:
+        return LABEL_ERROR
+
+
+def detect_language_robust(text) -> str:
+    """Returns the ISO language code of `text`, or one of the unknown_* labels."""
+    if pd.isna(text) or not str(text).strip():
+        return LABEL_EMPTY
+    if len(str(text).strip()) < MIN_TEXT_LENGTH:
+        return LABEL_TOO_SHORT
+    return _detect(str(text))
+
+
+class LanguageCache:
+    """SQLite-backed map from text hash to detected language."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("CREATE TABLE IF NOT EXISTS languages (key TEXT PRIMARY KEY, language TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, str]:
+        """Returns the cached languages for the given keys (missing keys are left out)."""
+        found = {}
+        for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+            batch = keys[start:start + SQLITE_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self._conn.execute(
+                f"SELECT key, language FROM languages WHERE key IN ({placeholders})", batch
+            ).fetchall())
+        return found
+
+    def put_many(self, items: dict[str, str]) -> None:
+        self._conn.executemany("INSERT OR REPLACE INTO languages (key, language) VALUES (?, ?)", items.items())
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def detect_languages(texts: pd.Series, cache: LanguageCache | None = None, max_workers: int | None = None) -> pd.Series:
+    """
+    Detects the language of every text. Duplicates (after normalization) are detected once,
+    cached results are reused and the rest is detected in a process pool.
+    Returns a Series of labels aligned with `texts`.
+    """
+    started = time.perf_counter()
+    normalized = texts.map(normalize_text)
+    stripped_length = texts.map(lambda t: 0 if pd.isna(t) else len(str(t).strip()))
+    detectable = stripped_length >= MIN_TEXT_LENGTH
+    unique_texts = normalized[detectable].unique().tolist()
+    keys = [text_key(t) for t in unique_texts]
+
+    cached = cache.get_many(keys) if cache is not None else {}
+    pending = [(key, t) for key, t in zip(keys, unique_texts) if key not in cached]
+    detected = {}
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as executor:
+            languages = executor.map(_detect, [t for _, t in pending], chunksize=MAP_CHUNK_SIZE)
+            detected = {key: language for (key, _), language in zip(pending, languages)}
+        if cache is not None:
+            cache.put_many(detected)
+
+    language_by_text = {t: cached.get(key) or detected[key] for key, t in zip(keys, unique_texts)}
+    labels = pd.Series(LABEL_TOO_SHORT, index=texts.index, dtype=object)
+    labels[stripped_length == 0] = LABEL_EMPTY
+    labels[detectable] = normalized[detectable].map(language_by_text)
+    run_metrics.incr("language_cache.hits", len(cached))
+    run_metrics.incr("language_cache.misses", len(pending))
+    print(f"Language detection: {len(texts)} texts, {len(unique_texts)} unique, {len(cached)} cached, "
+          f"{len(detected)} detected in {time.perf_counter() - started:.1f}s")
+    return labels.rename(LANGUAGE_COLUMN)
+
+
+def main():
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="Detect the language of every Combined_Description.")
+    parser.add_argument('--input', default=os.path.join(project_root, 'data', 'processed', 'apollo_combined_descriptions.csv'))
+    parser.add_argument('--output', help="Output CSV (defaults to overwriting the input).")
+    parser.add_argument('--column', default='Combined_Description')
+    parser.add_argument('--cache', default=os.path.join(project_root, DEFAULT_CACHE_PATH))
+    parser.add_argument('--workers', type=int, help="Worker processes (default: number of CPUs).")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: Input file not found: {args.input}")
+        return
+    with run_metrics.stage("load"):
+        df = pd.read_csv(args.input)
+    if args.column not in df.columns:
+        print(f"Error: Column '{args.column}' not found in {args.input}")
+        return
+
+    cache = LanguageCache(args.cache)
+    try:
+        with run_metrics.stage("detect"):
+            df[LANGUAGE_COLUMN] = detect_languages(df[args.column], cache, args.workers)
+    finally:
+        cache.close()
+
+    output_path = args.output or args.input
+    with run_metrics.stage("write"):
+        df.to_csv(output_path, index=False, encoding='utf-8')
+    print("\nLanguage distribution:")
+    print(df[LANGUAGE_COLUMN].value_counts(dropna=False))
+    print(f"Saved {len(df)} rows to {output_path}")
+    print(f"Wrote the run report to {run_metrics.write_report()}")
+
+
+if __name__ == "__main__":
+    main()
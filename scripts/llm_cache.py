@@ -0,0 +1,135 @@
+"""
+This module provides a persistent on-disk cache for LLM responses.
+Entries are stored in SQLite and keyed by a SHA-256 hash of the model name, the
+generation config and the final prompt text, so re-running a step whose prompts did
+not change costs no API calls. The cache keeps hit/miss statistics and supports
+age- and size-based eviction.
+"""
+import dataclasses
+import hashlib
+import json
+import logging
+import pathlib
+import sqlite3
+import time
+import run_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = pathlib.Path("data/llm_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_MAX_AGE_DAYS = 90
+
+
+def _generation_config_to_dict(generation_config) -> dict:
+    """Converts a GenerationConfig (dataclass, dict or None) into a plain dict for hashing."""
+    if generation_config is None:
+        return {}
+    if isinstance(generation_config, dict):
+        config = generation_config
+    elif dataclasses.is_dataclass(generation_config):
+        config = dataclasses.asdict(generation_config)
+    else:
+        config = vars(generation_config)
+    return {key: value for key, value in config.items() if value is not None}
+
+
+def make_cache_key(prompt: str, model_name: str, generation_config=None) -> str:
+    """Returns the cache key for a prompt sent to `model_name` with the given generation config."""
+    payload = json.dumps(
+        {"model": model_name, "config": _generation_config_to_dict(generation_config), "prompt": prompt},
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed response cache.
+    `max_entries` bounds the number of stored responses (least recently used are evicted first)
+    and `max_age_days` drops responses older than the given age. Either may be None to disable it.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries: int | None = DEFAULT_MAX_ENTRIES,
+                 max_age_days: float | None = DEFAULT_MAX_AGE_DAYS):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_accessed ON responses (last_accessed)")
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        """Returns the cached response for `key`, or None on a miss (expired entries count as misses)."""
+        row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.max_age_days is not None and now - row[1] > self.max_age_days * 86400):
+            self.misses += 1
+            run_metrics.incr("llm_cache.misses")
+            return None
+        self._conn.execute("UPDATE responses SET last_accessed = ? WHERE key = ?", (now, key))
+        self._conn.commit()
+        self.hits += 1
+        run_metrics.incr("llm_cache.hits")
+        return row[0]
+
+    def has(self, key: str) -> bool:
+        """True if a response is stored for `key`. Unlike get(), this does not count as a lookup."""
+        row = self._conn.execute("SELECT created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and (self.max_age_days is None or time.time() - row[0] <= self.max_age_days * 86400)
+
+    def put(self, key: str, model_name: str, response_text: str) -> None:
+        """Stores a response. Existing entries with the same key are replaced."""
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, model_name, response_text, now, now)
+        )
+        self._conn.commit()
+
+    def evict(self) -> int:
+        """Applies the age and size limits. Returns the number of evicted entries."""
+        evicted = 0
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            evicted += self._conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,)).rowcount
+        if self.max_entries is not None:
+            evicted += self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY last_accessed DESC LIMIT ?)",
+                (self.max_entries,)
+            ).rowcount
+        self._conn.commit()
+        return evicted
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the current number of entries."""
+        entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        """Evicts expired/excess entries, logs the statistics and closes the database."""
+        evicted = self.evict()
+        stats = self.stats()
+        logger.info(
+            f"LLM cache {self.path}: {stats['hits']} hits, {stats['misses']} misses "
+            f"(hit rate {stats['hit_rate']:.0%}), {stats['entries']} entries, {evicted} evicted."
+        )
+        self._conn.close()
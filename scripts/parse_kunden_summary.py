@@ -4,8 +4,184 @@ such as company name, website, products/services, industry, and customer niche,
 writes this data to a CSV file. It includes functions for extracting specific data points
 using regular expressions and heuristics tailored to the format of the input markdown file.
 """
+import collections
 import csv
 import re
+from industry_rules import IndustryRules
+import run_metrics
+from kunde_sections import iter_kunde_sections
+
+# Markers that end a services section: a line starting with a marker, or containing a marker
+# that ends with ':', stops the section. Matching is case-insensitive.
+STRONG_END_MARKERS = [
+    "Tel:", "Mobil:", "Fax:", "Ansprechpartner:", "Geschäftsführer:", "Kontakt:", 
+    "Website:", "Webseite:", "Adresse:", "Standort:", "E-Mail:", "Telefon:", "Homepage:",
+    "Mehr unter:", "Quelle:", "Notizen:", "Anmerkungen:", "Fazit:", "Bewertung:", "Status:",
+    "Kategorie:", "Schlagworte:", "Tags:", "Verknüpfungen:", "Siehe auch:", 
+    "Ähnliche Unternehmen:", "Kooperationen:", "Partnerschaften:", "Referenzen:", 
+    "Kunden:", "Projekte:", "Fallstudien:", "Erfolge:", "Auszeichnungen:", "Zertifizierungen:", 
+    "Mitgliedschaften:", "Presse:", "Veröffentlichungen:", "News:", "Blog:", "Social Media:",
+    "Impressum", "Datenschutz", "AGB", "Nutzungsbedingungen", "Haftungsausschluss", 
+    "Copyright", "©", "Alle Rechte vorbehalten", "Stand:", "Version:", "Letzte Aktualisierung:",
+    "Gegründet:", "Mitarbeiter:", "Umsatz:", "Branche:", "Sektor:", "Industrie:", "Nische:", 
+    "Zielgruppe:", "Kundenfokus:", "Marktsegment:", "Wettbewerber:", "USP:", 
+    "Alleinstellungsmerkmal:", "Vision:", "Mission:", "Werte:", "Philosophie:", "Geschichte:", 
+    "Über uns", "Team:", "Karriere:", "Jobs:", "Stellenangebote:", "Investoren:", "Finanzierung:",
+    "Vorteile:", "Nutzen:", "Zielsetzung:", "Herausforderungen:", "Lösungsansatz:",
+    "Technologie-Stack:", "Methodik:", "Prozess:", "Ergebnisse:", "Nächste Schritte:",
+    "### ", 
+    "---", "\n* * *\n", "\n===", 
+    "Standorte und Beteiligungen", 
+    "________________________________________",
+    "Unternehmensphilosophie:", # Added as strong end marker
+    "Kontaktinformationen:",   # Added as strong end marker
+    "Anwendungsfall – Kundenansprache:", # Added
+    r"Warum [A-Za-zÄÖÜäöüß\s]+?:" # General "Warum Xyz?:"
+]
+
+# (pattern, ignore_case); every pattern is anchored at the start of the line
+FILTER_OUT_RULES = [
+    (r"^\s*\(.+\)\s*?\s*$", False),
+    (r"^\s*🚀?\s*[\"“»„].*[\"”«“]\s*$", False),
+    (r"^\s*AL\s*\d+\s*$", False),
+    (r"^\s*\d{5}\s+[A-Za-zÄÖÜäöüß\s.-]+$", True),
+    (r"^\s*[A-Za-zÄÖÜäöüß.\s-]+straße\s*\d+.*$", True),
+    (r"^\s*(Weitere Informationen|Über das Unternehmen|Über [A-Za-z\s]+ GmbH):?\s*$", True),
+    (r"^\s*💰\s*", False),
+    (r"^\s*Mehr Infos unter:", True),
+    (r"^\s*Quelle:", True),
+    (r"^\s*Tel\.?\s*:\s*.+", True),
+    (r"^\s*E-Mail\s*:\s*.+", True),
+    (r"^\s*Mobil\s*:\s*.+", True),
+    (r"^\s*Fax\s*:\s*.+", True),
+    (r"^\s*Anschrift\s*:", True),
+    (r"^\s*Adresse\s*:\s*.+", True),
+    (r"^\s*Website\s*:\s*.+", True),
+    (r"^\s*Homepage\s*:\s*.+", True),
+    (r"^\s*\(?mailto:.*?\)?$", True),
+    (r"^\s*Standorte und Beteiligungen\s*:\s*$", True),
+    (r"^\s*schrumpfenden Markt", True),
+    # Unternehmensphilosophie and Kontaktinformationen are now strong_end_markers
+    (r"^\s*(📌|🚀|💡|✔|📍|📞|📧|🌐)\s*.*$", True),
+    (r"^\s*Haben Sie kurz drei Minuten.*$", True),
+    # Anwendungsfall is now a strong_end_marker
+    (r"^\s*Vorteile für Ihr Unternehmen:?", True),
+    (r"^\s*Vorteile für Unternehmen & Kanzleien:?", True),
+    (r"^\s*Unsere Vorteile für Ihr Unternehmen:?", True),
+    # "Warum Xyz?:" is now a strong_end_marker
+    (r"^\s*Für weitere Informationen.*$", True),
+    (r"^\s*Kontakt & Demo\s*$", True),
+    (r"^\s*Zertifizierungen und Auszeichnungen:?", True),
+    (r"^\s*Technologie & Medizinischer Nutzen:?", True),
+    (r"^\s*Medizinisches Personal finden\s*–\s*Schnell, einfach & flexibel:?", True),
+    (r"^\s*Jetzt auch für ambulante Pflegedienste.*$", True),
+    (r"^\s*Erfolgreiche Kunden wie .+", True),
+    (r"^\s*Bis zu \d+% bessere Ausschreibungsergebnisse.*$", True),
+    (r"^\s*(Mehr Reichweite|Zeitersparnis|Geführte Unterstützung):", True),
+    (r"^\s*Best Practices für optimale Ergebnisse:?", True),
+    (r"^\s*Mit ihrer umfassenden Expertise.*$", True),
+    (r"^\s*In enger Zusammenarbeit mit der Wirtschaft.*$", True),
+    (r"^\s*Cloud Ahoi verfolgt einen ganzheitlichen Ansatz.*$", True),
+    (r"^\s*Unser umfassendes Netzwerk und unsere Expertise.*$", True),
+    (r"^\s*Medlytics verfolgt die Mission.*$", True),
+    (r"^\s*Cannaleo setzt neue Maßstäbe.*$", True),
+    (r"^\s*MEDWING revolutioniert die Personalvermittlung.*$", True),
+    (r"^\s*Profitbl kombiniert Beratung, Technologie.*$", True),
+    (r"^\s*Die GVS Group bietet neben hochwertigen Produkten auch umfassende Serviceleistungen:?", True),
+    (r"^\s*Egal, ob Pflegekräfte gesucht werden.*$", True),
+    (r"^\s*Mit Notara sparen Notariate.*$", True),
+    (r"^\s*Mit seiner Expertise hat Erik Kaatz.*$", True),
+    (r"^\s*Mit fundierter Expertise und einem praxisorientierten Ansatz.*$", True),
+    (r"^\s*Prozessoptimierung für Kanzleien:?", True),
+    (r"^\s*Spezialisiert auf Steuerkanzleien:", True),
+    (r"^\s*DATEV-Experten:", True),
+    (r"^\s*Reduzierung von Verwaltungsaufwand:", True),
+    (r"^\s*Optimierung der Mandantenkommunikation:", True),
+    (r"^\s*Hochwertige Schokoladen für Hotels & Gastronomie:", True),
+    (r"^\s*Als Willkommensgruß für Gäste.*$", True),
+    (r"^\s*Als kleine Aufmerksamkeit oder Turndown-Service.*$", True),
+    (r"^\s*Als exklusives Geschenkangebot.*$", True),
+    (r"^\s*Als Highlight für das Restaurant.*$", True),
+    (r"^\s*Kurzum: Coppeneur verleiht Hotels.*$", True),
+    (r"^\s*Handwerkliche Herstellung mit höchsten Qualitätsansprüchen.*$", True),
+    (r"^\s*Nachhaltige Kakao-Beschaffung & faire Produktionsstandards.*$", True),
+    (r"^\s*Individualisierbare Genussprodukte.*$", True),
+    (r"^\s*Erfahrung & Leidenschaft für feinste Schokoladenkunst.*$", True),
+    (r"^\s*Juristische Expertise:", True),
+    (r"^\s*Nachweisbare Erfolge:", True),
+    (r"^\s*Kundenorientierter Ansatz:", True),
+    (r"^\s*Vorteile der Zusammenarbeit mit vemeto:?", True),
+    (r"^\s*Zertifizierte Beratungsqualität:", True),
+    (r"^\s*Staatliche Fördermöglichkeiten:", True),
+    (r"^\s*Langfristige Partnerschaften:", True),
+    (r"^\s*Franchise-Möglichkeiten:", True),
+    (r"^\s*Mit vemeto können Unternehmen und Steuerberater.*$", True),
+    (r"^\s*Für ein unverbindliches Erstgespräch.*$", True),
+    (r"^\s*Globale Präsenz:", True),
+    (r"^\s*DEVIM legt großen Wert auf eine enge Zusammenarbeit.*$", True),
+    (r"^\s*Für weitere Informationen oder zur Vereinbarung eines persönlichen Gesprächs.*$", True),
+    (r"^\s*visitronic legt großen Wert auf Fairness und Vertrauen.*$", True),
+    (r"^\s*Exzellenzbetrieb Deutscher Mittelstand.*$", True),
+    (r"^\s*TOP 100 Innovator \d{4}.*$", True),
+    (r"^\s*ISO \d+:\d+.*$", True)
+]
+
+SECTION_HEADER_PATTERN = re.compile(r"^[A-ZÄÖÜ][a-zäöüß]+([\s\-][A-ZÄÖÜa-zäöüß]+){0,4}:$")
+
+# Number of times each end marker ("end: ...") and filter rule ("filter: ...") fired in this process
+rule_hits = collections.Counter()
+
+
+def compile_end_markers(markers):
+    """
+    Compiles the lowercased end markers into one prefix regex and one regex for the ':'-terminated
+    markers that may appear anywhere in a line. "Warum ...?:" markers keep their special rule
+    (they only count when at most 5 more characters follow) and are returned separately.
+    """
+    lowered = [marker.lower().strip() for marker in markers if marker.lower().strip()]
+    special = [marker for marker in lowered if marker.startswith("warum ") and marker.endswith("?:")]
+    regular = [marker for marker in lowered if marker not in special]
+    prefix_pattern = re.compile("|".join(re.escape(marker) for marker in regular))
+    contains_pattern = re.compile("|".join(re.escape(marker) for marker in regular if marker.endswith(":")))
+    return prefix_pattern, contains_pattern, special
+
+
+def compile_filter_rules(rules):
+    """
+    Compiles the filter rules into a single alternation with one named group per rule,
+    so each line is scanned once and match.lastgroup tells which rule fired.
+    """
+    parts = []
+    for index, (pattern, ignore_case) in enumerate(rules):
+        if not pattern.startswith("^"):
+            raise ValueError(f"Filter rule must be anchored at the line start: {pattern}")
+        parts.append(f"(?P<rule{index}>{'(?i:' + pattern + ')' if ignore_case else pattern})")
+    return re.compile("|".join(parts))
+
+
+END_MARKER_PREFIX_PATTERN, END_MARKER_CONTAINS_PATTERN, SPECIAL_END_MARKERS = compile_end_markers(STRONG_END_MARKERS)
+FILTER_OUT_PATTERN = compile_filter_rules(FILTER_OUT_RULES)
+INDUSTRY_RULES = IndustryRules.load()
+
+
+def match_end_marker(line_lower):
+    """Returns the end marker that ends the services section at this (lowercased) line, or None."""
+    match = END_MARKER_PREFIX_PATTERN.match(line_lower) or END_MARKER_CONTAINS_PATTERN.search(line_lower)
+    if match:
+        return match.group(0)
+    for marker in SPECIAL_END_MARKERS:
+        if (line_lower.startswith(marker) or marker in line_lower) and len(line_lower) <= len(marker) + 5:
+            return marker
+    return None
+
+
+def match_filter_rule(line):
+    """Returns the pattern of the filter rule that drops this (stripped) line, or None."""
+    match = FILTER_OUT_PATTERN.match(line)
+    if match:
+        return FILTER_OUT_RULES[int(match.lastgroup[len("rule"):])][0]
+    return None
+
 
 def extract_website_from_text(text_block):
     """
@@ -69,118 +245,6 @@ def extract_services_from_block(block_text):
     service_items_list = [] 
     in_service_section = False
     
-    strong_end_markers = [
-        "Tel:", "Mobil:", "Fax:", "Ansprechpartner:", "Geschäftsführer:", "Kontakt:", 
-        "Website:", "Webseite:", "Adresse:", "Standort:", "E-Mail:", "Telefon:", "Homepage:",
-        "Mehr unter:", "Quelle:", "Notizen:", "Anmerkungen:", "Fazit:", "Bewertung:", "Status:",
-        "Kategorie:", "Schlagworte:", "Tags:", "Verknüpfungen:", "Siehe auch:", 
-        "Ähnliche Unternehmen:", "Kooperationen:", "Partnerschaften:", "Referenzen:", 
-        "Kunden:", "Projekte:", "Fallstudien:", "Erfolge:", "Auszeichnungen:", "Zertifizierungen:", 
-        "Mitgliedschaften:", "Presse:", "Veröffentlichungen:", "News:", "Blog:", "Social Media:",
-        "Impressum", "Datenschutz", "AGB", "Nutzungsbedingungen", "Haftungsausschluss", 
-        "Copyright", "©", "Alle Rechte vorbehalten", "Stand:", "Version:", "Letzte Aktualisierung:",
-        "Gegründet:", "Mitarbeiter:", "Umsatz:", "Branche:", "Sektor:", "Industrie:", "Nische:", 
-        "Zielgruppe:", "Kundenfokus:", "Marktsegment:", "Wettbewerber:", "USP:", 
-        "Alleinstellungsmerkmal:", "Vision:", "Mission:", "Werte:", "Philosophie:", "Geschichte:", 
-        "Über uns", "Team:", "Karriere:", "Jobs:", "Stellenangebote:", "Investoren:", "Finanzierung:",
-        "Vorteile:", "Nutzen:", "Zielsetzung:", "Herausforderungen:", "Lösungsansatz:",
-        "Technologie-Stack:", "Methodik:", "Prozess:", "Ergebnisse:", "Nächste Schritte:",
-        "### ", 
-        "---", "\n* * *\n", "\n===", 
-        "Standorte und Beteiligungen", 
-        "________________________________________",
-        "Unternehmensphilosophie:", # Added as strong end marker
-        "Kontaktinformationen:",   # Added as strong end marker
-        "Anwendungsfall – Kundenansprache:", # Added
-        r"Warum [A-Za-zÄÖÜäöüß\s]+?:" # General "Warum Xyz?:"
-    ]
-
-    filter_out_patterns = [
-        re.compile(r"^\s*\(.+\)\s*?\s*$"),
-        re.compile(r"^\s*🚀?\s*[\"“»„].*[\"”«“]\s*$"), 
-        re.compile(r"^\s*AL\s*\d+\s*$"), 
-        re.compile(r"^\s*\d{5}\s+[A-Za-zÄÖÜäöüß\s.-]+$", re.IGNORECASE), 
-        re.compile(r"^\s*[A-Za-zÄÖÜäöüß.\s-]+straße\s*\d+.*$", re.IGNORECASE), 
-        re.compile(r"^\s*(Weitere Informationen|Über das Unternehmen|Über [A-Za-z\s]+ GmbH):?\s*$", re.IGNORECASE),
-        re.compile(r"^\s*💰\s*"), 
-        re.compile(r"^\s*Mehr Infos unter:", re.IGNORECASE),
-        re.compile(r"^\s*Quelle:", re.IGNORECASE),
-        re.compile(r"^\s*Tel\.?\s*:\s*.+", re.IGNORECASE), 
-        re.compile(r"^\s*E-Mail\s*:\s*.+", re.IGNORECASE), 
-        re.compile(r"^\s*Mobil\s*:\s*.+", re.IGNORECASE), 
-        re.compile(r"^\s*Fax\s*:\s*.+", re.IGNORECASE),   
-        re.compile(r"^\s*Anschrift\s*:", re.IGNORECASE),
-        re.compile(r"^\s*Adresse\s*:\s*.+", re.IGNORECASE), 
-        re.compile(r"^\s*Website\s*:\s*.+", re.IGNORECASE), 
-        re.compile(r"^\s*Homepage\s*:\s*.+", re.IGNORECASE),
-        re.compile(r"^\s*\(?mailto:.*?\)?$", re.IGNORECASE), 
-        re.compile(r"^\s*Standorte und Beteiligungen\s*:\s*$", re.IGNORECASE), 
-        re.compile(r"^\s*schrumpfenden Markt", re.IGNORECASE), 
-        # Unternehmensphilosophie and Kontaktinformationen are now strong_end_markers
-        re.compile(r"^\s*(📌|🚀|💡|✔|📍|📞|📧|🌐)\s*.*$", re.IGNORECASE), 
-        re.compile(r"^\s*Haben Sie kurz drei Minuten.*$", re.IGNORECASE),
-        # Anwendungsfall is now a strong_end_marker
-        re.compile(r"^\s*Vorteile für Ihr Unternehmen:?", re.IGNORECASE),
-        re.compile(r"^\s*Vorteile für Unternehmen & Kanzleien:?", re.IGNORECASE),
-        re.compile(r"^\s*Unsere Vorteile für Ihr Unternehmen:?", re.IGNORECASE),
-        # "Warum Xyz?:" is now a strong_end_marker
-        re.compile(r"^\s*Für weitere Informationen.*$", re.IGNORECASE),
-        re.compile(r"^\s*Kontakt & Demo\s*$", re.IGNORECASE),
-        re.compile(r"^\s*Zertifizierungen und Auszeichnungen:?", re.IGNORECASE),
-        re.compile(r"^\s*Technologie & Medizinischer Nutzen:?", re.IGNORECASE),
-        re.compile(r"^\s*Medizinisches Personal finden\s*–\s*Schnell, einfach & flexibel:?", re.IGNORECASE),
-        re.compile(r"^\s*Jetzt auch für ambulante Pflegedienste.*$", re.IGNORECASE),
-        re.compile(r"^\s*Erfolgreiche Kunden wie .+", re.IGNORECASE),
-        re.compile(r"^\s*Bis zu \d+% bessere Ausschreibungsergebnisse.*$", re.IGNORECASE),
-        re.compile(r"^\s*(Mehr Reichweite|Zeitersparnis|Geführte Unterstützung):", re.IGNORECASE),
-        re.compile(r"^\s*Best Practices für optimale Ergebnisse:?", re.IGNORECASE),
-        re.compile(r"^\s*Mit ihrer umfassenden Expertise.*$", re.IGNORECASE),
-        re.compile(r"^\s*In enger Zusammenarbeit mit der Wirtschaft.*$", re.IGNORECASE),
-        re.compile(r"^\s*Cloud Ahoi verfolgt einen ganzheitlichen Ansatz.*$", re.IGNORECASE),
-        re.compile(r"^\s*Unser umfassendes Netzwerk und unsere Expertise.*$", re.IGNORECASE),
-        re.compile(r"^\s*Medlytics verfolgt die Mission.*$", re.IGNORECASE),
-        re.compile(r"^\s*Cannaleo setzt neue Maßstäbe.*$", re.IGNORECASE),
-        re.compile(r"^\s*MEDWING revolutioniert die Personalvermittlung.*$", re.IGNORECASE),
-        re.compile(r"^\s*Profitbl kombiniert Beratung, Technologie.*$", re.IGNORECASE),
-        re.compile(r"^\s*Die GVS Group bietet neben hochwertigen Produkten auch umfassende Serviceleistungen:?", re.IGNORECASE),
-        re.compile(r"^\s*Egal, ob Pflegekräfte gesucht werden.*$", re.IGNORECASE),
-        re.compile(r"^\s*Mit Notara sparen Notariate.*$", re.IGNORECASE),
-        re.compile(r"^\s*Mit seiner Expertise hat Erik Kaatz.*$", re.IGNORECASE),
-        re.compile(r"^\s*Mit fundierter Expertise und einem praxisorientierten Ansatz.*$", re.IGNORECASE),
-        re.compile(r"^\s*Prozessoptimierung für Kanzleien:?", re.IGNORECASE),
-        re.compile(r"^\s*Spezialisiert auf Steuerkanzleien:", re.IGNORECASE),
-        re.compile(r"^\s*DATEV-Experten:", re.IGNORECASE),
-        re.compile(r"^\s*Reduzierung von Verwaltungsaufwand:", re.IGNORECASE),
-        re.compile(r"^\s*Optimierung der Mandantenkommunikation:", re.IGNORECASE),
-        re.compile(r"^\s*Hochwertige Schokoladen für Hotels & Gastronomie:", re.IGNORECASE),
-        re.compile(r"^\s*Als Willkommensgruß für Gäste.*$", re.IGNORECASE),
-        re.compile(r"^\s*Als kleine Aufmerksamkeit oder Turndown-Service.*$", re.IGNORECASE),
-        re.compile(r"^\s*Als exklusives Geschenkangebot.*$", re.IGNORECASE),
-        re.compile(r"^\s*Als Highlight für das Restaurant.*$", re.IGNORECASE),
-        re.compile(r"^\s*Kurzum: Coppeneur verleiht Hotels.*$", re.IGNORECASE),
-        re.compile(r"^\s*Handwerkliche Herstellung mit höchsten Qualitätsansprüchen.*$", re.IGNORECASE),
-        re.compile(r"^\s*Nachhaltige Kakao-Beschaffung & faire Produktionsstandards.*$", re.IGNORECASE),
-        re.compile(r"^\s*Individualisierbare Genussprodukte.*$", re.IGNORECASE),
-        re.compile(r"^\s*Erfahrung & Leidenschaft für feinste Schokoladenkunst.*$", re.IGNORECASE),
-        re.compile(r"^\s*Juristische Expertise:", re.IGNORECASE),
-        re.compile(r"^\s*Nachweisbare Erfolge:", re.IGNORECASE),
-        re.compile(r"^\s*Kundenorientierter Ansatz:", re.IGNORECASE),
-        re.compile(r"^\s*Vorteile der Zusammenarbeit mit vemeto:?", re.IGNORECASE),
-        re.compile(r"^\s*Zertifizierte Beratungsqualität:", re.IGNORECASE),
-        re.compile(r"^\s*Staatliche Fördermöglichkeiten:", re.IGNORECASE),
-        re.compile(r"^\s*Langfristige Partnerschaften:", re.IGNORECASE),
-        re.compile(r"^\s*Franchise-Möglichkeiten:", re.IGNORECASE),
-        re.compile(r"^\s*Mit vemeto können Unternehmen und Steuerberater.*$", re.IGNORECASE),
-        re.compile(r"^\s*Für ein unverbindliches Erstgespräch.*$", re.IGNORECASE),
-        re.compile(r"^\s*Globale Präsenz:", re.IGNORECASE),
-        re.compile(r"^\s*DEVIM legt großen Wert auf eine enge Zusammenarbeit.*$", re.IGNORECASE),
-        re.compile(r"^\s*Für weitere Informationen oder zur Vereinbarung eines persönlichen Gesprächs.*$", re.IGNORECASE),
-        re.compile(r"^\s*visitronic legt großen Wert auf Fairness und Vertrauen.*$", re.IGNORECASE),
-        re.compile(r"^\s*Exzellenzbetrieb Deutscher Mittelstand.*$", re.IGNORECASE),
-        re.compile(r"^\s*TOP 100 Innovator \d{4}.*$", re.IGNORECASE),
-        re.compile(r"^\s*ISO \d+:\d+.*$", re.IGNORECASE) 
-    ]
-    
     current_services_buffer = []
     lines = block_text.split('\n')
     service_section_started_keyword_line_index = -1
@@ -204,35 +268,22 @@ def extract_services_from_block(block_text):
             continue
 
         if in_service_section:
-            line_lower = stripped_line.lower()
-            found_strong_marker = False
-            for marker_raw in strong_end_markers:
-                marker = marker_raw.lower().strip()
-                if not marker: continue
-                # Check if the line *is* the marker or *starts with* the marker or contains it as a section
-                if line_lower == marker or line_lower.startswith(marker) or (marker.endswith(":") and marker in line_lower):
-                    # Specific check for "Warum Xyz?:" to avoid premature ending if it's part of a service description
-                    if marker.startswith("warum ") and marker.endswith("?:") and len(line_lower) > len(marker) + 5: # if more text follows
-                        continue
-                    found_strong_marker = True
-                    break
-            if found_strong_marker:
+            end_marker = match_end_marker(stripped_line.lower())
+            if end_marker:
+                rule_hits[f"end: {end_marker}"] += 1
                 break 
 
             if not stripped_line and line_num > 0 and not lines[line_num-1].strip() \
                and line_num > service_section_started_keyword_line_index +1 : 
                 break 
             
-            is_filtered_out = False
-            for pattern in filter_out_patterns:
-                if pattern.search(stripped_line): 
-                    is_filtered_out = True
-                    break
-            if is_filtered_out:
+            filter_rule = match_filter_rule(stripped_line)
+            if filter_rule:
+                rule_hits[f"filter: {filter_rule}"] += 1
                 continue
             
             # Heuristic for general section headers like "Some Section:"
-            if re.match(r"^[A-ZÄÖÜ][a-zäöüß]+([\s\-][A-ZÄÖÜa-zäöüß]+){0,4}:$", stripped_line) and \
+            if SECTION_HEADER_PATTERN.match(stripped_line) and \
                line_num > service_section_started_keyword_line_index:
                 # Avoid stopping for very long lines that happen to end with a colon
                 if len(stripped_line) < 60 : 
@@ -304,346 +355,23 @@ def extract_services_from_block(block_text):
 
 def determine_industry_and_niche(company_name, services_text, company_block_text):
     """
-    Determines the industry and customer niche based on company name, services, and block text.
-    Contains a comprehensive set of heuristics for ~70 companies.
+    Determines the industry and customer niche based on company name and services,
+    using the company and fallback rules of industry_rules.json (see industry_rules.py).
     """
-    industry = "Unknown"
-    niche = "Unknown"
-    services_lower = services_text.lower()
-    block_lower = company_block_text.lower()
-    name_lower = company_name.lower()
-
-    if "denkmalzukunft.com" in name_lower or "denkmalzukunft" in name_lower:
-        industry = "Beratung"
-        niche = "Effizienzsteigerung, Führungskräfteentwicklung, Prozessoptimierung"
-        if "produktionsoptimierung" in services_lower and "change-management" in services_lower:
-            niche = "Beratung für Produktionsoptimierung, Change-Management und Führungskräfteentwicklung"
-    elif "caremates.de" in name_lower or "kuidado" in name_lower:
-        industry = "Gesundheitswesen / Software"
-        niche = "Software für Pflegeplanung und -management (digitale Anmeldebögen, KI-Pflegeanamnese)"
-    elif "cloud-ahoi.de" in name_lower or "cloud ahoi" in name_lower:
-        industry = "IT-Dienstleistungen / Informationssicherheit"
-        niche = "Beratung und Implementierung von ISMS (ISO 27001, TISAX), Interim CISO"
-    elif "mscompanysolutions.de" in name_lower or "ms company solutions" in name_lower:
-        industry = "Personalvermittlung / IT-Beratung"
-        niche = "Personalvermittlung (Gesundheitswesen), IT-Projektmanagement, Interkulturelles Training"
-    elif "dbschenker.com" in name_lower or "db schenker" in name_lower:
-        industry = "Logistik / Zulieferer"
-        niche = "Globale Logistik (Land, Luft, See, Kontrakt), Zolldienstleistungen, Zulieferer von Bauteilen"
-    elif "healthworks.de" in name_lower:
-        industry = "Gesundheitswesen / Arbeitsmedizin"
-        niche = "Arbeitsmedizinische Betreuung, Präventivmedizin, Gefährdungsbeurteilungen"
-    elif "tenderwise.io" in name_lower:
-        industry = "Software / Logistik"
-        niche = "Digitale Plattform für Logistik-Ausschreibungen (SaaS), Tender Management"
-    elif "recos.de" in name_lower:
-        industry = "IT-Dienstleistungen"
-        niche = "IT-Systemhaus (Consulting, Hardware-Support Fujitsu, Virtualisierung, Netzwerk/WLAN)"
-    elif "vidify.me" in name_lower:
-        industry = "Software / Marketing / KI"
-        niche = "KI-gestützte Erklärvideo-Erstellung, Visuelle Content-Erstellung, Video-Marketing"
-    elif "ecoblister.com" in name_lower:
-        industry = "Verpackungsindustrie / Pharmazie / Maschinenbau"
-        niche = "Nachhaltige Blisterverpackungen (Arzneikalender), Befüllsysteme (BlisterJacky®), Blisterautomaten (Celia®)"
-    elif "hospichef.com" in name_lower:
-        industry = "Software / Gastronomie / Gesundheitswesen"
-        niche = "Digitales Menübestellsystem für Kliniken (Patientenbestellung, Echtzeit-Kommunikation)"
-    elif "salutes.space" in name_lower:
-        industry = "Technologie / Raumfahrt / KI"
-        niche = "KI-Plattform (AstraDroid), Dezentrale Weltrauminfrastruktur als Service"
-    elif "medlytics.ai" in name_lower:
-        industry = "Software / KI / Gesundheitswesen"
-        niche = "KI-basierte Frühwarnsysteme für Kliniken (Nierenversagen, Delir, Glukose, Mangelernährung)"
-    elif "cannaleo.de" in name_lower:
-        industry = "Pharma / Handel / Software"
-        niche = "Digitale Lösungen für Medizinal-Cannabis Vertrieb (Webseiten, Bestellsysteme für Apotheken)"
-    elif "medwing.com" in name_lower:
-        industry = "Gesundheitswesen / Personalvermittlung / Plattform"
-        niche = "Karriereplattform für Gesundheitswesen (Direktsuche, Jobanzeigen, Zeitarbeit, International Recruiting)"
-    elif "dimarketing-salesconsulting.de" in name_lower:
-        industry = "Beratung / Vertriebstraining"
-        niche = "Vertriebscoaching (V360°-Methodik), Workshops, Mentoring, Neukundengewinnung"
-    elif "profitbl.com" in name_lower:
-        industry = "Vertriebsdienstleistungen / Software"
-        niche = "Sales Outsourcing, Multichannel Outreach, Markteintrittsstrategien, KI-gestützte Sales Academy"
-    elif "balzer-partner.de" in name_lower:
-        industry = "Beratung / Vertriebsmanagement"
-        niche = "Externe Vertriebsleitung für den Mittelstand, Vertrieb as a Service, Inside Sales Team Aufbau"
-    elif "rocketta.de" in name_lower:
-        industry = "IT-Dienstleistungen / Software / KI"
-        niche = "Microsoft 365 & SharePoint Lösungen, KI-Erweiterungen für Microsoft Co-Pilot"
-    elif "noor-vision.com" in name_lower:
-        industry = "IT-Beratung / SAP"
-        niche = "SAP S/4HANA & EWM-Consulting, SAP Public Cloud, Digitale Prozessoptimierung"
-    elif "smart2success.com" in name_lower:
-        industry = "Software / Beratung"
-        niche = "Plattform für Projekt-, Ressourcen-, Lieferantenmanagement und Informationssicherheit (ISO 27001)"
-    elif "razertech.de" in name_lower:
-        industry = "IT-Dienstleistungen"
-        niche = "IT-Sicherheit, Microsoft 365, Managed IT-Services, Cloud-Telefonie, Windows 11 Migration"
-    elif "linovy.de" in name_lower:
-        industry = "Software / KI / Beratung"
-        niche = "KI-gestützte Automatisierung, Cloud-Entwicklung, Fördermittelvermittlung für KI-Projekte"
-    elif "kieker.net" in name_lower:
-        industry = "Software / Monitoring / Event-Technik"
-        niche = "Open-Source Application Performance Monitoring (Kieker Framework), Technische Event-Dienstleistungen"
-    elif "gvs-sg.de" in name_lower or "gvs schmidt" in name_lower or "gvs-grossverbraucherspezialisten eg" in name_lower:
-        industry = "Großhandel / Dienstleistung / Bildung"
-        niche = "Fachgroßhandel für Reinigung & Pflege, GVS AKADEMIE, Logistik, Technischer Service"
-    elif "carelend.de" in name_lower:
-        industry = "Personalvermittlung / Bildung / Gesundheitswesen"
-        niche = "Vermittlung & Schulung ausländischer Pflegefachkräfte, Integrationsunterstützung"
-    elif "notara.de" in name_lower:
-        industry = "Software / Rechtstechnologie"
-        niche = "Digitale Mandanten-Datenblätter für Notariate, Prozessoptimierung für Notare"
-    elif "greentech.training" in name_lower:
-        industry = "Personalvermittlung / Bildung / Nachhaltigkeit"
-        niche = "Rekrutierung & Weiterbildung von Fachkräften für die grüne Energiewende (Green IT, Solar)"
-    elif "elixionmedical.com" in name_lower:
-        industry = "Medizintechnik / Software / Gesundheitswesen"
-        niche = "SmartDrain System zur intelligenten Überwachung von medizinischen Drainagen/Kathetern"
-    elif "erikkaatz.de" in name_lower:
-        industry = "Beratung / Vertriebsmanagement"
-        niche = "Vertriebsstrategie, Teamaufbau & Coaching, Mentoring, Provisionsmodelle (KSR Sales Group)"
-    elif "avia-concept.de" in name_lower:
-        industry = "Beratung / Compliance / Luftfahrt"
-        niche = "Verfahrensdokumentation nach GoBD, Projektentwicklung (Luftfahrt), Luftverkehrsberatung"
-    elif "debeleeftv.de" in name_lower:
-        industry = "Medizintechnik / Software / Hilfsmittel für Pflege"
-        niche = "De BeleefTV - Interaktiver Aktivitätstisch für Demenzpatienten in Pflegeeinrichtungen"
-    elif "relias.de" in name_lower:
-        industry = "Software / E-Learning / Gesundheitswesen"
-        niche = "Digitale Weiterbildungsplattform für Gesundheits- & Sozialwesen (Pflege, Rettungsdienste)"
-    elif "mediceo.com" in name_lower:
-        industry = "Software / Gesundheitswesen"
-        niche = "Clinical Decision Support System (CDSS), Digitale Kittelkarte, SOP-Optimierung für Kliniken"
-    elif "uberblick.io" in name_lower:
-        industry = "Software / Dokumentenmanagement"
-        niche = "Intelligente Dokumentenverwaltung & -organisation (Cloud, KI-basiert)"
-    elif "digitalagentur1.de" in name_lower:
-        industry = "Marketing / Webentwicklung / Beratung"
-        niche = "Webentwicklung, E-Commerce, SEO, Online-Marketing, Prozessoptimierung für Kanzleien (DATEV)"
-    elif "kanzleipartnergmbh.de" in name_lower:
-        industry = "Software / Beratung / IT-Dienstleistungen"
-        niche = "Digitalisierung & Automatisierung für Steuerkanzleien (DATEV-Erweiterungen)"
-    elif "dasmerch.com" in name_lower:
-        industry = "Handel / Marketing / Produktion"
-        niche = "Individuelle Merchandise-Produkte, Full-Service-Produktion (Design, Fertigung, Logistik)"
-    elif "coppeneur.de" in name_lower:
-        industry = "Lebensmittel / Handel / Manufaktur"
-        niche = "Premium Schokoladen- & Pralinenmanufaktur (Bean-to-Bar), B2B für Hotels/Gastronomie"
-    elif "corominas-consulting.de" in name_lower:
-        industry = "Marketing / Beratung / Rechtstechnologie"
-        niche = "Online-Marketing für Kanzleien (SEO, SEA, Social Media, Webdesign) geleitet von Jurist"
-    elif "steuerkoepfe.de" in name_lower:
-        industry = "Medien / Bildung / Community-Plattform"
-        niche = "Informations- & Weiterbildungsplattform für Steuerberater (Podcast, VIP-Klub, taxflix)"
-    elif "digi-bel.de" in name_lower:
-        industry = "Software / IT-Dienstleistungen (für Steuerkanzleien)"
-        niche = "Plattform für digitalen Dokumentenaustausch & Belegerfassung (DATEV-Alternative)"
-    elif "lemonad.marketing" in name_lower:
-        industry = "Marketing / Agentur"
-        niche = "Performance-Marketing Agentur (datengetrieben, SEO, SEA, Social Media, Conversion-Optimierung)"
-    elif "taptotie.com" in name_lower:
-        industry = "Technologie / Konsumgüter / Nachhaltigkeit"
-        niche = "NFC-basierte Holz-Visitenkarten (umweltfreundlich) - Service eingestellt Juni 2025"
-    elif "hrlab.de" in name_lower:
-        industry = "Software / HR-Technologie (SaaS)"
-        niche = "Cloudbasierte HR-Software für KMU (Personalmanagement, Prozessautomatisierung, Zeitwirtschaft, Bewerbermanagement)"
-    elif "pnp-media.de" in name_lower:
-        industry = "Marketing / Webentwicklung / Agentur"
-        niche = "Webdesign, SEO, SEA, Performance Marketing, Social Recruiting, Branding"
-    elif "sns-corp.com" in name_lower or "nss-corp.com" in name_lower : 
-        industry = "IT-Dienstleistungen / Telekommunikation"
-        niche = "VoIP Services (Digium Switchvox, Asterisk), Data Services (Ethernet Switching, Wi-Fi), IT Support"
-    elif "vemeto.de" in name_lower:
-        industry = "Beratung / Software / Compliance"
-        niche = "Verfahrensdokumentation GoBD, Prozessoptimierung, Schulungen, BAFA-gelisteter Berater, Franchise-System"
-    elif "smyczekconsulting.de" in name_lower:
-        industry = "Beratung / Personalvermittlung"
-        niche = "Consulting (Markteintritt, Produktkonfiguration), Recruiting, Führungskräfte-Coaching"
-    elif "w-v.co.uk" in name_lower:
-        industry = "Rechtsberatung / Steuerberatung / Unternehmensberatung"
-        niche = "Internationale Unternehmensgründung & -expansion, Vermögenssicherung, Steuerplanung, Erbschaftsplanung"
-    elif "project-sp.de" in name_lower:
-        industry = "Maschinenbau / Automatisierungstechnik"
-        niche = "Verpackungsmaschinen (PROPAC), Palettiermaschinen (PROPAL), Fördertechnik, Etikettierlösungen (PROLABEL), Cobots"
-    elif "aliminkasso.de" in name_lower:
-        industry = "Finanzdienstleistungen / Inkasso / KI"
-        niche = "Kostenloses Inkasso (erfolgsbasiert), KI-optimierte Schuldnerkommunikation, Mahnwesen, Bonitätsprüfung"
-    elif "bluecrestinc.com" in name_lower:
-        industry = "Technologie / Drucklösungen / Postautomatisierung"
-        niche = "Produktionsdrucker, Kuvertiersysteme, Sortiersysteme, Paketautomatisierung, Softwarelösungen für Postverarbeitung"
-    elif "devim.de" in name_lower:
-        industry = "Softwareentwicklung"
-        niche = "Individuelle Bürosoftware, DailyCentral (modulares digitales Büro für KMU & Selbstständige)"
-    elif "salesby.de" in name_lower:
-        industry = "Vertrieb / Beratung" 
-        niche = "Vertriebsunterstützung / Sales-Strategien / Leadgenerierung" 
-    elif "assemblean.com" in name_lower:
-        industry = "Software / Logistik / Supply Chain Management"
-        niche = "Cloud-basierte Software für Supply Chain Kollaboration und Logistikprozesse"
-    elif "rocket9.cloud" in name_lower:
-        industry = "Software / IT-Dienstleistungen / Cloud Computing"
-        niche = "Maßgeschneiderte Cloud-Lösungen (ROCKET Cloud), Business as a Service, Prozessoptimierung (ROCKET Suit)"
-    elif "bodo-schmitz-urban.de" in name_lower:
-        industry = "Beratung / Coaching / Gesundheitswesen"
-        niche = "Mentoring & Coaching für Apothekeninhaber (BSU-Akademie), Apotheker-Unternehmer-Tag"
-    elif "tegoly.com" in name_lower:
-        industry = "Software / Rechtstechnologie" 
-        niche = "Software für digitale Signaturen (tegolySIGN) / Vertragsmanagement" 
-    elif "siteplan.at" in name_lower:
-        industry = "Software / Bauwesen / Geoinformation"
-        niche = "Digitale Vermessungs- und Navigationslösung für den Tiefbau (SitePlan)"
-    elif "dexter-health.com" in name_lower:
-        industry = "Gesundheitswesen / Software / KI"
-        niche = "KI-gestützte Software zur Optimierung der Patientenaufnahme und -steuerung in Kliniken"
-    elif "primeblister.de" in name_lower:
-        industry = "Verpackungsindustrie / Pharmazie / Maschinenbau"
-        niche = "Nachhaltige Blisterverpackungen (plastikfrei), Systeme für Apotheken (manuell bis automatisch)"
-    elif "novaheal.de" in name_lower:
-        industry = "Software / E-Learning / Gesundheitswesen" 
-        niche = "Digitale Lernlösungen und Weiterbildung für Pflegekräfte / Gesundheitswesen" 
-    elif "carlgoetz.de" in name_lower:
-        industry = "Großhandel / Bauwesen / Holzwerkstoffe" 
-        niche = "Großhandel für Holzwerkstoffe, Bodenbeläge, Türen, Bauelemente" 
-    elif "schluetersche.de" in name_lower:
-        industry = "Medien / Verlagswesen / Marketing"
-        niche = "Fachmedien (Handwerk, Bau, Industrie etc.), Online-Marketing Services (KMU), Verzeichnismedien (Gelbe Seiten)"
-    elif "elvari.de" in name_lower:
-        industry = "Gesundheitswesen / Handel / Wellness" 
-        niche = "Gesundheitsprodukte (z.B. Elvari Kristallmatte), Testangebote, Finanzierung" 
-    elif "rodias.de" in name_lower or "spie-rodias.de" in name_lower:
-        industry = "IT-Dienstleistungen / Softwareentwicklung / Industrie 4.0"
-        niche = "Predictive Maintenance, Condition Monitoring, Softwarelösungen für Industrie, IT-Service & Support"
-    elif "visitronic.de" in name_lower:
-        industry = "Sicherheitstechnik / IT-Dienstleistungen / Kommunikationstechnik"
-        niche = "Einbruchschutzsysteme, Rufanlagen (Pflege), Datennetze (VoIP), Glasfaserinstallation"
-    elif "nxtlog.io" in name_lower: 
-        industry = "Software / Logistik / Supply Chain Management"
-        niche = "SaaS-Plattform für Echtzeit-Transparenz und Management in der Supply Chain"
-
-
-    # Generic fallbacks if no specific rule matches after all specific checks
-    elif industry == "Unknown": 
-        if "software" in services_lower or "saas" in services_lower or ".io" in name_lower or "digital" in services_lower or "plattform" in services_lower or ".ai" in name_lower:
-            industry = "Software / IT"
-            if "beratung" in services_lower or "consulting" in services_lower:
-                niche = "Softwareentwicklung und IT-Beratung"
-            elif "agentur" in services_lower:
-                niche = "Digitalagentur, Softwareentwicklung"
-            elif "ki" in services_lower or "künstliche intelligenz" in services_lower or ".ai" in name_lower:
-                niche = "KI-Softwarelösungen"
-            else:
-                niche = "Softwarelösungen (SaaS), Digitale Plattformen"
-        elif "beratung" in services_lower or "consulting" in services_lower or "coach" in services_lower:
-            industry = "Beratung"
-            if "it" in services_lower or "digital" in services_lower or "erp" in services_lower or "crm" in services_lower:
-                niche = "IT- und Digitalisierungsberatung"
-            elif "management" in services_lower or "strategie" in services_lower:
-                niche = "Management- und Strategieberatung"
-            elif "personal" in services_lower or "hr" in services_lower:
-                niche = "Personalberatung / HR Consulting"
-            else:
-                niche = "Unternehmensberatung"
-        elif "logistik" in services_lower or "supply chain" in services_lower or "transport" in services_lower or "spedition" in services_lower:
-            industry = "Logistik / Transport"
-            niche = "Logistikdienstleistungen, Supply Chain Management"
-        elif "marketing" in services_lower or "agentur" in services_lower or "kommunikation" in services_lower or "seo" in services_lower or "sea" in services_lower:
-            industry = "Marketing / Agentur"
-            if "online" in services_lower or "digital" in services_lower:
-                niche = "Online-Marketing Agentur"
-            else:
-                niche = "Marketing- und Kommunikationsagentur"
-        elif "gesundheit" in services_lower or "medizin" in services_lower or "pflege" in services_lower or "pharma" in services_lower or "health" in name_lower:
-            industry = "Gesundheitswesen / Pharma"
-            if "software" in services_lower or "digital" in services_lower:
-                niche = "Digital Health, Software für Gesundheitswesen"
-            else:
-                niche = "Dienstleistungen im Gesundheitswesen"
-        elif "handel" in services_lower or "shop" in services_lower or "vertrieb" in services_lower or "e-commerce" in services_lower:
-            industry = "Handel / E-Commerce"
-            if "b2b" in services_lower or "großhandel" in services_lower:
-                niche = "B2B Handel, Großhandel"
-            else:
-                niche = "Einzelhandel, E-Commerce"
-
-    return industry, niche
+    return INDUSTRY_RULES.resolve(company_name, services_text)
 
 def parse_markdown(markdown_content):
+    """
+    Extracts one record per company section. `markdown_content` is the document text or an
+    open text file, which is then read line by line (see kunde_sections.py).
+    """
     companies_data = []
-    markdown_content = markdown_content.replace('\r\n', '\n')
-    content_lines = markdown_content.split('\n')
-    
-    data_start_line_idx = 0
-    
-    try:
-        inhalt_idx = -1
-        for i, line in enumerate(content_lines):
-            if line.strip().lower() == "inhalt":
-                inhalt_idx = i
-                break
-        
-        if inhalt_idx != -1:
-            current_idx = inhalt_idx + 1
-            while current_idx < len(content_lines):
-                line_strip = content_lines[current_idx].strip()
-                is_toc_entry = re.match(r"^KUNDE\s+\d+:\s*.*[\s\t]+\d+$", line_strip, re.IGNORECASE)
-                is_actual_header = re.match(r"^KUNDE\s+\d+:\s*.+", line_strip, re.IGNORECASE)
-                
-                if is_actual_header and not is_toc_entry:
-                    data_start_line_idx = current_idx
-                    break
-                elif not line_strip and (current_idx > inhalt_idx + 1): 
-                    peek_idx = current_idx + 1
-                    while peek_idx < len(content_lines) and not content_lines[peek_idx].strip():
-                        peek_idx += 1 
-                    if peek_idx < len(content_lines) and \
-                       re.match(r"^KUNDE\s+\d+:\s*.+", content_lines[peek_idx].strip(), re.IGNORECASE) and \
-                       not re.match(r"^KUNDE\s+\d+:\s*.*[\s\t]+\d+$", content_lines[peek_idx].strip(), re.IGNORECASE):
-                        data_start_line_idx = peek_idx
-                        break
-                current_idx += 1
-            else: 
-                for i, line in enumerate(content_lines):
-                    if re.match(r"^KUNDE\s+\d+:\s*.+", line.strip(), re.IGNORECASE) and \
-                       not re.match(r"^KUNDE\s+\d+:\s*.*[\s\t]+\d+$", line.strip(), re.IGNORECASE):
-                        data_start_line_idx = i
-                        break
-                else: return companies_data 
-        else: 
-            for i, line in enumerate(content_lines):
-                if re.match(r"^KUNDE\s+\d+:\s*.+", line.strip(), re.IGNORECASE) and \
-                   not re.match(r"^KUNDE\s+\d+:\s*.*[\s\t]+\d+$", line.strip(), re.IGNORECASE):
-                    data_start_line_idx = i
-                    break
-            else: return companies_data 
-            
-    except Exception: 
-        return companies_data
-
-    content_to_parse = "\n".join(content_lines[data_start_line_idx:])
-    
-    if not content_to_parse.strip():
-        return companies_data
-
-    company_header_indices = []
-    for match in re.finditer(r"^KUNDE\s+\d+:\s*.+", content_to_parse, re.MULTILINE | re.IGNORECASE):
-        if not re.match(r"^KUNDE\s+\d+:\s*.*[\s\t]+\d+$", match.group(0).strip(), re.IGNORECASE):
-            company_header_indices.append(match.start())
+    if isinstance(markdown_content, str):
+        markdown_content = markdown_content.replace('\r\n', '\n')
 
-    if not company_header_indices:
-        return companies_data
-
-    for i in range(len(company_header_indices)):
-        block_start_idx = company_header_indices[i]
-        block_end_idx = company_header_indices[i+1] if (i + 1) < len(company_header_indices) else len(content_to_parse)
-        
-        current_block_full_text = content_to_parse[block_start_idx:block_end_idx].strip()
-        
-        block_lines = current_block_full_text.split('\n', 1)
-        company_header_line_text = block_lines[0].strip()
-        actual_company_content_text = block_lines[1].strip() if len(block_lines) > 1 else ""
+    for section in iter_kunde_sections(markdown_content):
+        company_header_line_text = section.header.strip()
+        actual_company_content_text = section.text.strip()
 
         name_match_obj = re.match(r"^KUNDE\s+\d+:\s*(.+)", company_header_line_text, re.IGNORECASE)
         if not name_match_obj:
@@ -701,22 +429,19 @@ def write_to_csv(data, filename="script_output/extracted_partner_companies.csv")
 if __name__ == "__main__":
     markdown_file_path = "docs/Manuav Kundenzusammenfassung für Klaus.md"
     try:
-        with open(markdown_file_path, "r", encoding="utf-8") as f:
-            markdown_text_content = f.read()
+        with open(markdown_file_path, "r", encoding="utf-8") as f, run_metrics.stage("parse"):
+            parsed_companies_data = parse_markdown(f)
     except FileNotFoundError:
         print(f"Error: The markdown file '{markdown_file_path}' was not found.")
         exit()
     except Exception as e:
         print(f"An error occurred while reading '{markdown_file_path}': {e}")
         exit()
-    
-    if not markdown_text_content.strip():
-        print(f"Error: The markdown file '{markdown_file_path}' is empty or contains only whitespace.")
-        exit()
 
-    parsed_companies_data = parse_markdown(markdown_text_content)
-    
     if parsed_companies_data:
-        write_to_csv(parsed_companies_data, filename="script_output/extracted_partner_companies.csv")
+        with run_metrics.stage("write_csv"):
+            write_to_csv(parsed_companies_data, filename="script_output/extracted_partner_companies.csv")
     else:
-        print("No company data was parsed from the markdown file.")
\ No newline at end of file
+        print("No company data was parsed from the markdown file.")
+    run_metrics.incr("companies_parsed", len(parsed_companies_data))
+    print(f"Wrote the run report to {run_metrics.write_report()}")
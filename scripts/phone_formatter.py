@@ -3,9 +3,32 @@ This script provides a function to format phone numbers to a standard internatio
 and a function to process an Excel file, applying the phone number formatting to a
 specified column. It handles various input formats and outputs a new Excel file with
 the formatted phone numbers.
+format_phone_numbers() is the vectorized batch version of format_phone_number() for
+whole columns. Run as a script, it formats any number of phone columns in any number
+of .xlsx/.csv files in parallel processes, streaming rows in and out (openpyxl
+read-only and write-only mode, or CSV) so a sheet is never held in memory as a whole.
+
+Usage:
+    python scripts/phone_formatter.py data/A-Liste_*.xlsx --columns Number "Mobile Number" --output-dir data/formatted
 """
-import pandas as pd
+import argparse
+import csv
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import openpyxl
+import pandas as pd
+
+DEFAULT_INPUT_FILE = 'data/A-Liste_001_AS120_ddc_20250530.xlsx'
+DEFAULT_PHONE_COLUMN = 'Number'
+BATCH_ROWS = 10000 # Rows formatted per format_phone_numbers call when streaming a file
+
+SEPARATOR_PATTERN = re.compile(r'[\s\-\/\(\)]+')
+COUNTRY_CODE_PATTERN = re.compile(r'^(49|43)\d+$')
+# ASCII equivalents used by format_phone_numbers (\s and \d spelled out so every regex engine agrees)
+VECTORIZED_SEPARATOR_PATTERN = r'[ \t\n\x0b\x0c\r\x1c-\x1f\-\/\(\)]+'
+VECTORIZED_COUNTRY_CODE_PATTERN = r'^(49|43)[0-9]+$'
 
 def format_phone_number(phone_str):
     """
@@ -21,7 +44,7 @@ def format_phone_number(phone_str):
     
     # Remove all common separators: spaces, hyphens, slashes, parentheses
     # This makes subsequent checks easier.
-    s_cleaned = re.sub(r'[\s\-\/\(\)]+', '', s)
+    s_cleaned = SEPARATOR_PATTERN.sub('', s)
     
     if s_cleaned.startswith('00'):
         # Example: "004912345" -> "+4912345"
@@ -31,7 +54,7 @@ def format_phone_number(phone_str):
         # Already has a '+', assume it's mostly correct or already formatted.
         # Example: "+4912345" -> "+4912345"
         return s_cleaned
-    elif re.match(r'^(49|43)\d+$', s_cleaned): # Known country codes from examples (49, 43)
+    elif COUNTRY_CODE_PATTERN.match(s_cleaned): # Known country codes from examples (49, 43)
         # Example: "4912345" -> "+4912345" (if it started without '00' or '+')
         return '+' + s_cleaned
     elif s_cleaned.startswith('0') and not s_cleaned.startswith('00'):
@@ -49,6 +72,39 @@ def format_phone_number(phone_str):
         # print(f"Warning: Number '{str(phone_str)}' (cleaned: '{s_cleaned}') did not match expected patterns. Returning original.")
         return str(phone_str) # Fallback to the original input string
 
+def format_phone_numbers(phones):
+    """
+    Vectorized format_phone_number for a whole Series. Returns the same value as
+    format_phone_number for every entry (None for missing ones), with the Series' index.
+    ASCII entries go through pandas string operations; the rare non-ASCII entries use
+    format_phone_number itself, so Unicode whitespace and digits are handled identically.
+    """
+    phones = pd.Series(phones, dtype=object) if not isinstance(phones, pd.Series) else phones
+    missing = phones.isna().to_numpy()
+    original = phones.astype('str')
+    is_ascii = original.str.isascii().fillna(False).to_numpy(dtype=bool)
+    cleaned = original.str.replace(VECTORIZED_SEPARATOR_PATTERN, '', regex=True)
+
+    starts_00 = cleaned.str.startswith('00').fillna(False).to_numpy(dtype=bool)
+    starts_plus = cleaned.str.startswith('+').fillna(False).to_numpy(dtype=bool)
+    country_code = cleaned.str.match(VECTORIZED_COUNTRY_CODE_PATTERN).fillna(False).to_numpy(dtype=bool)
+    starts_0 = cleaned.str.startswith('0').fillna(False).to_numpy(dtype=bool)
+
+    # Exclusive masks in the priority order of format_phone_number; each rule only touches its own rows
+    use_00 = starts_00
+    use_plus = starts_plus & ~use_00
+    use_country_code = country_code & ~use_00 & ~use_plus
+    use_0 = starts_0 & ~use_00 & ~use_plus & ~use_country_code
+    formatted = original.to_numpy(dtype=object)
+    formatted[use_00] = ('+' + cleaned[use_00].str[2:]).to_numpy(dtype=object)
+    formatted[use_plus] = cleaned[use_plus].to_numpy(dtype=object)
+    formatted[use_country_code] = ('+' + cleaned[use_country_code]).to_numpy(dtype=object)
+    formatted[use_0] = ('+49' + cleaned[use_0].str[1:]).to_numpy(dtype=object)
+    formatted[missing] = None
+    non_ascii = np.flatnonzero(~is_ascii & ~missing)
+    formatted[non_ascii] = [format_phone_number(value) for value in phones.iloc[non_ascii]]
+    return pd.Series(formatted, index=phones.index, name=phones.name, dtype=object)
+
 def process_excel(input_file_path, output_file_path, phone_column_name):
     """
     Reads an Excel file, formats phone numbers in a specified column,
@@ -84,7 +140,7 @@ def process_excel(input_file_path, output_file_path, phone_column_name):
     # df['formatted_phone'] = df[phone_column_name].apply(format_phone_number)
     
     # To overwrite the existing column:
-    df[phone_column_name] = df[phone_column_name].apply(format_phone_number)
+    df[phone_column_name] = format_phone_numbers(df[phone_column_name])
     
     try:
         df.to_excel(output_file_path, index=False)
@@ -92,18 +148,129 @@ def process_excel(input_file_path, output_file_path, phone_column_name):
     except Exception as e:
         print(f"Error writing Excel file {output_file_path}: {e}")
 
-if __name__ == "__main__":
-    # --- Configuration ---
-    # !!! IMPORTANT: Update these values !!!
-    INPUT_FILE = 'data/A-Liste_001_AS120_ddc_20250530.xlsx'
-    OUTPUT_FILE = 'data/A-Liste_001_AS120_ddc_20250530_formatted.xlsx'
-    PHONE_COLUMN = 'Number'  # Updated based on user input
-    # --- End Configuration ---
-
-    print(f"Starting phone number formatting for {INPUT_FILE}...")
-    print(f"Phone numbers will be read from column: '{PHONE_COLUMN}'")
-    print(f"Formatted output will be saved to: {OUTPUT_FILE}")
-    print("Please ensure the PHONE_COLUMN name is correct in the script.")
-    
-    process_excel(INPUT_FILE, OUTPUT_FILE, PHONE_COLUMN)
+def _iter_input_rows(input_file_path, sheet_name=None):
+    """Yields the rows of an .xlsx/.xlsm (read-only, streamed) or .csv file as lists of cell values."""
+    if str(input_file_path).lower().endswith('.csv'):
+        with open(input_file_path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.reader(f):
+                yield [value if value != '' else None for value in row]
+        return
+    workbook = openpyxl.load_workbook(input_file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        for row in sheet.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+class _RowWriter:
+    """Streams rows to an .xlsx file (openpyxl write-only mode) or a .csv file."""
+
+    def __init__(self, output_file_path):
+        self.output_file_path = str(output_file_path)
+        self.is_csv = self.output_file_path.lower().endswith('.csv')
+        if self.is_csv:
+            self._file = open(self.output_file_path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+        else:
+            self._workbook = openpyxl.Workbook(write_only=True)
+            self._sheet = self._workbook.create_sheet()
 
+    def append(self, row):
+        if self.is_csv:
+            self._writer.writerow(['' if value is None else value for value in row])
+        else:
+            self._sheet.append(row)
+
+    def close(self):
+        if self.is_csv:
+            self._file.close()
+        else:
+            self._workbook.save(self.output_file_path)
+
+def process_file(input_file_path, output_file_path, phone_column_names, sheet_name=None, batch_rows=BATCH_ROWS):
+    """
+    Streams one workbook/CSV, formats every listed phone column batch by batch and writes the
+    rows to output_file_path (.xlsx in write-only mode or .csv) without loading the whole sheet.
+    Returns a short status message.
+    """
+    rows = _iter_input_rows(input_file_path, sheet_name)
+    header = next(rows, None)
+    if header is None:
+        return f"Error: {input_file_path} is empty."
+    missing_columns = [c for c in phone_column_names if c not in header]
+    column_indices = [header.index(c) for c in phone_column_names if c in header]
+    if not column_indices:
+        return (f"Error: None of the columns {phone_column_names} found in '{input_file_path}'. "
+                f"Available columns are: {header}")
+
+    writer = _RowWriter(output_file_path)
+    row_count = 0
+    try:
+        writer.append(header)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                row_count += _write_batch(writer, batch, column_indices)
+                batch = []
+        row_count += _write_batch(writer, batch, column_indices)
+    finally:
+        writer.close()
+
+    message = f"{input_file_path}: formatted {len(column_indices)} column(s) in {row_count} rows -> {output_file_path}"
+    if missing_columns:
+        message += f" (columns not found: {missing_columns})"
+    return message
+
+def _write_batch(writer, batch, column_indices):
+    """Formats the phone columns of a batch of rows in place and writes the rows."""
+    for index in column_indices:
+        values = pd.Series([row[index] if index < len(row) else None for row in batch], dtype=object)
+        for row, formatted in zip(batch, format_phone_numbers(values)):
+            if index < len(row):
+                row[index] = formatted
+    for row in batch:
+        writer.append(row)
+    return len(batch)
+
+def _output_path(input_file_path, output_dir, output_format, suffix):
+    base_name = os.path.splitext(os.path.basename(input_file_path))[0]
+    directory = output_dir or os.path.dirname(input_file_path)
+    return os.path.join(directory, f"{base_name}{suffix}.{output_format}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Format phone number columns in one or more Excel/CSV files.")
+    parser.add_argument('inputs', nargs='*', default=[DEFAULT_INPUT_FILE], help=f"Input .xlsx/.csv files (default: {DEFAULT_INPUT_FILE}).")
+    parser.add_argument('--columns', nargs='+', default=[DEFAULT_PHONE_COLUMN], help="Phone columns to format in every file.")
+    parser.add_argument('--output-dir', help="Directory for the output files (default: next to each input).")
+    parser.add_argument('--format', choices=['xlsx', 'csv'], default='xlsx', help="Output file format.")
+    parser.add_argument('--suffix', default='_formatted', help="Appended to the input file name for the output file.")
+    parser.add_argument('--sheet', help="Worksheet to read from Excel inputs (default: the first sheet).")
+    parser.add_argument('--workers', type=int, help="Parallel worker processes (default: one per file, up to the CPU count).")
+    args = parser.parse_args()
+
+    inputs = [path for path in args.inputs if os.path.exists(path)]
+    for path in set(args.inputs) - set(inputs):
+        print(f"Error: Input file not found at {path}")
+    if not inputs:
+        return
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    print(f"Formatting columns {args.columns} in {len(inputs)} file(s)...")
+    workers = args.workers or min(len(inputs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(process_file, path, _output_path(path, args.output_dir, args.format, args.suffix),
+                            args.columns, args.sheet): path
+            for path in inputs
+        }
+        for future in as_completed(futures):
+            try:
+                print(future.result())
+            except Exception as e:
+                print(f"Error processing {futures[future]}: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+This script runs the project's scripts as one pipeline of stages with declared inputs,
+outputs and dependencies, instead of running them by hand in a fixed order.
+Before a stage runs, its fingerprint is computed from the contents of its input files,
+its script and its arguments. A stage whose fingerprint matches the one recorded after
+its last successful run (in data/pipeline_state.json) and whose outputs still exist is
+skipped. Stages whose dependencies are done run concurrently, each as its own Python
+process with its output in data/pipeline_logs/<stage>.log. At the end, the wall time and
+output row count of every stage are printed and written to a JSON run report in
+data/run_reports/ (next to the reports of the stage scripts themselves).
+
+Usage:
+    python scripts/pipeline.py                      # run (or skip) every stage
+    python scripts/pipeline.py build_workbook       # one stage plus the stages it depends on
+    python scripts/pipeline.py --force --jobs 2
+    python scripts/pipeline.py --list
+"""
+import argparse
+import csv
+import dataclasses
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+from dotenv import load_dotenv
+import run_metrics
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCRIPTS_DIR = os.path.join(PROJECT_ROOT, 'scripts')
+DEFAULT_STATE_PATH = os.path.join('data', 'pipeline_state.json')
+LOG_DIR = os.path.join('data', 'pipeline_logs')
+HASH_BLOCK_SIZE = 1 << 20
+
+SOURCE_DOC = "docs/Manuav Kundenzusammenfassung für Klaus.md"
+KUNDE_OUTPUT_DIR = "data/Kunde_Structured_Output"
+APOLLO_EXPORT = "data/raw/Company DACH 15-100 MA Apollo 80k.csv"
+
+
+def count_csv_rows(pattern: str) -> Callable[[], int | None]:
+    """Row counter for the newest CSV matching `pattern` (quoted multi-line fields count once)."""
+    def count():
+        paths = sorted(glob.glob(os.path.join(PROJECT_ROOT, pattern)), key=os.path.getmtime)
+        if not paths:
+            return None
+        with open(paths[-1], 'r', encoding='utf-8', newline='') as f:
+            return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+    return count
+
+
+def count_dataset_rows(name: str) -> Callable[[], int | None]:
+    """Row counter for a dataset of the columnar store, read from the Parquet metadata only."""
+    def count():
+        import pyarrow.parquet as pq
+        from columnar_store import DEFAULT_STORE_DIR, dataset_path
+        path = dataset_path(name, os.path.join(PROJECT_ROOT, DEFAULT_STORE_DIR))
+        if not os.path.isdir(path):
+            return None
+        return sum(fragment.count_rows() for fragment in pq.ParquetDataset(path).fragments)
+    return count
+
+
+def count_kunde_folders() -> int | None:
+    """Number of "Kunde N" folders in the newest RUNx run folder of process_kunden_data.py."""
+    runs = sorted(glob.glob(os.path.join(PROJECT_ROOT, KUNDE_OUTPUT_DIR, 'RUNx*')), key=os.path.getmtime)
+    if not runs:
+        return None
+    return sum(1 for entry in os.scandir(runs[-1]) if entry.is_dir() and entry.name.startswith('Kunde'))
+
+
+@dataclasses.dataclass
+class Stage:
+    name: str
+    script: str # File name in scripts/
+    inputs: list[str] # Glob patterns relative to the project root
+    outputs: list[str] # Glob patterns relative to the project root; at least one match each means "present"
+    after: list[str] = dataclasses.field(default_factory=list) # Stages that have to finish first
+    args: list[str] = dataclasses.field(default_factory=list)
+    env: list[str] = dataclasses.field(default_factory=list) # Environment variables that change the result
+    count_rows: Callable[[], int | None] | None = None
+
+
+STAGES = [
+    Stage("extract_profiles", "process_kunden_data.py",
+          inputs=[SOURCE_DOC, "prompts/data_extraction_v2.md"],
+          outputs=[f"{KUNDE_OUTPUT_DIR}/RUNx*"],
+          count_rows=count_kunde_folders),
+    Stage("rename_files", "rename_kunden_files.py",
+          inputs=[f"{KUNDE_OUTPUT_DIR}/*.md"],
+          outputs=[KUNDE_OUTPUT_DIR],
+          after=["extract_profiles"]),
+    Stage("build_workbook", "extract_kunden_to_excel.py",
+          inputs=["{KUNDEN_INPUT_DIR}/*/*.md", "{KUNDEN_INPUT_DIR}/*/extracted_data_*.json"],
+          outputs=["kgs*.xlsx", "data/store/partners"],
+          after=["rename_files"],
+          env=["KUNDEN_INPUT_DIR", "KUNDEN_PROFILE"],
+          count_rows=count_dataset_rows("partners")),
+    Stage("describe_companies", "generate_company_descriptions.py",
+          inputs=["kunden_golden_standard.xlsx", "prompts/company_description_prompt.txt",
+                  f"{KUNDE_OUTPUT_DIR}/Kunde */prompt_Kunde_*.txt", SOURCE_DOC],
+          outputs=["company_descriptions.csv"],
+          after=["extract_profiles"],
+          args=["--resume"],
+          env=["KUNDE_RANGE"],
+          count_rows=count_csv_rows("company_descriptions.csv")),
+    Stage("partner_summaries", "parse_kunden_summary.py",
+          inputs=[SOURCE_DOC, "scripts/industry_rules.json", "scripts/industry_rules.py", "scripts/kunde_sections.py"],
+          outputs=["script_output/extracted_partner_companies.csv"],
+          count_rows=count_csv_rows("script_output/extracted_partner_companies.csv")),
+    Stage("apollo_descriptions", "apollo_cleaning.py",
+          inputs=[APOLLO_EXPORT, "scripts/apollo_loader.py"],
+          outputs=["data/processed/apollo_combined_descriptions.csv"],
+          count_rows=count_csv_rows("data/processed/apollo_combined_descriptions.csv")),
+    Stage("apollo_languages", "language_detection.py",
+          inputs=["data/processed/apollo_combined_descriptions.csv"],
+          outputs=["data/processed/apollo_languages.csv"],
+          after=["apollo_descriptions"],
+          args=["--output", "data/processed/apollo_languages.csv"],
+          count_rows=count_csv_rows("data/processed/apollo_languages.csv")),
+    Stage("apollo_dedup", "apollo_dedup.py",
+          inputs=[APOLLO_EXPORT, "scripts/apollo_loader.py"],
+          outputs=["data/processed/apollo_deduplicated.csv", "script_output/dedup_report.csv"],
+          count_rows=count_csv_rows("data/processed/apollo_deduplicated.csv")),
+]
+
+
+def _expand(pattern: str) -> str:
+    return pattern.format(KUNDEN_INPUT_DIR=os.getenv("KUNDEN_INPUT_DIR") or KUNDE_OUTPUT_DIR)
+
+
+def _matches(pattern: str) -> list[str]:
+    return sorted(glob.glob(os.path.join(PROJECT_ROOT, _expand(pattern)), recursive=True))
+
+
+class FileHasher:
+    """SHA-256 of file contents, reusing the previous hash while a file's mtime and size are unchanged."""
+
+    def __init__(self, known: dict):
+        self.known = known # path -> [mtime_ns, size, sha256]
+
+    def file_hash(self, path: str) -> str:
+        stat = os.stat(path)
+        entry = self.known.get(path)
+        if entry and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        self.known[path] = [stat.st_mtime_ns, stat.st_size, digest.hexdigest()]
+        return digest.hexdigest()
+
+
+def stage_fingerprint(stage: Stage, hasher: FileHasher) -> str:
+    """Hash over the stage's script, arguments, relevant environment variables and input files."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([stage.script, stage.args, {name: os.getenv(name) for name in stage.env}]).encode('utf-8'))
+    paths = [os.path.join(SCRIPTS_DIR, stage.script)]
+    for pattern in stage.inputs:
+        paths.extend(_matches(pattern))
+    for path in paths:
+        if os.path.isfile(path):
+            digest.update(os.path.relpath(path, PROJECT_ROOT).encode('utf-8'))
+            digest.update(hasher.file_hash(path).encode('ascii'))
+    return digest.hexdigest()
+
+
+def outputs_present(stage: Stage) -> bool:
+    return all(_matches(pattern) for pattern in stage.outputs)
+
+
+def load_state(state_path: str) -> dict:
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state_path: str, state: dict) -> None:
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def select_stages(names) -> list[Stage]:
+    """The requested stages plus everything they depend on, in declaration order."""
+    by_name = {stage.name: stage for stage in STAGES}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)}")
+    selected = set()
+    pending = list(names) or list(by_name)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(by_name[name].after)
+    return [stage for stage in STAGES if stage.name in selected]
+
+
+def run_stage(stage: Stage) -> tuple[int, float]:
+    """Runs the stage's script from the project root; returns (exit code, wall seconds)."""
+    os.makedirs(os.path.join(PROJECT_ROOT, LOG_DIR), exist_ok=True)
+    # Some scripts expect their output directory to exist already
+    for pattern in stage.outputs:
+        os.makedirs(os.path.dirname(os.path.join(PROJECT_ROOT, _expand(pattern))), exist_ok=True)
+    log_path = os.path.join(PROJECT_ROOT, LOG_DIR, f"{stage.name}.log")
+    started = time.perf_counter()
+    with open(log_path, 'w', encoding='utf-8') as log:
+        completed = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, stage.script), *stage.args],
+                                   cwd=PROJECT_ROOT, stdout=log, stderr=subprocess.STDOUT)
+    return completed.returncode, time.perf_counter() - started
+
+
+def run_pipeline(stages: list[Stage], state_path: str, jobs: int, force: bool = False, dry_run: bool = False) -> dict:
+    """
+    Runs `stages` respecting their dependencies, at most `jobs` at a time.
+    Returns {stage name: {"status", "seconds", "rows"}}; status is ran, skipped, failed or blocked.
+    """
+    state = load_state(state_path)
+    hasher = FileHasher(state.setdefault("file_hashes", {}))
+    stage_state = state.setdefault("stages", {})
+    names = {stage.name for stage in stages}
+    waiting = {stage.name: stage for stage in stages}
+    report = {}
+    running = {}
+
+    def start_ready(executor):
+        """Starts every stage whose dependencies are done; skipping a stage can make others ready, hence the loop."""
+        progress = True
+        while progress:
+            progress = False
+            for name, stage in list(waiting.items()):
+                deps = [dep for dep in stage.after if dep in names]
+                if any(report.get(dep, {}).get("status") in ("failed", "blocked") for dep in deps):
+                    report[name] = {"status": "blocked", "seconds": 0.0, "rows": None}
+                elif not all(dep in report for dep in deps):
+                    continue
+                else:
+                    fingerprint = stage_fingerprint(stage, hasher)
+                    previous = stage_state.get(name, {})
+                    if not force and previous.get("fingerprint") == fingerprint and outputs_present(stage):
+                        report[name] = {"status": "skipped", "seconds": 0.0, "rows": previous.get("rows")}
+                        print(f"[{name}] unchanged inputs, skipped")
+                    elif dry_run:
+                        report[name] = {"status": "would run", "seconds": 0.0, "rows": None}
+                    else:
+                        print(f"[{name}] running {stage.script}")
+                        running[executor.submit(run_stage, stage)] = stage
+                del waiting[name]
+                progress = True
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        start_ready(executor)
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode == 0 and not outputs_present(stage):
+                    # Most scripts print an error and exit normally when an input is missing
+                    report[stage.name] = {"status": "failed", "seconds": seconds, "rows": None}
+                    print(f"[{stage.name}] produced no output; see {os.path.join(LOG_DIR, stage.name + '.log')}")
+                elif returncode == 0:
+                    rows = stage.count_rows() if stage.count_rows else None
+                    # Recorded after the run: stages such as rename_files change their own inputs
+                    stage_state[stage.name] = {"fingerprint": stage_fingerprint(stage, hasher),
+                                               "seconds": round(seconds, 2), "rows": rows, "finished": time.time()}
+                    report[stage.name] = {"status": "ran", "seconds": seconds, "rows": rows}
+                    print(f"[{stage.name}] finished in {seconds:.1f}s")
+                else:
+                    report[stage.name] = {"status": "failed", "seconds": seconds, "rows": None}
+                    print(f"[{stage.name}] failed with exit code {returncode}; see {os.path.join(LOG_DIR, stage.name + '.log')}")
+                save_state(state_path, state)
+            start_ready(executor)
+
+    if not dry_run:
+        save_state(state_path, state)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline stages whose inputs changed.")
+    parser.add_argument('stages', nargs='*', help="Stages to run (with their dependencies); default: all.")
+    parser.add_argument('--jobs', type=int, default=4, help="Stages run concurrently at most.")
+    parser.add_argument('--force', action='store_true', help="Run the selected stages even if their inputs are unchanged.")
+    parser.add_argument('--dry-run', action='store_true', help="Only report which stages would run.")
+    parser.add_argument('--list', action='store_true', help="List the stages and exit.")
+    parser.add_argument('--state', default=os.path.join(PROJECT_ROOT, DEFAULT_STATE_PATH))
+    args = parser.parse_args()
+    # The scripts read their settings (e.g. KUNDEN_INPUT_DIR) from .env; input patterns and fingerprints use the same values
+    load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
+
+    if args.list:
+        for stage in STAGES:
+            after = f" (after {', '.join(stage.after)})" if stage.after else ""
+            print(f"{stage.name}: {stage.script}{after}")
+        return
+
+    try:
+        stages = select_stages(args.stages)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    started = time.perf_counter()
+    report = run_pipeline(stages, args.state, args.jobs, args.force, args.dry_run)
+    print(f"\n{'Stage':<22} {'Status':<10} {'Seconds':>8} {'Rows':>8}")
+    for stage in stages:
+        entry = report.get(stage.name, {"status": "not run", "seconds": 0.0, "rows": None})
+        rows = "" if entry["rows"] is None else entry["rows"]
+        print(f"{stage.name:<22} {entry['status']:<10} {entry['seconds']:>8.1f} {rows:>8}")
+    print(f"Total wall time: {time.perf_counter() - started:.1f}s")
+    for name, entry in report.items():
+        run_metrics.incr(f"stages.{entry['status'].replace(' ', '_')}")
+        if entry["status"] == "ran":
+            run_metrics.record_stage(name, entry["seconds"])
+    if not args.dry_run:
+        print(f"Wrote the run report to {run_metrics.write_report({'pipeline': report})}")
+    if any(entry["status"] in ("failed", "blocked") for entry in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
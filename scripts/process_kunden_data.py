@@ -1,14 +1,31 @@
 """
 This script processes company data by extracting information from a source document,
 calling the Gemini API to generate summaries, and saving the results to structured output files.
+Each run writes a JSON metrics report (stage timings, API calls, tokens, cache hits and
+Gemini latency) to data/run_reports/, with a per-request token and cost ledger next to it.
+Company texts whose prompt would exceed PROMPT_TOKEN_BUDGET tokens are trimmed before sending.
+With KUNDEN_PACK_SIZE > 1, up to that many companies share one request (the instructions are
+sent once, followed by one delimited section per company) and the JSON array returned is split
+back into the per-Kunde output files; Kunden missing from a malformed answer are sent again
+on their own.
+Requests use Gemini's JSON response mode with the schema of the v2 attributes
+(response_schemas.V2_PROFILE_SCHEMA), and every response is validated into a V2Profile before
+it is cached and written; responses that fail validation are kept as raw files only.
 """
 import os
 import json
-import re
 import logging
 import pathlib
-import google.generativeai as genai
+import asyncio
 from google.generativeai.types import GenerationConfig
+from gemini_client import (configure_client, get_model, extract_response_text, TokenBucket,
+                           AdaptiveConcurrency, retry_call_async, timed_request_async, error_counts)
+import run_metrics
+from token_budget import PromptBudget, TokenLedger, configured_budget, estimate_tokens, usage_counts
+from llm_cache import ResponseCache, make_cache_key
+from kunde_sections import iter_kunde_sections, section_text
+from response_schemas import (V2Profile, SchemaError, JSON_MIME_TYPE, V2_PROFILE_SCHEMA, PACKED_V2_PROFILE_SCHEMA,
+                              parse_v2_profile, parse_packed_v2_profiles)
 
 # --- Configuration ---
 SOURCE_DOC_PATH = pathlib.Path("docs/Manuav Kundenzusammenfassung für Klaus.md")
@@ -21,6 +38,24 @@ GEMINI_API_KEY_ENV_VAR = "GEMINI_API_KEY" # Corrected to be the var name, not a
 GEMINI_MODEL_NAME = "gemini-2.5-pro-preview-05-06" # Updated model name
 START_KUNDE_NUM = 1 # Reset to process full range
 END_KUNDE_NUM = 70
+MAX_CONCURRENT_REQUESTS = 8 # Upper bound on in-flight Gemini requests (lowered automatically on clustered 429s)
+REQUESTS_PER_MINUTE = 60 # Token-bucket limit shared by all concurrent requests
+PROMPT_TOKEN_BUDGET = 8000 # Longer prompts get their company text trimmed (GEMINI_PROMPT_TOKEN_BUDGET overrides)
+PACK_SIZE = 1 # Companies per request; more than 1 enables packing (KUNDEN_PACK_SIZE overrides)
+PACK_SIZE_ENV_VAR = "KUNDEN_PACK_SIZE"
+PACKED_RESPONSE_FILENAME_TEMPLATE = "llm_response_Kunden_{first}-{last}.txt"
+LLM_CACHE_PATH = pathlib.Path("data/llm_cache.sqlite") # Responses keyed by prompt hash, model and config
+GENERATION_CONFIG = GenerationConfig(
+    temperature=1.0,
+    response_mime_type=JSON_MIME_TYPE,
+    response_schema=V2_PROFILE_SCHEMA,
+    # Other parameters like top_p, top_k, max_output_tokens will use defaults
+)
+PACKED_GENERATION_CONFIG = GenerationConfig(
+    temperature=1.0,
+    response_mime_type=JSON_MIME_TYPE,
+    response_schema=PACKED_V2_PROFILE_SCHEMA,
+)
 
 import datetime
 from dotenv import load_dotenv
@@ -43,124 +78,345 @@ def load_prompt_template(file_path: pathlib.Path) -> str | None:
         logger.error(f"Error reading prompt template file {file_path}: {e}")
         return None
 
-def parse_company_data(file_path: pathlib.Path) -> dict[int, str]:
+def parse_company_data(file_path: pathlib.Path, kunde_range: range | None = None) -> dict[int, str]:
     """
     Parses the source document to extract text for each company.
-    Returns a dictionary mapping company number to its raw text.
+    Returns a dictionary mapping company number to its raw text. With `kunde_range`,
+    only the texts of those Kunden are kept.
     """
     company_texts = {}
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Regex to find "KUNDE X: ..." and capture X and the text until the next "KUNDE Y:" or end of file.
-        # This regex assumes "KUNDE X:" is at the beginning of a line.
-        # It captures the Kunde number and the text block associated with it.
-        # The (?s) flag makes . match newlines.
-        # The lookahead (?=(?:^KUNDE \d+:|\Z)) ensures we capture text until the next Kunde or EOF.
-        pattern = re.compile(r"^KUNDE\s*(\d+):.*?$(.*?)(?=(?:^KUNDE\s*\d+:|\Z))", re.MULTILINE | re.DOTALL)
-        
-        matches = pattern.findall(content)
-        
-        for match in matches:
-            try:
-                kunde_num_str, text_block = match
-                kunde_num = int(kunde_num_str)
-                # Clean up the text block: strip leading/trailing whitespace
-                # and potentially the "KUNDE X: CompanyName.com" line itself if it's part of text_block
-                # For now, let's assume the text_block is what comes *after* the KUNDE X: line.
-                # The regex above might need adjustment based on exact file structure.
-                # Let's refine the regex to better capture only the content *after* the KUNDE X line.
-                
-            except ValueError:
-                logger.warning(f"Could not parse Kunde number from match: {match[0]}")
-                continue
-
-        # Refined approach: Find all "KUNDE X:" lines, then extract text between them.
-        # This is often more robust for varying content lengths.
-        
-        # Find all "KUNDE X:" lines with their start positions, case-insensitively
-        kunde_starts = []
-        for match_obj in re.finditer(r"^KUNDE\s*(\d+):", content, re.MULTILINE | re.IGNORECASE):
-            kunde_num = int(match_obj.group(1))
-            start_index = match_obj.end() # Position right after "KUNDE X:"
-            kunde_starts.append({'num': kunde_num, 'start_index': start_index, 'match_start': match_obj.start()})
-
-        if not kunde_starts:
+            for section in iter_kunde_sections(f):
+                if kunde_range is None or section.kunde_num in kunde_range:
+                    company_texts[section.kunde_num] = section_text(section)
+
+        if not company_texts:
             logger.error(f"No 'KUNDE X:' sections found in {file_path}")
-            return {}
-
-        # Sort by match start position to ensure correct order
-        kunde_starts.sort(key=lambda x: x['match_start'])
-
-        for i, kunde_info in enumerate(kunde_starts):
-            kunde_num = kunde_info['num']
-            text_start_index = kunde_info['start_index']
-            
-            if i + 1 < len(kunde_starts):
-                # Text ends at the start of the next "KUNDE" section
-                text_end_index = kunde_starts[i+1]['match_start']
-            else:
-                # Last Kunde section, text goes to the end of the file
-                text_end_index = len(content)
-            
-            company_text = content[text_start_index:text_end_index].strip()
-            company_texts[kunde_num] = company_text
-            
     except FileNotFoundError:
         logger.error(f"Source document not found: {file_path}")
     except Exception as e:
         logger.error(f"Error parsing source document {file_path}: {e}")
     return company_texts
 
-def call_gemini_api(company_text: str, api_key: str, prompt_template: str) -> tuple[str | None, str | None]:
+def build_prompt(company_text: str, prompt_template: str) -> str:
+    """Substitutes the company text into the prompt template."""
+    # The placeholder was identified as "[PASTE GERMAN TEXT FOR ONE COMPANY HERE]"
+    # from prompts/data_extraction.md
+    return prompt_template.replace("[PASTE GERMAN TEXT FOR ONE COMPANY HERE]", company_text)
+
+# Replaces the template's single-object "Output Format" section in packed prompts
+OUTPUT_FORMAT_HEADING = "**Output Format:**"
+PACKED_OUTPUT_FORMAT = """**Output Format:**
+This request contains {count} companies. The German text of each company is enclosed between
+"=== KUNDE <number> START ===" and "=== KUNDE <number> END ===". Classify every company on its own,
+using only the text of its own section.
+Please provide your response as *only* a JSON array with one JSON object per company, in the order of
+the sections. Each object has the key "Kunde" with the company's number (an integer) followed by the
+attribute keys above. Do not include any surrounding text, explanations, or markdown formatting.
+
+**Example of desired JSON output for two companies:**
+[
+    {{"Kunde": 3, "Targets_Specific_Industry_Type": "Legal Sector", "Is_Startup": "False", "Is_AI_Software": "True", "Is_Innovative_Product": "True", "Is_Disruptive_Product": "False", "Is_VC_Funded": "Not Found", "Is_SaaS_Software": "True", "Is_Complex_Solution": "True", "Is_Investment_Product": "False"}},
+    {{"Kunde": 4, "Targets_Specific_Industry_Type": "Not Found", "Is_Startup": "Not Found", "Is_AI_Software": "False", "Is_Innovative_Product": "False", "Is_Disruptive_Product": "False", "Is_VC_Funded": "False", "Is_SaaS_Software": "False", "Is_Complex_Solution": "False", "Is_Investment_Product": "Not Found"}}
+]
+"""
+
+def supports_packing(prompt_template: str) -> bool:
+    """Packed prompts reuse everything before the template's "Output Format" section."""
+    return OUTPUT_FORMAT_HEADING in prompt_template
+
+def build_packed_prompt(company_texts: dict[int, str], prompt_template: str) -> str:
+    """Builds one prompt for several companies: the template's instructions, the packed output format and one section per company."""
+    instructions = prompt_template.split(OUTPUT_FORMAT_HEADING)[0].rstrip()
+    sections = "\n\n".join(f"=== KUNDE {kunde_num} START ===\n{text}\n=== KUNDE {kunde_num} END ==="
+                           for kunde_num, text in company_texts.items())
+    return f"{instructions}\n\n{PACKED_OUTPUT_FORMAT.format(count=len(company_texts))}\n{sections}\n"
+
+def pack_companies(company_texts: dict[int, str], prompt_template: str, pack_size: int,
+                   max_prompt_tokens: int) -> list[dict[int, str]]:
     """
-    Calls the Gemini API with the company text and prompt template.
-    Returns a tuple: (raw_llm_text_response, final_prompt_sent_to_llm).
-    Returns (None, final_prompt) if API error after prompt construction.
-    Returns (None, None) if error before prompt construction (e.g. API key).
+    Groups the company texts, in order, into packs of at most `pack_size` companies whose
+    packed prompt stays within `max_prompt_tokens` (estimated).
+    """
+    packs, current = [], {}
+    for kunde_num, text in company_texts.items():
+        candidate = {**current, kunde_num: text}
+        if current and (len(candidate) > pack_size or
+                        estimate_tokens(build_packed_prompt(candidate, prompt_template)) > max_prompt_tokens):
+            packs.append(current)
+            candidate = {kunde_num: text}
+        current = candidate
+    if current:
+        packs.append(current)
+    return packs
+
+async def call_gemini_api(final_prompt: str, model, concurrency: AdaptiveConcurrency,
+                          rate_limiter: TokenBucket, ledger: TokenLedger | None = None,
+                          ledger_key: str = "", estimated_prompt_tokens: int | None = None,
+                          generation_config: GenerationConfig = GENERATION_CONFIG) -> str | None:
+    """
+    Sends the final prompt to the Gemini API using the shared model instance.
+    Transient errors (429, 5xx, timeouts) are retried with backoff by the shared retry layer.
+    The token usage of the response is recorded in `ledger` under `ledger_key`.
+    Returns the raw LLM text response, or None if the request still fails.
     """
-    final_prompt = None # Initialize in case of early exit
-    if not api_key:
-        logger.error("Gemini API key not provided or found in environment.")
-        return None, None
-
     try:
-        # Replace placeholder in the prompt template
-        # The placeholder was identified as "[PASTE GERMAN TEXT FOR ONE COMPANY HERE]"
-        # from prompts/data_extraction.md
-        final_prompt = prompt_template.replace("[PASTE GERMAN TEXT FOR ONE COMPANY HERE]", company_text)
-        
-        genai.configure(api_key=api_key)  # type: ignore
-        model = genai.GenerativeModel(GEMINI_MODEL_NAME)  # type: ignore
-        
-        generation_config = GenerationConfig(
-            temperature=1.0
-            # Other parameters like top_p, top_k, max_output_tokens will use defaults
-        )
-        
-        response = model.generate_content(
-            final_prompt,
-            generation_config=generation_config,
+        response = await retry_call_async(
+            timed_request_async(lambda: model.generate_content_async(
+                final_prompt,
+                generation_config=generation_config,
+            )),
+            concurrency=concurrency,
+            rate_limiter=rate_limiter,
         )
-        
-        raw_llm_text_response = None
-        if response.parts:
-            raw_llm_text_response = "".join(part.text for part in response.parts if hasattr(part, 'text'))
-        elif hasattr(response, 'text') and response.text:
-             raw_llm_text_response = response.text
-        
-        if raw_llm_text_response is None:
-            logger.warning(f"Gemini API response for a company did not contain expected text parts. Response: {response}")
-            if response.prompt_feedback and response.prompt_feedback.block_reason:
-                logger.error(f"Prompt blocked. Reason: {response.prompt_feedback.block_reason_message or response.prompt_feedback.block_reason}")
-        
-        return raw_llm_text_response, final_prompt
+        if ledger is not None:
+            ledger.record(ledger_key, GEMINI_MODEL_NAME, *usage_counts(response), estimated_prompt_tokens)
+        return extract_response_text(response)
 
     except Exception as e:
         logger.error(f"Error calling Gemini API: {e}")
         logger.error(f"Error details: {str(e)}")
-        return None, final_prompt # Return final_prompt if it was constructed
+        return None
+
+def parse_kunde_response(kunde_num: int, raw_llm_response_text: str | None) -> V2Profile | None:
+    """Validates a single-company response against the v2 schema; returns None (and logs why) if it does not match."""
+    if not raw_llm_response_text:
+        return None
+    try:
+        return parse_v2_profile(raw_llm_response_text)
+    except SchemaError as e:
+        run_metrics.incr("responses.schema_errors")
+        logger.error(f"Response for Kunde {kunde_num} does not match the v2 schema: {e}")
+        return None
+
+def save_kunde_outputs(kunde_num: int, kunde_specific_output_dir: pathlib.Path,
+                       raw_llm_response_text: str | None, final_llm_prompt: str | None,
+                       profile: V2Profile | None) -> bool:
+    """
+    Writes the prompt, raw response, extracted attributes and processed MD for one Kunde.
+    Without a validated profile only the prompt and the raw response are written.
+    Returns True if the processed MD file was written.
+    """
+    # Save raw prompt
+    if final_llm_prompt:
+        prompt_file_name = RAW_PROMPT_FILENAME_TEMPLATE.format(kunde_num=kunde_num)
+        prompt_file_path = kunde_specific_output_dir / prompt_file_name
+        try:
+            with open(prompt_file_path, 'w', encoding='utf-8') as f:
+                f.write(final_llm_prompt)
+            logger.info(f"Saved raw prompt for Kunde {kunde_num} to {prompt_file_path}")
+        except Exception as e:
+            logger.error(f"Error writing raw prompt file {prompt_file_path} for Kunde {kunde_num}: {e}")
+
+    if not raw_llm_response_text:
+        logger.error(f"Failed to get API response text for Kunde {kunde_num}. Skipping file writes for LLM output.")
+        return False
+
+    # Save raw LLM response
+    llm_response_file_name = RAW_LLM_RESPONSE_FILENAME_TEMPLATE.format(kunde_num=kunde_num)
+    llm_response_file_path = kunde_specific_output_dir / llm_response_file_name
+    try:
+        with open(llm_response_file_path, 'w', encoding='utf-8') as f:
+            f.write(raw_llm_response_text)
+        logger.info(f"Saved raw LLM response for Kunde {kunde_num} to {llm_response_file_path}")
+    except Exception as e:
+        logger.error(f"Error writing raw LLM response file {llm_response_file_path} for Kunde {kunde_num}: {e}")
+
+    if profile is None:
+        logger.error(f"No valid attributes for Kunde {kunde_num}; kept the raw response only.")
+        return False
+    attributes = profile.to_dict()
+    logger.info(f"Parsed attributes for Kunde {kunde_num}: {attributes}")
+
+    # Save extracted attributes to JSON file
+    extracted_data_file_name = "extracted_data_Kunde_{kunde_num}.json".format(kunde_num=kunde_num)
+    extracted_data_file_path = kunde_specific_output_dir / extracted_data_file_name
+    try:
+        with open(extracted_data_file_path, 'w', encoding='utf-8') as f:
+            json.dump(attributes, f, indent=4, ensure_ascii=False)
+        logger.info(f"Saved extracted data for Kunde {kunde_num} to {extracted_data_file_path}")
+    except Exception as e:
+        logger.error(f"Error writing extracted data file {extracted_data_file_path} for Kunde {kunde_num}: {e}")
+
+    # Save processed MD (the validated attributes as JSON; the raw text stays in the raw response file)
+    processed_md_file_name = PROCESSED_MD_FILENAME_TEMPLATE.format(kunde_num=kunde_num)
+    processed_md_file_path = kunde_specific_output_dir / processed_md_file_name
+    try:
+        with open(processed_md_file_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(attributes, indent=4, ensure_ascii=False))
+        logger.info(f"Successfully wrote processed MD for Kunde {kunde_num} to {processed_md_file_path}")
+        return True
+    except Exception as e:
+        logger.error(f"Error writing processed MD file {processed_md_file_path} for Kunde {kunde_num}: {e}")
+        return False
+
+async def fit_prompt(kunde_num: int, company_text: str, prompt_template: str,
+                     budget: PromptBudget) -> tuple[str, str, int]:
+    """
+    Builds the Kunde's prompt, trimming the company text to the prompt budget.
+    Counting may call the API for prompts close to the budget, so it runs off the event loop.
+    Returns (fitted company text, prompt, prompt tokens).
+    """
+    fitted_text, prompt, prompt_tokens = await asyncio.to_thread(
+        budget.fit, company_text, lambda text: build_prompt(text, prompt_template))
+    if fitted_text != company_text:
+        logger.warning(f"Kunde {kunde_num}: trimmed the company text from {len(company_text)} to {len(fitted_text)} chars "
+                       f"to fit the prompt budget of {budget.max_prompt_tokens} tokens.")
+    return fitted_text, prompt, prompt_tokens
+
+async def process_kunde(kunde_num: int, fitted: tuple[str, str, int], model,
+                        run_folder_path: pathlib.Path, concurrency: AdaptiveConcurrency,
+                        rate_limiter: TokenBucket, response_cache: ResponseCache,
+                        ledger: TokenLedger) -> bool:
+    """
+    Runs the extraction for a single Kunde with its fitted prompt (from fit_prompt) and writes
+    its output files as soon as the response arrives.
+    Responses already in the cache for the same prompt, model and generation config are reused;
+    only responses that pass schema validation are cached.
+    Returns True if the Kunde was processed successfully.
+    """
+    # Create specific output directory for this Kunde
+    kunde_specific_output_dir = run_folder_path / f"Kunde {kunde_num}"
+    try:
+        kunde_specific_output_dir.mkdir(parents=True, exist_ok=True)
+    except Exception as e:
+        logger.error(f"Could not create directory {kunde_specific_output_dir} for Kunde {kunde_num}: {e}. Skipping.")
+        return False
+
+    _, final_llm_prompt, prompt_tokens = fitted
+    cache_key = make_cache_key(final_llm_prompt, GEMINI_MODEL_NAME, GENERATION_CONFIG)
+    raw_llm_response_text = response_cache.get(cache_key)
+    if raw_llm_response_text is not None:
+        logger.info(f"--- Kunde {kunde_num}: using cached response ---")
+        return save_kunde_outputs(kunde_num, kunde_specific_output_dir, raw_llm_response_text, final_llm_prompt,
+                                  parse_kunde_response(kunde_num, raw_llm_response_text))
+
+    logger.info(f"--- Processing Kunde {kunde_num} ---")
+    raw_llm_response_text = await call_gemini_api(final_llm_prompt, model, concurrency, rate_limiter,
+                                                  ledger, f"Kunde {kunde_num}", prompt_tokens)
+
+    profile = parse_kunde_response(kunde_num, raw_llm_response_text)
+    if profile is not None:
+        response_cache.put(cache_key, GEMINI_MODEL_NAME, raw_llm_response_text)
+    return save_kunde_outputs(kunde_num, kunde_specific_output_dir, raw_llm_response_text, final_llm_prompt, profile)
+
+async def process_pack(pack: dict[int, str], fits: dict[int, tuple[str, str, int]], prompt_template: str, model,
+                       run_folder_path: pathlib.Path, concurrency: AdaptiveConcurrency,
+                       rate_limiter: TokenBucket, response_cache: ResponseCache,
+                       ledger: TokenLedger) -> int:
+    """
+    Runs the extraction for several Kunden (their fitted company texts in `pack`, their
+    fit_prompt results in `fits`) in one request and writes each Kunde's output files
+    from its validated element of the response array. Each Kunde's prompt file holds its single-company
+    prompt, as in unpacked runs, and its element is cached under that prompt, so later runs
+    reuse it however the Kunden are packed. Kunden missing from the response or whose element
+    does not match the schema (or all of them, if the response is not a JSON array) are
+    processed again with single-company requests.
+    Returns the number of successfully processed Kunden.
+    """
+    kunde_nums = list(pack)
+    label = f"Kunden {kunde_nums[0]}-{kunde_nums[-1]}"
+    packed_prompt = build_packed_prompt(pack, prompt_template)
+    logger.info(f"--- Processing {label} in one request ---")
+    run_metrics.incr("packs.sent")
+    raw_llm_response_text = await call_gemini_api(packed_prompt, model, concurrency, rate_limiter,
+                                                  ledger, label, estimate_tokens(packed_prompt),
+                                                  PACKED_GENERATION_CONFIG)
+
+    records = {}
+    if raw_llm_response_text:
+        try:
+            records = parse_packed_v2_profiles(raw_llm_response_text, kunde_nums)
+        except SchemaError as e:
+            run_metrics.incr("responses.schema_errors")
+            logger.error(f"Packed response for {label} does not match the schema: {e}")
+    if records:
+        response_path = run_folder_path / PACKED_RESPONSE_FILENAME_TEMPLATE.format(first=kunde_nums[0], last=kunde_nums[-1])
+        try:
+            with open(response_path, 'w', encoding='utf-8') as f:
+                f.write(raw_llm_response_text)
+        except Exception as e:
+            logger.error(f"Error writing packed LLM response file {response_path}: {e}")
+
+    processed_count = 0
+    fallbacks = []
+    for kunde_num in kunde_nums:
+        if kunde_num not in records:
+            logger.warning(f"Kunde {kunde_num} is missing from the packed response for {label}; sending it on its own.")
+            run_metrics.incr("packs.fallback_kunden")
+            fallbacks.append(process_kunde(kunde_num, fits[kunde_num], model, run_folder_path,
+                                           concurrency, rate_limiter, response_cache, ledger))
+            continue
+        kunde_specific_output_dir = run_folder_path / f"Kunde {kunde_num}"
+        try:
+            kunde_specific_output_dir.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            logger.error(f"Could not create directory {kunde_specific_output_dir} for Kunde {kunde_num}: {e}. Skipping.")
+            continue
+        final_llm_prompt = fits[kunde_num][1]
+        raw_kunde_text = json.dumps(records[kunde_num].to_dict(), indent=4, ensure_ascii=False)
+        response_cache.put(make_cache_key(final_llm_prompt, GEMINI_MODEL_NAME, GENERATION_CONFIG),
+                           GEMINI_MODEL_NAME, raw_kunde_text)
+        if save_kunde_outputs(kunde_num, kunde_specific_output_dir, raw_kunde_text, final_llm_prompt,
+                              records[kunde_num]):
+            processed_count += 1
+    for succeeded in await asyncio.gather(*fallbacks):
+        processed_count += int(succeeded)
+    return processed_count
+
+async def run_extraction(all_company_data: dict[int, str], prompt_template: str, model,
+                         run_folder_path: pathlib.Path, response_cache: ResponseCache,
+                         ledger: TokenLedger) -> int:
+    """
+    Processes Kunde START_KUNDE_NUM..END_KUNDE_NUM concurrently.
+    At most MAX_CONCURRENT_REQUESTS requests are in flight and REQUESTS_PER_MINUTE are issued per minute.
+    Every prompt is fitted to the budget once, off the event loop; with packing enabled,
+    Kunden without a cached single-company response are sent in packs.
+    Returns the number of successfully processed companies.
+    """
+    concurrency = AdaptiveConcurrency(MAX_CONCURRENT_REQUESTS)
+    rate_limiter = TokenBucket(REQUESTS_PER_MINUTE, burst=MAX_CONCURRENT_REQUESTS)
+    budget = PromptBudget(configured_budget(PROMPT_TOKEN_BUDGET), model)
+    pack_size = int(os.getenv(PACK_SIZE_ENV_VAR) or PACK_SIZE)
+    if pack_size > 1 and not supports_packing(prompt_template):
+        logger.warning(f"The prompt template has no '{OUTPUT_FORMAT_HEADING}' section; sending one company per request.")
+        pack_size = 1
+
+    company_texts = {}
+    for kunde_num in range(START_KUNDE_NUM, END_KUNDE_NUM + 1):
+        company_text = all_company_data.get(kunde_num)
+        if not company_text:
+            logger.warning(f"Data for Kunde {kunde_num} not found in the parsed source document. Skipping.")
+            continue
+        logger.info(f"Found data for Kunde {kunde_num}. Length: {len(company_text)} chars.")
+        run_metrics.observe("kunde_text_chars", len(company_text))
+        company_texts[kunde_num] = company_text
+    fits = dict(zip(company_texts, await asyncio.gather(
+        *(fit_prompt(kunde_num, text, prompt_template, budget) for kunde_num, text in company_texts.items()))))
+
+    tasks = []
+    packable = {}
+    for kunde_num, (fitted_text, prompt, _) in fits.items():
+        if pack_size > 1 and not response_cache.has(make_cache_key(prompt, GEMINI_MODEL_NAME, GENERATION_CONFIG)):
+            packable[kunde_num] = fitted_text
+            continue
+        tasks.append(process_kunde(kunde_num, fits[kunde_num], model, run_folder_path,
+                                   concurrency, rate_limiter, response_cache, ledger))
+
+    for pack in pack_companies(packable, prompt_template, pack_size, budget.max_prompt_tokens):
+        if len(pack) == 1:
+            kunde_num = next(iter(pack))
+            tasks.append(process_kunde(kunde_num, fits[kunde_num], model, run_folder_path,
+                                       concurrency, rate_limiter, response_cache, ledger))
+        else:
+            tasks.append(process_pack(pack, {kunde_num: fits[kunde_num] for kunde_num in pack}, prompt_template,
+                                      model, run_folder_path, concurrency, rate_limiter, response_cache, ledger))
+
+    processed_count = 0
+    for finished in asyncio.as_completed(tasks):
+        processed_count += int(await finished)
+    return processed_count
 
 def main():
     """Main function to orchestrate the data extraction and processing."""
@@ -176,7 +432,8 @@ def main():
         logger.error("Failed to load prompt template. Exiting.")
         return
 
-    all_company_data = parse_company_data(SOURCE_DOC_PATH)
+    with run_metrics.stage("parse_source"):
+        all_company_data = parse_company_data(SOURCE_DOC_PATH, range(START_KUNDE_NUM, END_KUNDE_NUM + 1))
     if not all_company_data:
         logger.error("Failed to parse company data from source document. Exiting.")
         return
@@ -211,101 +468,31 @@ def main():
         logger.error(f"Could not create run folder {run_folder_path}: {e}. Exiting.")
         return
 
-    processed_count = 0
-    for kunde_num in range(START_KUNDE_NUM, END_KUNDE_NUM + 1):
-        logger.info(f"--- Processing Kunde {kunde_num} ---")
-
-        # Create specific output directory for this Kunde
-        kunde_specific_output_dir = run_folder_path / f"Kunde {kunde_num}"
-        try:
-            kunde_specific_output_dir.mkdir(parents=True, exist_ok=True)
-        except Exception as e:
-            logger.error(f"Could not create directory {kunde_specific_output_dir} for Kunde {kunde_num}: {e}. Skipping.")
-            continue
-
-        company_text = all_company_data.get(kunde_num)
+    # One client configuration and one model instance shared by all requests
+    configure_client(api_key)
+    model = get_model(GEMINI_MODEL_NAME)
 
-        if not company_text:
-            logger.warning(f"Data for Kunde {kunde_num} not found in the parsed source document. Skipping.")
-            continue
-
-        logger.info(f"Found data for Kunde {kunde_num}. Length: {len(company_text)} chars.")
-
-        raw_llm_response_text, final_llm_prompt = call_gemini_api(company_text, api_key, prompt_template)
-
-        # Save raw prompt
-        if final_llm_prompt:
-            prompt_file_name = RAW_PROMPT_FILENAME_TEMPLATE.format(kunde_num=kunde_num)
-            prompt_file_path = kunde_specific_output_dir / prompt_file_name
-            try:
-                with open(prompt_file_path, 'w', encoding='utf-8') as f:
-                    f.write(final_llm_prompt)
-                logger.info(f"Saved raw prompt for Kunde {kunde_num} to {prompt_file_path}")
-            except Exception as e:
-                logger.error(f"Error writing raw prompt file {prompt_file_path} for Kunde {kunde_num}: {e}")
-
-        from io import StringIO
-        # Save raw LLM response and processed MD
-        if raw_llm_response_text:
-            # Parse LLM response
-            try:
-                # Check for BOM and remove if present
-                if raw_llm_response_text.startswith('\ufeff'):
-                    raw_llm_response_text = raw_llm_response_text[1:]
-
-                # Remove markdown code blocks
-                raw_llm_response_text = re.sub(r"```json\n(.*)\n```", r"\1", raw_llm_response_text, flags=re.DOTALL)
-                raw_llm_response_text = raw_llm_response_text.strip()
-
-                attributes = json.load(StringIO(raw_llm_response_text))
-                logger.info(f"Parsed attributes for Kunde {kunde_num}: {attributes}")
-            except json.JSONDecodeError as e:
-                logger.error(f"JSONDecodeError parsing LLM response for Kunde {kunde_num}: {e}")
-                logger.error(f"Raw LLM response text: {raw_llm_response_text}")
-                # Attempt to parse the JSON with more lenient settings
-                try:
-                    import ast
-                    attributes = ast.literal_eval(raw_llm_response_text)
-                    logger.info(f"Parsed attributes using ast.literal_eval for Kunde {kunde_num}: {attributes}")
-                except (ValueError, SyntaxError) as e2:
-                    logger.error(f"ast.literal_eval failed for Kunde {kunde_num}: {e2}")
-                    attributes = {}
-
-            # Save extracted attributes to JSON file
-            extracted_data_file_name = "extracted_data_Kunde_{kunde_num}.json".format(kunde_num=kunde_num)
-            extracted_data_file_path = kunde_specific_output_dir / extracted_data_file_name
-            try:
-                with open(extracted_data_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(attributes, f, indent=4, ensure_ascii=False)
-                logger.info(f"Saved extracted data for Kunde {kunde_num} to {extracted_data_file_path}")
-            except Exception as e:
-                logger.error(f"Error writing extracted data file {extracted_data_file_path} for Kunde {kunde_num}: {e}")
-
-            # Save raw LLM response
-            llm_response_file_name = RAW_LLM_RESPONSE_FILENAME_TEMPLATE.format(kunde_num=kunde_num)
-            llm_response_file_path = kunde_specific_output_dir / llm_response_file_name
-            try:
-                with open(llm_response_file_path, 'w', encoding='utf-8') as f:
-                    f.write(raw_llm_response_text)
-                logger.info(f"Saved raw LLM response for Kunde {kunde_num} to {llm_response_file_path}")
-            except Exception as e:
-                logger.error(f"Error writing raw LLM response file {llm_response_file_path} for Kunde {kunde_num}: {e}")
-
-            # Save processed MD (which is the same as raw_llm_response_text in this case)
-            processed_md_file_name = PROCESSED_MD_FILENAME_TEMPLATE.format(kunde_num=kunde_num)
-            processed_md_file_path = kunde_specific_output_dir / processed_md_file_name
-            try:
-                with open(processed_md_file_path, 'w', encoding='utf-8') as f:
-                    f.write(raw_llm_response_text)
-                logger.info(f"Successfully wrote processed MD for Kunde {kunde_num} to {processed_md_file_path}")
-                processed_count += 1
-            except Exception as e:
-                logger.error(f"Error writing processed MD file {processed_md_file_path} for Kunde {kunde_num}: {e}")
-        else:
-            logger.error(f"Failed to get API response text for Kunde {kunde_num}. Skipping file writes for LLM output.")
+    response_cache = ResponseCache(LLM_CACHE_PATH)
+    ledger = TokenLedger()
+    try:
+        with run_metrics.stage("extraction"):
+            processed_count = asyncio.run(run_extraction(all_company_data, prompt_template, model,
+                                                         run_folder_path, response_cache, ledger))
+    finally:
+        response_cache.close()
 
     logger.info(f"--- Script Finished ---")
     logger.info(f"Processed {processed_count} companies from Kunde {START_KUNDE_NUM} to {END_KUNDE_NUM}.")
+    if error_counts:
+        logger.info(f"Gemini API errors by class: {dict(error_counts)}")
+    run_metrics.incr("kunden_processed", processed_count)
+    token_totals = ledger.totals()
+    logger.info(f"Gemini usage: {token_totals['requests']} requests, {token_totals['prompt_tokens']} prompt tokens, "
+                f"{token_totals['response_tokens']} response tokens, ${token_totals['cost_usd']:.4f}.")
+    ledger_path = run_metrics.run_file_path("token_ledger.csv")
+    ledger.write_csv(ledger_path)
+    report_path = run_metrics.write_report({"gemini_errors": dict(error_counts), "token_usage": token_totals})
+    logger.info(f"Wrote the run report to {report_path} and the token ledger to {ledger_path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+This module declares the JSON schemas of the Gemini responses and validates responses into
+typed records. The schemas are sent with each request (JSON response mode), so the model
+returns plain JSON in the declared shape; parsing is a single json.loads plus a check of the
+keys and values, without stripping markdown fences.
+
+Schemas:
+- V2_PROFILE_SCHEMA: the attributes of prompts/data_extraction_v2.md for one company;
+- PACKED_V2_PROFILE_SCHEMA: an array of those, each with the company's "Kunde" number;
+- DESCRIPTION_SCHEMA: the {"summary": ...} object of prompts/company_description_prompt.txt.
+The schemas use the SDK's dict notation; to_rest_schema() converts one for raw REST requests
+(e.g. Batch mode).
+"""
+import dataclasses
+import json
+
+JSON_MIME_TYPE = "application/json"
+NOT_FOUND = "Not Found"
+TRI_STATE_VALUES = ["True", "False", NOT_FOUND] # Answers of the boolean attributes
+
+V2_TEXT_ATTRIBUTES = ["Targets_Specific_Industry_Type"]
+V2_BOOLEAN_ATTRIBUTES = [
+    "Is_Startup",
+    "Is_AI_Software",
+    "Is_Innovative_Product",
+    "Is_Disruptive_Product",
+    "Is_VC_Funded",
+    "Is_SaaS_Software",
+    "Is_Complex_Solution",
+    "Is_Investment_Product",
+]
+
+V2_PROFILE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **{name: {"type": "string"} for name in V2_TEXT_ATTRIBUTES},
+        **{name: {"type": "string", "format": "enum", "enum": TRI_STATE_VALUES} for name in V2_BOOLEAN_ATTRIBUTES},
+    },
+    "required": V2_TEXT_ATTRIBUTES + V2_BOOLEAN_ATTRIBUTES,
+}
+PACKED_V2_PROFILE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"Kunde": {"type": "integer"}, **V2_PROFILE_SCHEMA["properties"]},
+        "required": ["Kunde"] + V2_PROFILE_SCHEMA["required"],
+    },
+}
+DESCRIPTION_SCHEMA = {
+    "type": "object",
+    "properties": {"summary": {"type": "string"}},
+    "required": ["summary"],
+}
+
+
+class SchemaError(ValueError):
+    """A response that is not valid JSON or does not match its schema."""
+
+
+@dataclasses.dataclass(frozen=True)
+class V2Profile:
+    """The v2 attributes of one company, keyed like the JSON response (and the workbook columns)."""
+    Targets_Specific_Industry_Type: str
+    Is_Startup: str
+    Is_AI_Software: str
+    Is_Innovative_Product: str
+    Is_Disruptive_Product: str
+    Is_VC_Funded: str
+    Is_SaaS_Software: str
+    Is_Complex_Solution: str
+    Is_Investment_Product: str
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+@dataclasses.dataclass(frozen=True)
+class CompanyDescription:
+    summary: str
+
+
+def to_rest_schema(schema: dict) -> dict:
+    """Returns `schema` with the upper-case type names the REST API expects ("object" -> "OBJECT")."""
+    converted = {key: value for key, value in schema.items() if key not in ("type", "items", "properties")}
+    if "type" in schema:
+        converted["type"] = schema["type"].upper()
+    if "items" in schema:
+        converted["items"] = to_rest_schema(schema["items"])
+    if "properties" in schema:
+        converted["properties"] = {name: to_rest_schema(value) for name, value in schema["properties"].items()}
+    return converted
+
+
+def load_json(raw_text: str):
+    try:
+        return json.loads(raw_text.lstrip('\ufeff')) # json.loads rejects a leading BOM
+    except json.JSONDecodeError as e:
+        raise SchemaError(f"Response is not valid JSON: {e}") from e
+
+
+def _tri_state(name: str, value) -> str:
+    """Accepts the declared answers, JSON booleans and differently capitalized answers."""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, str):
+        for allowed in TRI_STATE_VALUES:
+            if value.strip().lower() == allowed.lower():
+                return allowed
+    raise SchemaError(f"{name} must be one of {TRI_STATE_VALUES}, got {value!r}")
+
+
+def validate_v2_profile(data) -> V2Profile:
+    """Checks one attribute object against V2_PROFILE_SCHEMA and returns it as a V2Profile."""
+    if not isinstance(data, dict):
+        raise SchemaError(f"Expected a JSON object, got {type(data).__name__}")
+    missing = [name for name in V2_PROFILE_SCHEMA["required"] if name not in data]
+    if missing:
+        raise SchemaError(f"Missing attributes: {', '.join(missing)}")
+    values = {}
+    for name in V2_TEXT_ATTRIBUTES:
+        if not isinstance(data[name], str):
+            raise SchemaError(f"{name} must be a string, got {data[name]!r}")
+        values[name] = data[name].strip()
+    for name in V2_BOOLEAN_ATTRIBUTES:
+        values[name] = _tri_state(name, data[name])
+    return V2Profile(**values)
+
+
+def parse_v2_profile(raw_text: str) -> V2Profile:
+    return validate_v2_profile(load_json(raw_text))
+
+
+def parse_packed_v2_profiles(raw_text: str, kunde_nums) -> dict[int, V2Profile]:
+    """
+    Validates a packed response (PACKED_V2_PROFILE_SCHEMA) and returns the profiles of the
+    requested Kunden by number. Invalid elements and unrequested Kunden are left out; raises
+    SchemaError if the response is not a JSON array.
+    """
+    items = load_json(raw_text)
+    if not isinstance(items, list):
+        raise SchemaError(f"Expected a JSON array, got {type(items).__name__}")
+    profiles = {}
+    for item in items:
+        if not isinstance(item, dict) or isinstance(item.get("Kunde"), bool) or not isinstance(item.get("Kunde"), int):
+            continue
+        kunde_num = item["Kunde"]
+        if kunde_num not in kunde_nums or kunde_num in profiles:
+            continue
+        try:
+            profiles[kunde_num] = validate_v2_profile(item)
+        except SchemaError:
+            continue
+    return profiles
+
+
+def parse_description(raw_text: str) -> CompanyDescription:
+    data = load_json(raw_text)
+    if not isinstance(data, dict) or not isinstance(data.get("summary"), str):
+        raise SchemaError("Expected a JSON object with a string 'summary'")
+    return CompanyDescription(summary=data["summary"])
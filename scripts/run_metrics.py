@@ -0,0 +1,197 @@
+"""
+This module collects performance metrics for one script run: timers, counters (API calls,
+tokens, cache hits, parser fallbacks, ...) and histograms of measured values (e.g. Gemini
+latency). Everything is recorded in a process-wide registry, like the error counts of
+gemini_client, and write_report() saves it as a JSON run report to data/run_reports/
+(or RUN_REPORT_DIR).
+Scripts wrap their main steps in stage(...), which records the step's wall time; with
+RUN_PROFILE=1, every stage also writes a cProfile dump next to the report.
+
+Usage:
+    with run_metrics.stage("parse") as timing:
+        ...
+    print(f"Parsed in {timing['seconds']:.2f}s")
+    with run_metrics.timer("gemini.latency_seconds"):
+        response = model.generate_content(prompt)
+    run_metrics.incr("llm_cache.hits")
+    run_metrics.write_report()
+"""
+import collections
+import contextlib
+import cProfile
+import datetime
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_REPORT_DIR = os.path.join(PROJECT_ROOT, "data", "run_reports")
+REPORT_DIR_ENV_VAR = "RUN_REPORT_DIR"
+PROFILE_ENV_VAR = "RUN_PROFILE"
+# Upper bounds of the buckets reported for time histograms (names ending in "_seconds");
+# a value lands in the first bucket it fits
+HISTOGRAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+counters = collections.Counter()
+samples = collections.defaultdict(list) # histogram name -> observed values
+stages = [] # {"name", "seconds"} per finished stage, in finishing order
+
+_run_started = datetime.datetime.now()
+_lock = threading.Lock()
+_profiling = False # cProfile cannot nest, so only the outermost profiled stage is profiled
+
+
+def incr(name: str, amount: int = 1) -> None:
+    """Adds `amount` to counter `name`."""
+    with _lock:
+        counters[name] += amount
+
+
+def count_all(values: dict) -> None:
+    """Adds a dict of counts (e.g. one collected in a worker process) to the counters."""
+    with _lock:
+        counters.update(values)
+
+
+def observe(name: str, value: float) -> None:
+    """Records one value of histogram `name`."""
+    with _lock:
+        samples[name].append(value)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    with _lock:
+        stages.append({"name": name, "seconds": round(seconds, 4)})
+
+
+@contextlib.contextmanager
+def timer(name: str):
+    """
+    Records the wall time of the block in histogram `name` (also when it raises).
+    Works as a decorator for plain functions too; use timed() for coroutine functions.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def timed(name: str | None = None):
+    """Decorator recording every call's wall time; the histogram defaults to the function's name."""
+    def decorator(func):
+        histogram = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(histogram):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(histogram):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def script_name() -> str:
+    return os.path.splitext(os.path.basename(sys.argv[0]))[0] or "interactive"
+
+
+def report_dir() -> str:
+    return os.getenv(REPORT_DIR_ENV_VAR) or DEFAULT_REPORT_DIR
+
+
+def _run_file_prefix() -> str:
+    return f"{script_name()}_{_run_started.strftime('%Y%m%d_%H%M%S')}"
+
+
+def run_file_path(suffix: str) -> str:
+    """Path of a file that belongs to this run's report, e.g. <report dir>/<script>_<start time>_<suffix>."""
+    os.makedirs(report_dir(), exist_ok=True)
+    return os.path.join(report_dir(), f"{_run_file_prefix()}_{suffix}")
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """
+    Times a script step as stage `name`; with RUN_PROFILE=1 the step is also profiled.
+    Yields a dict whose "seconds" entry is set when the step ends.
+    """
+    global _profiling
+    profiler = None
+    if os.getenv(PROFILE_ENV_VAR, "").lower() in ("1", "true", "yes") and not _profiling:
+        profiler = cProfile.Profile()
+        _profiling = True
+        profiler.enable()
+    timing = {"name": name}
+    started = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing["seconds"] = time.perf_counter() - started
+        record_stage(name, timing["seconds"])
+        if profiler is not None:
+            profiler.disable()
+            _profiling = False
+            profiler.dump_stats(run_file_path(f"{name}.prof"))
+
+
+def summarize(values: list[float], with_buckets: bool = False) -> dict:
+    """Count, total, mean, min/max and percentiles of a histogram, optionally with bucket counts."""
+    ordered = sorted(values)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    summary = {
+        "count": len(ordered),
+        "total": round(sum(ordered), 4),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "min": round(ordered[0], 4),
+        "p50": round(percentile(0.5), 4),
+        "p90": round(percentile(0.9), 4),
+        "p99": round(percentile(0.99), 4),
+        "max": round(ordered[-1], 4),
+    }
+    if with_buckets:
+        buckets = collections.Counter()
+        for value in ordered:
+            bound = next((bound for bound in HISTOGRAM_BUCKETS if value <= bound), None)
+            buckets[f"le_{bound}" if bound is not None else "inf"] += 1
+        summary["buckets"] = dict(buckets)
+    return summary
+
+
+def build_report(extra: dict | None = None) -> dict:
+    """Returns the metrics recorded so far as a JSON-serializable dict."""
+    finished = datetime.datetime.now()
+    with _lock:
+        report = {
+            "script": script_name(),
+            "started": _run_started.isoformat(timespec='seconds'),
+            "finished": finished.isoformat(timespec='seconds'),
+            "wall_seconds": round((finished - _run_started).total_seconds(), 3),
+            "stages": list(stages),
+            "counters": dict(sorted(counters.items())),
+            "histograms": {name: summarize(values, with_buckets=name.endswith("_seconds"))
+                           for name, values in sorted(samples.items()) if values},
+        }
+    if extra:
+        report.update(extra)
+    return report
+
+
+def write_report(extra: dict | None = None) -> str:
+    """Writes the run report to <report dir>/<script>_<start time>.json and returns its path."""
+    os.makedirs(report_dir(), exist_ok=True)
+    path = os.path.join(report_dir(), f"{_run_file_prefix()}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(build_report(extra), f, indent=2, ensure_ascii=False)
+    return path
@@ -0,0 +1,256 @@
+"""
+This script ranks prospect companies by their similarity to the partner companies.
+Partner profiles (the "partners" dataset of the columnar store, or a kgs*.xlsx, both
+written by extract_kunden_to_excel.py) and the prospects' Combined_Description texts
+(from the 80k cleaning step) are turned into hashed TF-IDF vectors, which works offline
+and needs no fitted vocabulary. Unigrams and bigrams are hashed into 2**20 features, so
+distinct terms rarely share a feature; the vectors are stored as memory-mapped sparse
+(CSR) matrices with float32 values (sparse_vectors.py), and the top-k nearest partners per
+prospect are found with blocked sparse-by-dense products. The IDF is saved next to the
+vectors (idf.npy), so texts of a new export can be vectorized compatibly with
+vectorize_with_idf() (e.g. to add them to the lookalike index of ann_index.py).
+"""
+import argparse
+import glob
+import os
+import re
+import zlib
+import numpy as np
+import pandas as pd
+from columnar_store import DEFAULT_STORE_DIR, dataset_columns, has_dataset, read_dataset
+from sparse_vectors import SparseVectors
+import run_metrics
+
+N_FEATURES = 2 ** 20
+CHUNK_SIZE = 10000 # Texts hashed per chunk
+BLOCK_SIZE = 2000 # Prospect rows scored per product; bounds the working set to about BLOCK_SIZE x 200 tokens x n_partners
+TOP_K = 5
+PARTNER_TEXT_COLUMNS = [
+    "Industry", "Products/Services Offered", "USP (Unique Selling Proposition) / Key Selling Points",
+    "Customer Target Segments", "Business Model", "Targets_Specific_Industry_Type"
+]
+PROSPECT_TEXT_COLUMN = "Combined_Description"
+PARTNERS_DATASET = "partners"
+PROSPECTS_DATASET = "prospects"
+IDF_FILE = "idf.npy"
+TOKEN_PATTERN = re.compile(r"\w\w+", re.UNICODE)
+
+class _BucketTable(dict):
+    """Memoizes the feature index of each token with a stable (process-independent) hash."""
+
+    def __init__(self, n_features: int):
+        super().__init__()
+        self.n_features = n_features
+
+    def __missing__(self, token: str) -> int:
+        bucket = zlib.crc32(token.encode('utf-8')) % self.n_features
+        self[token] = bucket
+        return bucket
+
+
+_bucket_tables = {}
+
+
+def hash_texts(texts, n_features: int = N_FEATURES):
+    """
+    Hashes word unigrams and bigrams of each text into feature buckets.
+    Returns (row_indices, column_indices) arrays with one entry per token occurrence.
+    """
+    buckets = _bucket_tables.setdefault(n_features, _BucketTable(n_features))
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        if not isinstance(text, str) or not text:
+            continue
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        rows.extend([row] * len(features))
+        cols.extend(map(buckets.__getitem__, features))
+    return np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+
+
+def term_frequencies(texts, n_features: int = N_FEATURES, chunk_size: int = CHUNK_SIZE) -> tuple[SparseVectors, np.ndarray]:
+    """
+    Hashes `texts` chunk by chunk into sublinear term frequencies (log1p of the counts).
+    Returns the sparse term frequency matrix and the document frequency of every feature.
+    """
+    chunks = []
+    document_frequency = np.zeros(n_features, dtype=np.int64)
+    for start in range(0, len(texts), chunk_size):
+        chunk = texts[start:start + chunk_size]
+        rows, cols = hash_texts(chunk, n_features)
+        counts = SparseVectors.from_entries(rows, cols, np.ones(len(rows)), len(chunk), n_features)
+        document_frequency += np.bincount(counts.indices, minlength=n_features)
+        np.log1p(counts.data, out=counts.data)
+        chunks.append(counts)
+    return SparseVectors.concat(chunks, n_features), document_frequency
+
+
+def apply_idf(vectors: SparseVectors, idf: np.ndarray) -> SparseVectors:
+    """Weights term frequencies by `idf` and L2-normalizes every row. Texts without tokens keep an empty row."""
+    weighted = SparseVectors(vectors.indptr, vectors.indices, vectors.data * idf[vectors.indices], vectors.n_features)
+    return weighted.normalized()
+
+
+def vectorize_collections(text_collections, paths, n_features: int = N_FEATURES) -> tuple[np.ndarray, list]:
+    """
+    Turns several text collections into TF-IDF vectors sharing one smoothed IDF and saves them
+    to `paths`. Every text is hashed exactly once. Returns (idf, [memory-mapped SparseVectors per collection]).
+    """
+    document_frequency = np.zeros(n_features, dtype=np.int64)
+    n_documents = 0
+    frequencies = []
+    for texts in text_collections:
+        vectors, collection_frequency = term_frequencies(texts, n_features)
+        frequencies.append(vectors)
+        document_frequency += collection_frequency
+        n_documents += len(texts)
+    idf = (np.log((1 + n_documents) / (1 + document_frequency)) + 1).astype(np.float32)
+    for vectors, path in zip(frequencies, paths):
+        apply_idf(vectors, idf).save(path)
+    return idf, [SparseVectors.load(path) for path in paths]
+
+
+def vectorize_with_idf(texts, idf: np.ndarray, path=None) -> SparseVectors:
+    """
+    Vectorizes new texts (e.g. a new Apollo export) with a stored IDF instead of refitting it,
+    so the vectors are comparable with the ones the IDF was fitted with. Saves them to `path` if given.
+    """
+    frequencies, _ = term_frequencies(texts, len(idf))
+    vectors = apply_idf(frequencies, np.asarray(idf, dtype=np.float32))
+    if path is not None:
+        vectors.save(path)
+    return vectors
+
+
+def top_k_similar(query_vectors: SparseVectors, reference_vectors: SparseVectors, k: int = TOP_K,
+                  block_size: int = BLOCK_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the k most similar reference rows (cosine similarity) for every query row.
+    The (small) reference set is held as a dense matrix over only the features it uses;
+    queries are processed in blocks of block_size rows.
+    Returns (indices, scores), both of shape (n_queries, k), sorted by descending score
+    (k is 0 if there are no reference rows).
+    """
+    k = min(k, len(reference_vectors))
+    indices = np.empty((len(query_vectors), k), dtype=np.int32)
+    scores = np.empty((len(query_vectors), k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+
+    # Reference features mapped to compact rows of a (features used x n_reference) matrix
+    reference_features, compact_columns = np.unique(np.asarray(reference_vectors.indices), return_inverse=True)
+    reference = np.zeros((len(reference_features), len(reference_vectors)), dtype=np.float32)
+    reference[compact_columns, reference_vectors.row_ids()] = reference_vectors.data
+    compact = np.full(reference_vectors.n_features, -1, dtype=np.int64)
+    compact[reference_features] = np.arange(len(reference_features))
+
+    for start in range(0, len(query_vectors), block_size):
+        block = query_vectors.rows(start, start + block_size)
+        features = compact[np.asarray(block.indices)]
+        shared = features >= 0
+        rows = block.row_ids()[shared]
+        contributions = np.asarray(block.data)[shared, None] * reference[features[shared]]
+        block_scores = np.zeros((len(block), len(reference_vectors)), dtype=np.float32)
+        if len(rows):
+            # Entries are sorted by row, so each row's contributions are one contiguous run
+            row_starts = np.flatnonzero(np.diff(rows, prepend=-1))
+            block_scores[rows[row_starts]] = np.add.reduceat(contributions, row_starts, axis=0)
+        top = np.argpartition(-block_scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
+
+
+def partner_texts(partners_df: pd.DataFrame) -> list[str]:
+    """Concatenates the descriptive columns of each partner profile into one text."""
+    columns = [c for c in PARTNER_TEXT_COLUMNS if c in partners_df.columns]
+    return partners_df[columns].fillna('').astype(str).agg(' '.join, axis=1).tolist()
+
+
+def find_latest_partner_workbook(project_root) -> str | None:
+    """Returns the most recent kgs*.xlsx in the project root, if any."""
+    workbooks = sorted(glob.glob(os.path.join(project_root, 'kgs*.xlsx')), key=os.path.getmtime)
+    return workbooks[-1] if workbooks else None
+
+
+def score_prospects(partners_df: pd.DataFrame, prospects_df: pd.DataFrame, vectors_dir, k: int = TOP_K) -> pd.DataFrame:
+    """
+    Scores every prospect against all partners.
+    Returns the prospects with Top_Partner_i / Top_Score_i columns, sorted by best score.
+    """
+    os.makedirs(vectors_dir, exist_ok=True)
+    partner_docs = partner_texts(partners_df)
+    prospect_docs = prospects_df[PROSPECT_TEXT_COLUMN].tolist()
+
+    with run_metrics.stage("vectorize") as timing:
+        idf, (partner_vectors, prospect_vectors) = vectorize_collections(
+            [partner_docs, prospect_docs],
+            [os.path.join(vectors_dir, 'partners'), os.path.join(vectors_dir, 'prospects')]
+        )
+        np.save(os.path.join(vectors_dir, IDF_FILE), idf)
+    print(f"Vectorized {len(partner_docs)} partners and {len(prospect_docs)} prospects in {timing['seconds']:.1f}s")
+
+    with run_metrics.stage("score") as timing:
+        indices, scores = top_k_similar(prospect_vectors, partner_vectors, k)
+    print(f"Scored {len(prospect_docs)} prospects against {len(partner_docs)} partners in {timing['seconds']:.2f}s")
+
+    partner_names = partners_df["Company Name"].fillna('').astype(str).to_numpy()
+    result = prospects_df.copy()
+    for rank in range(indices.shape[1]):
+        result[f"Top_Partner_{rank + 1}"] = partner_names[indices[:, rank]]
+        result[f"Top_Score_{rank + 1}"] = scores[:, rank]
+    if indices.shape[1] == 0:
+        return result
+    return result.sort_values("Top_Score_1", ascending=False)
+
+
+def main():
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    parser = argparse.ArgumentParser(description="Rank prospects by similarity to the partner companies.")
+    parser.add_argument('--partners', help="Partner workbook (defaults to the 'partners' dataset of the columnar store, "
+                                           "or else the newest kgs*.xlsx in the project root).")
+    parser.add_argument('--prospects', default=os.path.join(project_root, 'data', 'processed', 'final_80k.csv'),
+                        help=f"Cleaned prospect CSV containing a '{PROSPECT_TEXT_COLUMN}' column "
+                             "(falls back to the 'prospects' dataset of the columnar store).")
+    parser.add_argument('--output', default=os.path.join(project_root, 'script_output', 'prospect_partner_scores.csv'))
+    parser.add_argument('--vectors-dir', default=os.path.join(project_root, 'data', 'vectors'))
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    store_dir = os.path.join(project_root, DEFAULT_STORE_DIR)
+    if args.partners is None and has_dataset(PARTNERS_DATASET, store_dir):
+        # Only the columns the scoring uses are read from the Parquet dataset
+        columns = [c for c in ["Company Name"] + PARTNER_TEXT_COLUMNS if c in dataset_columns(PARTNERS_DATASET, store_dir)]
+        partners_df = read_dataset(PARTNERS_DATASET, columns, store_dir=store_dir)
+    else:
+        partners_path = args.partners or find_latest_partner_workbook(project_root)
+        if not partners_path or not os.path.exists(partners_path):
+            print("Error: No partner workbook found. Run extract_kunden_to_excel.py first or pass --partners.")
+            return
+        partners_df = pd.read_excel(partners_path)
+
+    if os.path.exists(args.prospects):
+        prospects_df = pd.read_csv(args.prospects)
+    elif has_dataset(PROSPECTS_DATASET, store_dir):
+        prospects_df = read_dataset(PROSPECTS_DATASET, store_dir=store_dir)
+    else:
+        print(f"Error: Prospect file not found: {args.prospects}")
+        return
+    if PROSPECT_TEXT_COLUMN not in prospects_df.columns:
+        print(f"Error: Column '{PROSPECT_TEXT_COLUMN}' not found in {args.prospects}")
+        return
+
+    result = score_prospects(partners_df, prospects_df, args.vectors_dir, args.top_k)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with run_metrics.stage("write"):
+        result.to_csv(args.output, index=False)
+    print(f"Saved scores for {len(result)} prospects to {args.output}")
+    run_metrics.incr("partners", len(partners_df))
+    run_metrics.incr("prospects", len(prospects_df))
+    print(f"Wrote the run report to {run_metrics.write_report()}")
+
+
+if __name__ == "__main__":
+    main()
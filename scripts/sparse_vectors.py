@@ -0,0 +1,124 @@
+"""
+This module stores the TF-IDF vectors of similarity_scoring.py and ann_index.py as sparse
+CSR matrices: row i holds the feature indices indices[indptr[i]:indptr[i + 1]] with the
+values data[indptr[i]:indptr[i + 1]]. A matrix is saved as a directory of .npy files
+(indptr, indices, float32 data) plus a small JSON file with its shape, and is memory-mapped
+on load. Storage grows with the number of tokens, not with rows x features, so texts can be
+hashed into a large feature space where hash collisions are rare.
+"""
+import json
+import os
+import numpy as np
+
+SHAPE_FILE = "shape.json"
+ARRAY_FILES = ("indptr", "indices", "data")
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15) # Fibonacci hashing constant used by project()
+
+
+class SparseVectors:
+    """A CSR matrix of shape (len(indptr) - 1, n_features)."""
+
+    def __init__(self, indptr, indices, data, n_features: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_features = n_features
+
+    @classmethod
+    def from_entries(cls, rows, cols, values, n_rows: int, n_features: int) -> "SparseVectors":
+        """Builds a matrix from (row, column, value) entries; duplicate entries are summed."""
+        keys, inverse = np.unique(np.asarray(rows, dtype=np.int64) * n_features + np.asarray(cols, dtype=np.int64),
+                                  return_inverse=True)
+        data = np.bincount(inverse, weights=values, minlength=len(keys)).astype(np.float32)
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n_features, minlength=n_rows), out=indptr[1:])
+        return cls(indptr, (keys % n_features).astype(np.int32), data, n_features)
+
+    @classmethod
+    def concat(cls, parts, n_features: int) -> "SparseVectors":
+        """Stacks matrices vertically."""
+        parts = list(parts)
+        if not parts:
+            return cls(np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32), n_features)
+        offsets = np.cumsum([0] + [part.indptr[-1] - part.indptr[0] for part in parts[:-1]])
+        indptr = np.concatenate([[0]] + [np.asarray(part.indptr[1:]) - part.indptr[0] + offset
+                                         for part, offset in zip(parts, offsets)]).astype(np.int64)
+        return cls(indptr, np.concatenate([np.asarray(part.indices) for part in parts]),
+                   np.concatenate([np.asarray(part.data) for part in parts]), n_features)
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def row_ids(self) -> np.ndarray:
+        """Row number of every stored entry."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+
+    def rows(self, start: int, stop: int) -> "SparseVectors":
+        """Rows start:stop, sharing the (possibly memory-mapped) arrays."""
+        stop = min(stop, len(self))
+        indptr = np.asarray(self.indptr[start:stop + 1])
+        return SparseVectors(indptr - indptr[0], self.indices[indptr[0]:indptr[-1]],
+                             self.data[indptr[0]:indptr[-1]], self.n_features)
+
+    def take(self, row_numbers) -> "SparseVectors":
+        """The given rows, in the given order."""
+        row_numbers = np.asarray(row_numbers, dtype=np.int64)
+        starts, stops = np.asarray(self.indptr)[row_numbers], np.asarray(self.indptr)[row_numbers + 1]
+        lengths = stops - starts
+        indptr = np.zeros(len(row_numbers) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+        return SparseVectors(indptr, np.asarray(self.indices)[positions], np.asarray(self.data)[positions], self.n_features)
+
+    def normalized(self) -> "SparseVectors":
+        """Returns the rows scaled to unit L2 norm; rows without entries stay empty."""
+        row_ids = self.row_ids()
+        norms = np.sqrt(np.bincount(row_ids, weights=np.square(self.data, dtype=np.float64), minlength=len(self)))
+        data = (self.data / np.where(norms > 0, norms, 1)[row_ids]).astype(np.float32)
+        return SparseVectors(np.asarray(self.indptr), np.asarray(self.indices), data, self.n_features)
+
+    def dense_row(self, row: int) -> np.ndarray:
+        """Row `row` as a dense float32 vector of length n_features."""
+        dense = np.zeros(self.n_features, dtype=np.float32)
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        dense[self.indices[start:stop]] = self.data[start:stop]
+        return dense
+
+    def dot(self, dense_query: np.ndarray) -> np.ndarray:
+        """Inner product of every row with a dense query vector."""
+        return np.bincount(self.row_ids(), weights=self.data * dense_query[self.indices],
+                           minlength=len(self)).astype(np.float32)
+
+    def save(self, path) -> None:
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_FILES:
+            np.save(os.path.join(path, f"{name}.npy"), np.asarray(getattr(self, name)))
+        with open(os.path.join(path, SHAPE_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"rows": len(self), "n_features": self.n_features}, f)
+
+    @classmethod
+    def load(cls, path, mmap: bool = True) -> "SparseVectors":
+        """Loads a matrix written by save(); with mmap, its arrays are memory-mapped read-only."""
+        with open(os.path.join(path, SHAPE_FILE), 'r', encoding='utf-8') as f:
+            shape = json.load(f)
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r' if mmap else None) for name in ARRAY_FILES]
+        return cls(*arrays, shape["n_features"])
+
+
+def is_saved(path) -> bool:
+    return os.path.exists(os.path.join(path, SHAPE_FILE))
+
+
+def project(vectors: SparseVectors, dim: int) -> np.ndarray:
+    """
+    Maps the rows to dense, L2-normalized float32 vectors of length `dim` by signed feature
+    hashing, which preserves inner products in expectation. Used where dense vectors are
+    needed (e.g. k-means centroids), never for the final scores.
+    """
+    hashed = np.asarray(vectors.indices).astype(np.uint64) * HASH_MULTIPLIER
+    buckets = ((hashed >> np.uint64(32)) % np.uint64(dim)).astype(np.int64)
+    signs = np.where((hashed >> np.uint64(31)) & np.uint64(1), -1.0, 1.0)
+    dense = np.bincount(vectors.row_ids() * dim + buckets, weights=signs * vectors.data,
+                        minlength=len(vectors) * dim).reshape(len(vectors), dim).astype(np.float32)
+    norms = np.linalg.norm(dense, axis=1, keepdims=True)
+    return np.divide(dense, norms, out=np.zeros_like(dense), where=norms > 0)
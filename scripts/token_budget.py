@@ -0,0 +1,151 @@
+"""
+This module keeps the size and the cost of Gemini requests predictable.
+PromptBudget counts the tokens of a prompt before it is sent and trims the variable part
+(e.g. the company text substituted into a template) until the prompt fits the configured
+budget. Counts are estimated from the text length; only prompts whose estimate comes close
+to the budget are counted exactly with the model's count_tokens call, so the common case
+costs no extra round trip.
+TokenLedger records the prompt and response token counts reported for every request
+(usage_metadata) with the resulting cost, and writes them as a CSV file next to the run
+report.
+"""
+import csv
+import math
+import os
+import threading
+import run_metrics
+
+CHARS_PER_TOKEN = 4 # Rough average for German and English prose
+EXACT_COUNT_THRESHOLD = 0.8 # Estimates above this share of the budget are counted exactly
+TRIM_SAFETY_FACTOR = 0.95
+MAX_TRIM_ROUNDS = 4
+TRIM_MARKER = "\n[...]"
+BUDGET_ENV_VAR = "GEMINI_PROMPT_TOKEN_BUDGET"
+# USD per million (prompt, response) tokens, matched against the start of the model name
+PRICE_PER_MILLION_TOKENS = {
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+
+
+def configured_budget(default: int) -> int:
+    """Returns the prompt token budget: GEMINI_PROMPT_TOKEN_BUDGET if set, else `default`."""
+    return int(os.getenv(BUDGET_ENV_VAR) or default)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def trim_text(text: str, max_chars: int) -> str:
+    """
+    Shortens `text` to at most `max_chars` characters plus TRIM_MARKER, cutting at the last
+    paragraph, line or sentence break if one lies in the second half of the kept text.
+    """
+    if len(text) <= max_chars:
+        return text
+    kept = text[:max_chars]
+    for separator in ("\n\n", "\n", ". "):
+        cut = kept.rfind(separator)
+        if cut >= max_chars // 2:
+            kept = kept[:cut + len(separator.rstrip(' '))]
+            break
+    return kept.rstrip() + TRIM_MARKER
+
+
+class PromptBudget:
+    """
+    Token budget for prompts sent to `model` (a GenerativeModel; without one, counts stay estimates).
+    """
+
+    def __init__(self, max_prompt_tokens: int, model=None):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.model = model
+
+    def count(self, prompt: str) -> int:
+        """Returns the prompt's token count: estimated, or exact when the estimate is close to the budget."""
+        estimate = estimate_tokens(prompt)
+        if self.model is None or estimate < EXACT_COUNT_THRESHOLD * self.max_prompt_tokens:
+            return estimate
+        try:
+            run_metrics.incr("gemini.count_tokens_calls")
+            return self.model.count_tokens(prompt).total_tokens
+        except Exception:
+            return estimate
+
+    def fit(self, text: str, build_prompt) -> tuple[str, str, int]:
+        """
+        Builds the prompt with build_prompt(text), trimming `text` until the prompt fits the budget.
+        Returns (text, prompt, prompt tokens); the text is unchanged if the prompt already fits.
+        """
+        prompt = build_prompt(text)
+        tokens = self.count(prompt)
+        rounds = 0
+        while tokens > self.max_prompt_tokens and text and rounds < MAX_TRIM_ROUNDS:
+            # The prompt's own chars per token convert the budget to chars; the template part stays the same
+            chars_per_token = len(prompt) / tokens
+            max_chars = (self.max_prompt_tokens * chars_per_token - (len(prompt) - len(text))) * TRIM_SAFETY_FACTOR ** (rounds + 1)
+            text = trim_text(text, max(0, int(max_chars)))
+            prompt = build_prompt(text)
+            tokens = self.count(prompt)
+            rounds += 1
+        if rounds:
+            run_metrics.incr("prompts.trimmed")
+        run_metrics.observe("prompt_tokens", tokens)
+        return text, prompt, tokens
+
+
+def price_for(model_name: str) -> tuple[float, float] | None:
+    for prefix, price in PRICE_PER_MILLION_TOKENS.items():
+        if model_name.startswith(prefix):
+            return price
+    return None
+
+
+def usage_counts(response) -> tuple[int, int]:
+    """Returns (prompt tokens, response tokens) from a response's usage_metadata (0 if absent)."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return 0, 0
+    return getattr(usage, 'prompt_token_count', 0) or 0, getattr(usage, 'candidates_token_count', 0) or 0
+
+
+class TokenLedger:
+    """Per-request token counts and costs of one run."""
+
+    FIELDS = ["key", "model", "estimated_prompt_tokens", "prompt_tokens", "response_tokens", "cost_usd"]
+
+    def __init__(self):
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def record(self, key: str, model_name: str, prompt_tokens: int, response_tokens: int,
+               estimated_prompt_tokens: int | None = None) -> None:
+        price = price_for(model_name)
+        cost = None
+        if price is not None:
+            cost = round((prompt_tokens * price[0] + response_tokens * price[1]) / 1e6, 6)
+        with self._lock:
+            self.entries.append({
+                "key": key, "model": model_name, "estimated_prompt_tokens": estimated_prompt_tokens,
+                "prompt_tokens": prompt_tokens, "response_tokens": response_tokens, "cost_usd": cost,
+            })
+
+    def totals(self) -> dict:
+        with self._lock:
+            entries = list(self.entries)
+        return {
+            "requests": len(entries),
+            "prompt_tokens": sum(entry["prompt_tokens"] for entry in entries),
+            "response_tokens": sum(entry["response_tokens"] for entry in entries),
+            "cost_usd": round(sum(entry["cost_usd"] or 0 for entry in entries), 4),
+            "unpriced_requests": sum(entry["cost_usd"] is None for entry in entries),
+        }
+
+    def write_csv(self, path: str) -> None:
+        with self._lock:
+            entries = list(self.entries)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.FIELDS)
+            writer.writeheader()
+            writer.writerows(entries)
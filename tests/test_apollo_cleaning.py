@@ -0,0 +1,83 @@
+"""Checks the vectorized Combined_Description builder against the notebook's iterrows rules."""
+import numpy as np
+import pandas as pd
+import pytest
+from apollo_cleaning import (COMBINED_DESCRIPTION_COLUMN, MIN_SUBSTANTIAL_LENGTH, SEO_DESCRIPTION_COLUMN,
+                             SHORT_DESCRIPTION_COLUMN, build_combined_description, count_mismatches,
+                             reference_combined_description)
+
+
+def text(length: int, word: str = "software") -> str:
+    """A sentence of exactly `length` characters."""
+    return (" ".join([word] * length))[:length].rstrip().ljust(length, "x")
+
+
+LONG = text(80)
+AT_THRESHOLD = text(MIN_SUBSTANTIAL_LENGTH)
+BELOW_THRESHOLD = text(MIN_SUBSTANTIAL_LENGTH - 1)
+
+CASES = [
+    # Missing, blank and non-string values
+    (np.nan, np.nan),
+    (None, LONG),
+    (LONG, None),
+    ("", ""),
+    ("   ", "\t\n"),
+    ("", LONG),
+    (12345, LONG),
+    (LONG, 3.5),
+    (True, 0),
+    # The 50-character threshold, with the shorter text contained in the longer one
+    (AT_THRESHOLD, AT_THRESHOLD + " and consulting services"),
+    (BELOW_THRESHOLD, BELOW_THRESHOLD + " and consulting services"),
+    (AT_THRESHOLD + " and consulting services", AT_THRESHOLD),
+    (AT_THRESHOLD + " and consulting services", BELOW_THRESHOLD),
+    (AT_THRESHOLD, AT_THRESHOLD),
+    (BELOW_THRESHOLD, BELOW_THRESHOLD),
+    (AT_THRESHOLD, text(MIN_SUBSTANTIAL_LENGTH, "hardware")),
+    # Differences only in case and whitespace
+    (LONG, LONG.upper()),
+    (LONG, LONG.replace(" ", "")),
+    (LONG.replace(" ", "  \t"), LONG.title()),
+    ("  " + LONG + "  ", LONG),
+    # Containment in both directions, and no containment
+    (LONG, "We build " + LONG + " for banks"),
+    ("We build " + LONG + " for banks", LONG),
+    (LONG, text(80, "logistics")),
+    # Unicode whitespace inside and around the texts
+    (LONG.replace(" ", "\u00a0"), LONG),
+    (LONG.replace(" ", "\u2003"), LONG.replace(" ", "\u3000")),
+    (LONG.replace(" ", "\u2028\u0085"), LONG.upper()),
+    ("\u00a0" + LONG + "\u2009", LONG),
+    ("\u00a0\u3000", LONG),
+    (LONG.replace(" ", "\u200b"), LONG), # A zero-width space is not whitespace
+]
+
+
+@pytest.fixture
+def descriptions():
+    short, seo = zip(*CASES)
+    return pd.DataFrame({SHORT_DESCRIPTION_COLUMN: pd.Series(short, dtype=object),
+                         SEO_DESCRIPTION_COLUMN: pd.Series(seo, dtype=object),
+                         "Company": [f"Company {i}" for i in range(len(CASES))]})
+
+
+def test_matches_notebook_rules(descriptions):
+    assert count_mismatches(descriptions) == 0
+
+
+def test_matches_notebook_rules_with_missing_column(descriptions):
+    assert count_mismatches(descriptions.drop(columns=[SEO_DESCRIPTION_COLUMN])) == 0
+
+
+def test_combined_values(descriptions):
+    combined = build_combined_description(descriptions)
+    assert combined.name == COMBINED_DESCRIPTION_COLUMN
+    assert combined.iloc[:5].isna().tolist() == [True, False, False, True, True]
+    assert combined.iloc[6] == "12345. " + LONG
+    assert combined.iloc[9] == AT_THRESHOLD + " and consulting services" # Both long: the longer one
+    assert combined.iloc[10] == BELOW_THRESHOLD + ". " + BELOW_THRESHOLD + " and consulting services"
+    assert combined.iloc[13] == AT_THRESHOLD # Equal length: the short description
+    assert combined.iloc[16] == LONG
+    assert combined.iloc[23] == LONG.replace(" ", "\u00a0")
+    pd.testing.assert_series_equal(combined, reference_combined_description(descriptions), check_dtype=False)
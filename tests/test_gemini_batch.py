@@ -0,0 +1,116 @@
+"""Runs the Batch-mode round trip of gemini_batch against a local stand-in for the Gemini API."""
+import http.server
+import json
+import threading
+import urllib.parse
+import pytest
+import gemini_batch
+import run_metrics
+
+API_KEY = "test-key"
+MODEL_NAME = "gemini-test"
+FILE_NAME = "files/batch-input"
+BATCH_NAME = "batches/batch-1"
+RESPONSES_FILE = "files/batch-output"
+USAGE = {"promptTokenCount": 12, "candidatesTokenCount": 5, "totalTokenCount": 17}
+RESPONSE_LINES = [
+    {"key": "Kunde_1", "response": {
+        "candidates": [{"content": {"parts": [{"text": '{"summary": '}, {"text": '"Software"}'}]}}],
+        "usageMetadata": USAGE}},
+    {"key": "Kunde_2", "error": {"code": 400, "message": "Invalid request"}},
+    # No line for Kunde_3
+]
+
+
+class StubGeminiHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the Files API upload, batch creation, polling and download endpoints used by gemini_batch."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _record(self, body=b""):
+        self.server.requests.append({"method": self.command, "path": self.path,
+                                     "api_key": self.headers.get("x-goog-api-key"), "body": body})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._record(body)
+        path = urllib.parse.urlsplit(self.path).path
+        if path == "/upload/v1beta/files" and self.headers.get("X-Goog-Upload-Command") == "start":
+            host, port = self.server.server_address
+            self._send_json({}, {"X-Goog-Upload-URL": f"http://{host}:{port}/upload-session/1"})
+        elif path == "/upload-session/1" and self.headers.get("X-Goog-Upload-Command") == "upload, finalize":
+            self.server.uploaded = body
+            self._send_json({"file": {"name": FILE_NAME}})
+        elif path == f"/v1beta/models/{MODEL_NAME}:batchGenerateContent":
+            self.server.batch_request = json.loads(body)
+            self._send_json({"name": BATCH_NAME, "metadata": {"state": "JOB_STATE_PENDING"}})
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        self._record()
+        path = urllib.parse.urlsplit(self.path).path
+        if path == f"/v1beta/{BATCH_NAME}":
+            self.server.polls += 1
+            if self.server.polls == 1:
+                self._send_json({"name": BATCH_NAME, "metadata": {"state": "JOB_STATE_RUNNING"}})
+            else:
+                self._send_json({"name": BATCH_NAME, "done": True, "metadata": {"state": "JOB_STATE_SUCCEEDED"},
+                                 "response": {"responsesFile": RESPONSES_FILE}})
+        elif path == f"/download/v1beta/{RESPONSES_FILE}:download":
+            body = "".join(json.dumps(line) + "\n" for line in RESPONSE_LINES).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubGeminiHandler)
+    server.requests, server.polls, server.uploaded, server.batch_request = [], 0, None, None
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    monkeypatch.setenv(gemini_batch.API_BASE_URL_ENV_VAR, f"http://{host}:{port}")
+    monkeypatch.setattr(run_metrics, "counters", run_metrics.counters.__class__())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_run_batch_round_trip(stub_server, tmp_path):
+    prompts = {"Kunde_1": "Describe company 1", "Kunde_2": "Describe company 2", "Kunde_3": "Describe company 3"}
+    generation_config = {"responseMimeType": "application/json"}
+    usage = {}
+
+    results = gemini_batch.run_batch(prompts, MODEL_NAME, API_KEY, tmp_path / "batch.jsonl",
+                                     poll_interval=0, usage=usage, generation_config=generation_config)
+
+    assert results == {"Kunde_1": '{"summary": "Software"}', "Kunde_2": None, "Kunde_3": None}
+    assert usage == {"Kunde_1": USAGE}
+    assert run_metrics.counters["gemini.prompt_tokens"] == 12
+    assert run_metrics.counters["gemini.response_tokens"] == 5
+    assert run_metrics.counters["gemini.total_tokens"] == 17
+    assert run_metrics.counters["gemini.batch_requests"] == 3
+
+    uploaded = [json.loads(line) for line in stub_server.uploaded.decode('utf-8').splitlines()]
+    assert [line["key"] for line in uploaded] == list(prompts)
+    assert uploaded[0]["request"]["contents"][0]["parts"][0]["text"] == "Describe company 1"
+    assert all(line["request"]["generationConfig"] == generation_config for line in uploaded)
+    assert stub_server.batch_request["batch"]["input_config"] == {"file_name": FILE_NAME}
+    assert stub_server.polls == 2
+    assert all(request["api_key"] == API_KEY for request in stub_server.requests)
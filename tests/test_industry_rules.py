@@ -0,0 +1,16 @@
+"""Checks that the trigram index of IndustryRules resolves names like a scan of the rule table in order."""
+import itertools
+import industry_rules
+
+
+def first_matching_rule(rules, name_lower):
+    return next((rule for rule in rules.company_rules if any(p in name_lower for p in rule['name_contains'])), None)
+
+
+def test_index_matches_table_order():
+    rules = industry_rules.IndustryRules.load()
+    patterns = [pattern for rule in rules.company_rules for pattern in rule['name_contains']]
+    # Every pattern alone and every ordered pair of patterns, so names matching several rules are covered
+    names = patterns + [f"{first} {second}" for first, second in itertools.permutations(patterns, 2)]
+    for name in names:
+        assert rules.match_company_rule(name) is first_matching_rule(rules, name), name
@@ -0,0 +1,30 @@
+"""
+Checks parse_markdown on the partner summary document against the records of the parser
+before the industry/niche rules moved to industry_rules.json. A change to the rule table
+(order, patterns, niche rules) or to the trigram index shows up here as a changed record.
+"""
+import json
+import os
+import pytest
+import parse_kunden_summary
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DOCUMENT_PATH = os.path.join(PROJECT_ROOT, "docs", "Manuav Kundenzusammenfassung für Klaus.md")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "partner_companies_baseline.json")
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("as_file", [False, True], ids=["text", "file"])
+def test_parse_markdown_matches_baseline(baseline, as_file):
+    with open(DOCUMENT_PATH, 'r', encoding='utf-8') as f:
+        records = parse_kunden_summary.parse_markdown(f if as_file else f.read())
+
+    assert [record["CompanyName"] for record in records] == [record["CompanyName"] for record in baseline]
+    industries = [(r["CompanyName"], r["ExtractedIndustry"], r["ExtractedCustomerNiche"]) for r in records]
+    assert industries == [(r["CompanyName"], r["ExtractedIndustry"], r["ExtractedCustomerNiche"]) for r in baseline]
+    assert records == baseline